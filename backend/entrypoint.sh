@@ -24,5 +24,28 @@ done
 echo "[entrypoint] Collecting static files..."
 python manage.py collectstatic --noinput || echo "[entrypoint] collectstatic failed or no storage configured"
 
-echo "[entrypoint] Starting gunicorn"
-exec gunicorn strenghty_backend.wsgi --bind 0.0.0.0:${PORT:-8000} --workers ${GUNICORN_WORKERS:-2}
+# With WARMUP_ON_START=1 the app is loaded and warmed once in the master
+# (--preload) and forked into the workers already warm.
+PRELOAD_ARGS=()
+if [ "${WARMUP_ON_START:-0}" = "1" ]; then
+	PRELOAD_ARGS=(--preload)
+fi
+
+# Reset emails and account deletions run as background jobs. Start a worker
+# next to the web server unless one is deployed separately (RUN_WORKER=0,
+# e.g. the Procfile's `worker` process).
+if [ "${RUN_WORKER:-1}" = "1" ]; then
+	echo "[entrypoint] Starting job worker"
+	python manage.py run_worker &
+fi
+
+# Serve the ASGI app so the /api/events/ push stream works; SERVER_MODE=wsgi
+# falls back to plain sync workers (push requests then get a 503).
+if [ "${SERVER_MODE:-asgi}" = "wsgi" ]; then
+	APP_ARGS=(strenghty_backend.wsgi)
+else
+	APP_ARGS=(strenghty_backend.asgi:application --worker-class uvicorn_worker.UvicornWorker)
+fi
+
+echo "[entrypoint] Starting gunicorn (${SERVER_MODE:-asgi})"
+exec gunicorn "${APP_ARGS[@]}" --bind 0.0.0.0:${PORT:-8000} --workers ${GUNICORN_WORKERS:-2} ${PRELOAD_ARGS[@]+"${PRELOAD_ARGS[@]}"}
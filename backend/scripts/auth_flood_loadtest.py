@@ -0,0 +1,119 @@
+"""Load test: set-logging latency while the login endpoint is being flooded.
+
+Measures POST /api/sets/ latency on its own, then again while several
+threads hammer /api/auth/login/ with wrong passwords. With the auth
+throttles in place the flood is mostly answered with cheap 429s, so the
+set-logging percentiles should stay roughly where the baseline put them.
+Run it once with AUTH_THROTTLE_ENABLED=0 on the server to see the
+difference.
+
+Start the backend (e.g. `gunicorn strenghty_backend.wsgi --workers 2`), make
+sure the user exists (see create_test_user.py), then:
+
+    python scripts/auth_flood_loadtest.py --base-url http://127.0.0.1:8000 \
+        --username testuser --password testpass
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[idx]
+
+
+def summarize(label, latencies):
+    ms = [v * 1000 for v in latencies]
+    print(
+        f"{label:<18} n={len(ms):<5} p50={percentile(ms, 50):7.1f}ms "
+        f"p95={percentile(ms, 95):7.1f}ms p99={percentile(ms, 99):7.1f}ms "
+        f"mean={statistics.fmean(ms) if ms else float('nan'):7.1f}ms"
+    )
+
+
+def log_sets(session, base, workout_id, exercise_id, count):
+    latencies = []
+    for i in range(count):
+        started = time.perf_counter()
+        r = session.post(
+            f"{base}/api/sets/",
+            json={"workout": workout_id, "exercise": exercise_id, "reps": 5, "weight": 100 + (i % 10), "unit": "kg"},
+        )
+        latencies.append(time.perf_counter() - started)
+        if r.status_code != 201:
+            print("set create failed:", r.status_code, r.text[:200])
+    return latencies
+
+
+def flood(base, username, stop, statuses, lock):
+    session = requests.Session()
+    i = 0
+    while not stop.is_set():
+        # Vary the username so the per-account bucket alone can't absorb the flood.
+        r = session.post(f"{base}/api/auth/login/", json={"username": f"{username}{i % 50}", "password": "wrong"})
+        with lock:
+            statuses[r.status_code] += 1
+        i += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", default="testuser")
+    parser.add_argument("--password", default="testpass")
+    parser.add_argument("--sets", type=int, default=200, help="Sets to log per phase")
+    parser.add_argument("--flood-threads", type=int, default=16)
+    args = parser.parse_args()
+    base = args.base_url.rstrip("/")
+
+    r = requests.post(f"{base}/api/auth/login/", json={"username": args.username, "password": args.password})
+    r.raise_for_status()
+    session = requests.Session()
+    session.headers["Authorization"] = f"Token {r.json()['token']}"
+
+    workout = session.post(f"{base}/api/workouts/", json={"name": "Load test", "date": time.strftime("%Y-%m-%d")})
+    workout.raise_for_status()
+    exercise = session.post(
+        f"{base}/api/exercises/", json={"name": f"Load test {int(time.time())}", "muscle_group": "OTHER"}
+    )
+    exercise.raise_for_status()
+    workout_id, exercise_id = workout.json()["id"], exercise.json()["id"]
+
+    baseline = log_sets(session, base, workout_id, exercise_id, args.sets)
+
+    stop = threading.Event()
+    statuses = Counter()
+    lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=args.flood_threads) as pool:
+        for _ in range(args.flood_threads):
+            pool.submit(flood, base, args.username, stop, statuses, lock)
+        time.sleep(1.0)  # let the flood ramp up
+        flood_started = time.perf_counter()
+        under_flood = log_sets(session, base, workout_id, exercise_id, args.sets)
+        flood_elapsed = time.perf_counter() - flood_started
+        stop.set()
+
+    session.delete(f"{base}/api/workouts/{workout_id}/")
+    session.delete(f"{base}/api/exercises/{exercise_id}/")
+
+    summarize("baseline", baseline)
+    summarize("under auth flood", under_flood)
+    total = sum(statuses.values())
+    print(
+        f"auth flood: {total} requests ({total / flood_elapsed:.0f}/s), "
+        + ", ".join(f"{code}={n}" for code, n in sorted(statuses.items()))
+    )
+
+
+if __name__ == "__main__":
+    main()
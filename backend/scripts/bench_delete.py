@@ -0,0 +1,124 @@
+"""Benchmark account deletion on a large synthetic account.
+
+Builds two identical throwaway users with N strength sets each (default
+200,000, plus ~5% cardio sets) spread over ~25-set workouts and 20
+exercises, then deletes one through Django's Collector
+(`User.objects.filter(pk=...).delete()`, the old `delete_user` task body)
+and the other through `workouts.deletion.delete_user_data`, and prints the
+wall time, peak Python memory and longest single transaction of each.
+
+Run from backend/strenghty_backend (point DATABASE_URL at Postgres for
+representative numbers):
+
+    python ../scripts/bench_delete.py --sets 200000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "strenghty_backend"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "strenghty_backend.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from workouts import deletion  # noqa: E402
+from workouts.models import CardioSet, Exercise, Workout, WorkoutSet  # noqa: E402
+
+User = get_user_model()
+
+SETS_PER_WORKOUT = 25
+
+
+def build_account(username: str, sets: int) -> int:
+    rng = random.Random(7)
+    user = User.objects.create_user(username=username, is_active=False)
+    exercises = Exercise.objects.bulk_create(
+        [Exercise(owner=user, name=f"Exercise {i}", muscle_group="OTHER") for i in range(20)]
+    )
+    start = date(2010, 1, 1)
+    n_workouts = -(-sets // SETS_PER_WORKOUT)
+    workouts = Workout.objects.bulk_create(
+        [Workout(owner=user, name="Session", date=start + timedelta(days=i)) for i in range(n_workouts)],
+        batch_size=2000,
+    )
+    batch, cardio = [], []
+    for i in range(sets):
+        workout = workouts[i // SETS_PER_WORKOUT]
+        exercise = exercises[rng.randrange(20)]
+        batch.append(
+            WorkoutSet(workout=workout, owner=user, exercise=exercise, set_number=i % SETS_PER_WORKOUT + 1, reps=8, weight=100)
+        )
+        if i % 20 == 0:
+            cardio.append(
+                CardioSet(workout=workout, owner=user, exercise=exercise, set_number=i % SETS_PER_WORKOUT + 1, mode="ROW",
+                          duration_seconds=600, distance_meters=2000)
+            )
+        if len(batch) >= 10000:
+            WorkoutSet.objects.bulk_create(batch, batch_size=2000)
+            batch = []
+    WorkoutSet.objects.bulk_create(batch, batch_size=2000)
+    CardioSet.objects.bulk_create(cardio, batch_size=2000)
+    return user.pk
+
+
+class TransactionTimer:
+    """Track the longest-running outermost transaction via commit hooks."""
+
+    def __init__(self):
+        self.longest = 0.0
+        self._started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if self._started is None and connection.in_atomic_block:
+            self._started = time.perf_counter()
+            transaction.on_commit(self._committed)
+        return execute(sql, params, many, context)
+
+    def _committed(self):
+        self.longest = max(self.longest, time.perf_counter() - self._started)
+        self._started = None
+
+
+def timed(label: str, fn):
+    timer = TransactionTimer()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    with connection.execute_wrapper(timer):
+        fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} {elapsed:8.2f}s total  {timer.longest:7.3f}s longest transaction  {peak / 1e6:8.1f} MB peak")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sets", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=deletion.DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    stamp = int(time.time())
+    t0 = time.perf_counter()
+    collector_id = build_account(f"bench_delete_a_{stamp}", args.sets)
+    batched_id = build_account(f"bench_delete_b_{stamp}", args.sets)
+    print(f"Built 2 accounts with {args.sets} sets each in {time.perf_counter() - t0:.1f}s")
+
+    timed("collector", lambda: User.objects.filter(pk=collector_id).delete())
+    timed("batched", lambda: deletion.delete_user_data(batched_id, batch_size=args.batch_size))
+
+    leftover = WorkoutSet.objects.filter(owner_id__in=[collector_id, batched_id]).count()
+    assert leftover == 0, f"{leftover} sets left behind"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark the history importer on a large synthetic CSV.
+
+Generates N rows (default 1,000,000) spread over ~20 exercises and a few
+thousand workouts, imports them for a throwaway user through
+`workouts.importer.import_history`, prints rows/sec, then deletes the user.
+
+Run from backend/strenghty_backend (point DATABASE_URL at Postgres for
+representative numbers):
+
+    python ../scripts/bench_import.py --rows 1000000
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "strenghty_backend"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "strenghty_backend.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+
+from workouts import importer  # noqa: E402
+
+User = get_user_model()
+
+EXERCISES = [f"Bench Exercise {i}" for i in range(18)]
+CARDIO = [("Rower", "ROW"), ("Treadmill", "TREADMILL")]
+
+
+def write_csv(path: str, rows: int, sets_per_workout: int = 25):
+    rng = random.Random(42)
+    start = date(2015, 1, 1)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["date", "workout", "exercise", "reps", "weight", "unit", "set_type", "mode", "duration_seconds", "distance_meters", "split_seconds"]
+        )
+        for i in range(rows):
+            day = start + timedelta(days=i // sets_per_workout)
+            if rng.random() < 0.05:
+                name, mode = rng.choice(CARDIO)
+                duration = rng.randint(600, 3600)
+                dist = round(duration * rng.uniform(2.0, 4.0), 1)
+                split = round(500 * duration / dist, 1) if mode == "ROW" else ""
+                writer.writerow([day, "Session", name, "", "", "", "", mode, duration, dist, split])
+            else:
+                writer.writerow(
+                    [day, "Session", rng.choice(EXERCISES), rng.randint(1, 12), rng.randint(20, 200), "kg",
+                     rng.choice("SSSSFW"), "", "", "", ""]
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=importer.CHUNK_SIZE)
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark user afterwards")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.csv")
+        t0 = time.perf_counter()
+        write_csv(path, args.rows)
+        print(f"Generated {args.rows} rows ({os.path.getsize(path) / 1e6:.1f} MB) in {time.perf_counter() - t0:.1f}s")
+
+        user = User.objects.create_user(username=f"bench_import_{int(time.time())}")
+        try:
+            last = [time.perf_counter()]
+
+            def progress(result):
+                now = time.perf_counter()
+                if now - last[0] >= 5:
+                    print(f"  {result.rows} rows...")
+                    last[0] = now
+
+            with open(path, "rb") as f:
+                result = importer.import_history(user, f, "csv", chunk_size=args.chunk_size, progress=progress)
+            print(
+                f"Imported {result.sets} sets + {result.cardio_sets} cardio sets into {result.workouts} workouts "
+                f"in {result.seconds:.1f}s -> {result.rows / result.seconds:.0f} rows/s "
+                f"({result.prs_updated} PR flags set)"
+            )
+        finally:
+            if not args.keep:
+                user.delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Compare exercise bests computed in Python with the indexed kg metric columns.
+
+Builds `--users` throwaway users with `--sets` strength sets each (spread
+over ~25-set workouts and 20 exercises, mixing kg and lbs), then times, for
+one of them and one exercise:
+
+* the old way: fetch every working set's weight/unit/reps and take the
+  heaviest weight, best e1RM and best volume in Python;
+* the new way: one `ORDER BY <metric> DESC LIMIT 1` per metric on
+  `weight_kg`, `e1rm_kg` and `volume_kg`.
+
+Prints the median of `--runs` runs, checks both agree, and shows the query
+plans. Run from backend/strenghty_backend after migrating (point
+DATABASE_URL at Postgres for representative numbers):
+
+    python ../scripts/bench_kg_metrics.py --users 50 --sets 5000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "strenghty_backend"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "strenghty_backend.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+
+from workouts import deletion, prs  # noqa: E402
+from workouts.models import Exercise, Workout, WorkoutSet  # noqa: E402
+
+User = get_user_model()
+
+SETS_PER_WORKOUT = 25
+PREFIX = "bench-kg-metrics-"
+METRICS = ("weight_kg", "e1rm_kg", "volume_kg")
+
+
+def build_user(index: int, sets: int):
+    rng = random.Random(index)
+    user = User.objects.create_user(username=f"{PREFIX}{index}", is_active=False)
+    exercises = Exercise.objects.bulk_create(
+        [Exercise(owner=user, name=f"Exercise {i}", muscle_group="OTHER") for i in range(20)]
+    )
+    start = date(2015, 1, 1)
+    workouts = Workout.objects.bulk_create(
+        [Workout(owner=user, name="Session", date=start + timedelta(days=i)) for i in range(-(-sets // SETS_PER_WORKOUT))],
+        batch_size=2000,
+    )
+    objs = [
+        WorkoutSet(
+            workout=workouts[i // SETS_PER_WORKOUT],
+            owner=user,
+            exercise=exercises[rng.randrange(20)],
+            set_number=i % SETS_PER_WORKOUT + 1,
+            reps=rng.randint(1, 12),
+            weight=rng.randint(20, 200),
+            unit=rng.choice(["kg", "lbs"]),
+            set_type=rng.choice("WSSSF"),
+        )
+        for i in range(sets)
+    ]
+    for obj in objs:
+        obj.set_kg_metrics()
+    WorkoutSet.objects.bulk_create(objs, batch_size=2000)
+    return user, exercises[0]
+
+
+def working_sets(user, exercise):
+    return WorkoutSet.objects.filter(owner=user, exercise=exercise, set_type__in=["S", "F"], reps__gt=0)
+
+
+def bests_in_python(user, exercise) -> tuple:
+    history = prs._StrengthHistory()
+    for weight, unit, reps in working_sets(user, exercise).filter(weight__gt=0).order_by().values_list(
+        "weight", "unit", "reps"
+    ):
+        history.add(prs.to_kg(weight, unit), reps)
+    return history.max_weight, history.max_e1rm, history.max_volume
+
+
+def top_query(user, exercise, column: str):
+    qs = working_sets(user, exercise).filter(**{f"{column}__gt": 0})
+    return qs.order_by(f"-{column}").values_list(column, flat=True)[:1]
+
+
+def bests_indexed(user, exercise) -> tuple:
+    return tuple(next(iter(top_query(user, exercise, column)), None) for column in METRICS)
+
+
+def time_call(fn, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--sets", type=int, default=5000, help="Strength sets per user")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--keep", action="store_true", help="Leave the synthetic users in place")
+    args = parser.parse_args()
+
+    print(f"Building {args.users} users x {args.sets} sets...")
+    built = [build_user(i, args.sets) for i in range(args.users)]
+    user, exercise = built[len(built) // 2]
+    try:
+        python = bests_in_python(user, exercise)
+        indexed = bests_indexed(user, exercise)
+        print(f"bests (weight, e1RM, volume): {indexed}")
+        if python != indexed:
+            print(f"  MISMATCH: Python scan gave {python}")
+        before = time_call(lambda: bests_in_python(user, exercise), args.runs)
+        after = time_call(lambda: bests_indexed(user, exercise), args.runs)
+        print(f"\nPython scan {before * 1000:.1f} ms, indexed columns {after * 1000:.1f} ms "
+              f"({before / after if after else float('inf'):.1f}x)")
+        for column in METRICS:
+            plan = top_query(user, exercise, column).explain()
+            print(f"  {column}:\n    " + plan.replace("\n", "\n    "))
+    finally:
+        if not args.keep:
+            for built_user, _ in built:
+                deletion.delete_user_data(built_user.pk)
+
+
+if __name__ == "__main__":
+    main()
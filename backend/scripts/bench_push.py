@@ -0,0 +1,198 @@
+"""Measure how push notifications (`workouts.push`) scale with open connections.
+
+On a throwaway SQLite database, creates `--users` users and opens
+`--connections` concurrent `GET /api/events/` streams spread evenly over
+them. The streams are opened by calling `strenghty_backend.asgi.application`
+directly, with no server or sockets, so only the app's own per-connection
+cost is measured. The script then logs `--writes` sets for random users
+through the real API. For each write it measures the time from the request
+starting until every one of that user's streams has received the event.
+
+It reports:
+
+* connection setup time and Python memory per open connection;
+* the thread count, which should not grow with connections;
+* write-to-notify latency percentiles;
+* whether every stream was released after disconnecting.
+
+Needs no configuration; run from backend/strenghty_backend:
+
+    python ../scripts/bench_push.py --connections 2000 --broker memory
+    python ../scripts/bench_push.py --connections 2000 --broker database
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "strenghty_backend"))
+_tmp = tempfile.mkdtemp(prefix="push-")
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--users", type=int, default=200)
+parser.add_argument("--connections", type=int, default=1000)
+parser.add_argument("--writes", type=int, default=100)
+parser.add_argument("--broker", choices=["memory", "database"], default="memory")
+parser.add_argument("--poll", type=float, default=0.1, help="PUSH_POLL_SECONDS for the database broker")
+args = parser.parse_args()
+
+os.environ["DJANGO_SETTINGS_MODULE"] = "strenghty_backend.settings"
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/default.sqlite3"
+os.environ.pop("DATABASE_SHARD_URLS", None)
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+os.environ["PUSH_BROKER"] = args.broker
+os.environ["PUSH_POLL_SECONDS"] = str(args.poll)
+os.environ["PUSH_HEARTBEAT_SECONDS"] = "300"
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from strenghty_backend.asgi import application  # noqa: E402
+from workouts import push  # noqa: E402
+from workouts.models import Exercise, Workout  # noqa: E402
+
+User = get_user_model()
+
+
+class Stream:
+    """One open /api/events/ connection and the set ids it has been told about."""
+
+    def __init__(self, token: str, arrivals: dict):
+        self.token = token
+        self.arrivals = arrivals
+        self.opened = asyncio.Event()
+        self.disconnect = asyncio.Event()
+        self.status = None
+        self._requested = False
+        self.task = None
+
+    async def _receive(self):
+        if not self._requested:
+            self._requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def _send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        elif message["type"] == "http.response.body":
+            now = time.perf_counter()
+            for line in message.get("body", b"").decode().splitlines():
+                if line.startswith("retry:"):
+                    self.opened.set()
+                elif line.startswith("data: "):
+                    event = json.loads(line[len("data: "):])
+                    if event["entity"] == "sets":
+                        for pk in event["ids"]:
+                            self.arrivals.setdefault(pk, []).append(now)
+
+    def open(self):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/api/events/",
+            "raw_path": b"/api/events/",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"localhost"), (b"authorization", f"Token {self.token}".encode())],
+            "client": ("127.0.0.1", 50000),
+            "server": ("localhost", 80),
+        }
+        self.task = asyncio.create_task(application(scope, self._receive, self._send))
+
+
+def setup_users(count: int) -> list[dict]:
+    users = []
+    for i in range(count):
+        user = User.objects.create_user(username=f"push-user-{i}", password="x")
+        users.append({
+            "user": user,
+            "token": Token.objects.create(user=user).key,
+            "exercise": Exercise.objects.create(owner=user, name="Bench", muscle_group="CHEST").pk,
+            "workout": Workout.objects.create(owner=user, name="Session", date="2025-01-01").pk,
+        })
+    return users
+
+
+def log_set(entry: dict) -> int:
+    client = APIClient()
+    client.force_authenticate(entry["user"])
+    response = client.post("/api/sets/", {"workout": entry["workout"], "exercise": entry["exercise"], "reps": 5,
+                                          "weight": "100", "unit": "kg"}, format="json")
+    return response.json()["id"]
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def main(users: list[dict]):
+    arrivals = {}
+    threads_before = threading.active_count()
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    streams = [Stream(users[i % len(users)]["token"], arrivals) for i in range(args.connections)]
+    for stream in streams:
+        stream.open()
+    await asyncio.wait_for(asyncio.gather(*(s.opened.wait() for s in streams)), timeout=120)
+    setup = time.perf_counter() - started
+    per_connection = (tracemalloc.get_traced_memory()[0] - baseline) / args.connections
+    tracemalloc.stop()
+    statuses = {s.status for s in streams}
+    print(f"\n{args.connections} connections open in {setup:.2f}s (statuses {statuses}), "
+          f"~{per_connection / 1024:.1f} KiB each, {push.broker().hub.connections()} in the hub")
+    print(f"threads: {threads_before} before, {threading.active_count()} with every stream open")
+
+    per_user = {}
+    for i in range(args.connections):
+        per_user[i % len(users)] = per_user.get(i % len(users), 0) + 1
+    latencies, missing = [], 0
+    rng = random.Random(0)
+    for _ in range(args.writes):
+        index = rng.randrange(len(users))
+        began = time.perf_counter()
+        set_id = await asyncio.to_thread(log_set, users[index])
+        deadline = time.perf_counter() + 5 + args.poll
+        while len(arrivals.get(set_id, ())) < per_user.get(index, 0) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.001)
+        got = arrivals.get(set_id, [])
+        if len(got) < per_user.get(index, 0):
+            missing += 1
+        elif got:
+            latencies.append(max(got) - began)
+    if latencies:
+        print(f"\nwrite-to-notify over {len(latencies)} writes: p50 {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms")
+    print(f"writes with a stream left unnotified: {missing}")
+
+    for stream in streams:
+        stream.disconnect.set()
+    await asyncio.wait_for(asyncio.gather(*(s.task for s in streams), return_exceptions=True), timeout=60)
+    print(f"after disconnecting: {push.broker().hub.connections()} connections in the hub")
+
+
+if __name__ == "__main__":
+    print(f"database in {_tmp}; broker {args.broker}")
+    call_command("migrate", verbosity=0)
+    asyncio.run(main(setup_users(args.users)))
@@ -0,0 +1,118 @@
+"""Compare per-user set queries through the workout join and via `owner`.
+
+Builds `--users` throwaway users with `--sets` strength sets each (spread
+over ~25-set workouts and 20 exercises), then times, for one of them, the
+set list (`GET /api/sets/`) and the PR history scan for one exercise both
+ways: filtered on `workout__owner` (a join to workouts_workout) and on the
+denormalized `owner` column. Prints the median of `--runs` runs and the
+query plans.
+
+Run from backend/strenghty_backend after migrating (point DATABASE_URL at
+Postgres for representative numbers):
+
+    python ../scripts/bench_set_owner.py --users 50 --sets 5000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "strenghty_backend"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "strenghty_backend.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+
+from workouts import deletion  # noqa: E402
+from workouts.models import Exercise, Workout, WorkoutSet  # noqa: E402
+
+User = get_user_model()
+
+SETS_PER_WORKOUT = 25
+PREFIX = "bench-set-owner-"
+
+
+def build_user(index: int, sets: int):
+    rng = random.Random(index)
+    user = User.objects.create_user(username=f"{PREFIX}{index}", is_active=False)
+    exercises = Exercise.objects.bulk_create(
+        [Exercise(owner=user, name=f"Exercise {i}", muscle_group="OTHER") for i in range(20)]
+    )
+    start = date(2015, 1, 1)
+    workouts = Workout.objects.bulk_create(
+        [Workout(owner=user, name="Session", date=start + timedelta(days=i)) for i in range(-(-sets // SETS_PER_WORKOUT))],
+        batch_size=2000,
+    )
+    WorkoutSet.objects.bulk_create(
+        [
+            WorkoutSet(
+                workout=workouts[i // SETS_PER_WORKOUT],
+                owner=user,
+                exercise=exercises[rng.randrange(20)],
+                set_number=i % SETS_PER_WORKOUT + 1,
+                reps=rng.randint(1, 12),
+                weight=rng.randint(20, 200),
+                set_type=rng.choice("WSSSF"),
+            )
+            for i in range(sets)
+        ],
+        batch_size=2000,
+    )
+    return user, exercises[0]
+
+
+def queries(owner_field: str, user, exercise) -> dict:
+    owned = {owner_field: user}
+    return {
+        "set list": WorkoutSet.objects.filter(**owned).order_by("workout", "set_number"),
+        "PR scan": WorkoutSet.objects.filter(
+            **owned, exercise=exercise, set_type__in=["S", "F"], weight__gt=0, reps__gt=0
+        ).order_by().values_list("weight", "unit", "reps"),
+    }
+
+
+def time_query(qs, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        list(qs.all())
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--sets", type=int, default=5000, help="Strength sets per user")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--keep", action="store_true", help="Leave the synthetic users in place")
+    args = parser.parse_args()
+
+    print(f"Building {args.users} users x {args.sets} sets...")
+    built = [build_user(i, args.sets) for i in range(args.users)]
+    user, exercise = built[len(built) // 2]
+    try:
+        joined = queries("workout__owner", user, exercise)
+        direct = queries("owner", user, exercise)
+        for name in joined:
+            before = time_query(joined[name], args.runs)
+            after = time_query(direct[name], args.runs)
+            print(f"\n{name}: workout__owner {before * 1000:.1f} ms, owner {after * 1000:.1f} ms "
+                  f"({before / after if after else float('inf'):.1f}x)")
+            print("  via workout__owner:\n    " + joined[name].explain().replace("\n", "\n    "))
+            print("  via owner:\n    " + direct[name].explain().replace("\n", "\n    "))
+    finally:
+        if not args.keep:
+            for built_user, _ in built:
+                deletion.delete_user_data(built_user.pk)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Measure backend cold-start time: imports, django.setup() and first request.
+
+Each run starts a fresh interpreter under `python -X importtime` that
+times, in order:
+
+    setup          import django + django.setup() (settings, apps, models)
+    wsgi app       building the handler and its middleware, as wsgi.py does
+    urlconf        importing the root URLconf (views, serializers, admin)
+    warm_up        strenghty_backend.warmup.warm_up(), with --warmup only
+    first request  GET /api/public-config/ through the full middleware stack
+    next request   the same request again, i.e. the steady state
+
+and then parses the importtime report from stderr into self time per
+top-level package and the slowest modules by cumulative time. Timings are
+medians over --runs runs.
+
+Run from backend/strenghty_backend:
+
+    python ../scripts/bench_startup.py --runs 5
+    WARMUP_ON_START=0 python ../scripts/bench_startup.py --warmup
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "strenghty_backend")
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t1 = time.perf_counter()
+from django.conf import settings
+from django.test import Client
+client = Client()
+client.handler.load_middleware()
+t_wsgi = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().urlconf_module
+t2 = time.perf_counter()
+if {warmup}:
+    from strenghty_backend.warmup import warm_up
+    warm_up()
+t3 = time.perf_counter()
+host = next((h for h in settings.ALLOWED_HOSTS if h and "*" not in h), "localhost").lstrip(".")
+status = client.get("/api/public-config/", HTTP_HOST=host).status_code
+t4 = time.perf_counter()
+client.get("/api/public-config/", HTTP_HOST=host)
+t5 = time.perf_counter()
+print(json.dumps({{
+    "status": status,
+    "setup": t1 - t0, "wsgi app": t_wsgi - t1, "urlconf": t2 - t_wsgi, "warm_up": t3 - t2,
+    "first request": t4 - t3, "next request": t5 - t4, "total": t4 - t0,
+}}))
+"""
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every line of an importtime report."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return rows
+
+
+def run_once(warmup: bool) -> tuple[dict, list]:
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "strenghty_backend.settings")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD.format(warmup=warmup)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr[-4000:])
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    return timings, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", action="store_true", help="Call warm_up() between the URLconf and the first request")
+    parser.add_argument("--top", type=int, default=15, help="Modules/packages to list")
+    args = parser.parse_args()
+
+    # One throwaway run so every run after it sees compiled .pyc files.
+    run_once(args.warmup)
+    results, reports = [], []
+    for _ in range(args.runs):
+        timings, report = run_once(args.warmup)
+        results.append(timings)
+        reports.append(report)
+
+    print(f"median of {args.runs} runs (first response: HTTP {results[0]['status']})")
+    for phase in ("setup", "wsgi app", "urlconf", "warm_up", "first request", "next request", "total"):
+        if phase == "warm_up" and not args.warmup:
+            continue
+        print(f"  {phase:<14} {statistics.median(r[phase] for r in results) * 1000:8.1f} ms")
+
+    by_package = defaultdict(list)
+    by_module = defaultdict(list)
+    for report in reports:
+        package_self = defaultdict(int)
+        for module, self_us, cumulative_us in report:
+            package_self[module.split(".")[0]] += self_us
+            by_module[module].append(cumulative_us)
+        for package, total in package_self.items():
+            by_package[package].append(total)
+
+    print(f"\nimport self time by top-level package (top {args.top})")
+    for package, values in sorted(by_package.items(), key=lambda kv: -statistics.median(kv[1]))[: args.top]:
+        print(f"  {package:<32} {statistics.median(values) / 1000:8.1f} ms")
+    print(f"\nslowest modules by cumulative import time (top {args.top})")
+    for module, values in sorted(by_module.items(), key=lambda kv: -statistics.median(kv[1]))[: args.top]:
+        print(f"  {module:<48} {statistics.median(values) / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
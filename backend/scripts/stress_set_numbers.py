@@ -0,0 +1,107 @@
+"""Stress concurrent set logging against a single workout/exercise pair.
+
+Starts N threads that each POST M strength sets (and, with --cardio, M
+cardio sets) to the same workout and exercise through the API views, then
+checks that every request succeeded and that the stored set numbers are
+exactly 1..N*M with no duplicates or gaps. Prints requests/sec.
+
+Run from backend/strenghty_backend. SQLite serializes writers, so point
+DATABASE_URL at Postgres to see real contention on the counter row:
+
+    python ../scripts/stress_set_numbers.py --threads 16 --sets 50
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "strenghty_backend"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "strenghty_backend.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from workouts.models import CardioSet, Exercise, Workout, WorkoutSet  # noqa: E402
+
+User = get_user_model()
+
+
+def worker(user, path: str, payload: dict, count: int, barrier, statuses: Counter, lock):
+    client = APIClient()
+    client.force_authenticate(user)
+    local = Counter()
+    barrier.wait()
+    try:
+        for _ in range(count):
+            local[client.post(path, payload, format="json").status_code] += 1
+    finally:
+        connection.close()
+    with lock:
+        statuses.update(local)
+
+
+def check(model, workout, exercise, expected: int) -> bool:
+    numbers = list(model.objects.filter(workout=workout, exercise=exercise).values_list("set_number", flat=True))
+    dupes = [n for n, c in Counter(numbers).items() if c > 1]
+    ok = len(numbers) == expected and sorted(numbers) == list(range(1, expected + 1))
+    print(f"  {model.__name__}: {len(numbers)} rows, {len(dupes)} duplicate numbers, contiguous={ok}")
+    return ok and not dupes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--sets", type=int, default=50, help="Sets per thread")
+    parser.add_argument("--cardio", action="store_true", help="Also log cardio sets concurrently")
+    args = parser.parse_args()
+
+    user = User.objects.create_user(username=f"stress_sets_{int(time.time())}")
+    try:
+        exercise = Exercise.objects.create(owner=user, name="Stress Bench", muscle_group="CHEST")
+        workout = Workout.objects.create(owner=user, name="Stress", date=date.today())
+
+        jobs = [("/api/sets/", {"workout": workout.pk, "exercise": exercise.pk, "reps": 5, "weight": "100", "unit": "kg"})]
+        if args.cardio:
+            jobs.append(
+                ("/api/cardio-sets/", {"workout": workout.pk, "exercise": exercise.pk, "mode": "ROW", "duration_seconds": 60})
+            )
+
+        statuses = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(args.threads * len(jobs))
+        threads = [
+            threading.Thread(target=worker, args=(user, path, payload, args.sets, barrier, statuses, lock))
+            for path, payload in jobs
+            for _ in range(args.threads)
+        ]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        total = args.threads * args.sets * len(jobs)
+        print(f"{total} requests from {len(threads)} threads in {elapsed:.2f}s -> {total / elapsed:.0f} req/s")
+        print(f"  responses: {dict(statuses)}")
+        ok = check(WorkoutSet, workout, exercise, args.threads * args.sets)
+        if args.cardio:
+            ok = check(CardioSet, workout, exercise, args.threads * args.sets) and ok
+        ok = ok and statuses == Counter({201: total})
+        print("OK: no collisions" if ok else "FAILED")
+        sys.exit(0 if ok else 1)
+    finally:
+        user.delete()
+
+
+if __name__ == "__main__":
+    main()
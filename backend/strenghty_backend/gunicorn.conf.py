@@ -0,0 +1,30 @@
+"""Gunicorn settings picked up from the working directory (see entrypoint.sh).
+
+Command-line flags in entrypoint.sh still take precedence; this file only
+holds the server hooks.
+"""
+
+
+def post_fork(server, worker):
+    # Under --preload the master warmed up and closed its connections before
+    # forking (strenghty_backend/warmup.py). Open this worker's own now; with
+    # CONN_MAX_AGE set it is still there for the first request.
+    #
+    # Only with sync workers (SERVER_MODE=wsgi), which serve requests on the
+    # thread running this hook. Connections are per thread, and Django's ASGI
+    # handler runs each request's database work on a thread of its own, so
+    # under the uvicorn worker a connection opened here would never be used.
+    if server.cfg.worker_class_str != "sync":
+        return
+    from django.conf import settings
+
+    if not settings.configured or not getattr(settings, "WARMUP_ON_START", False):
+        return
+    from django.db import connections
+
+    for conn in connections.all():
+        try:
+            conn.ensure_connection()
+        except Exception:
+            # The first request will retry and report the error properly.
+            server.log.exception("worker %s could not pre-connect to %s", worker.pid, conn.alias)
@@ -2,15 +2,78 @@
 ASGI config for strenghty_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+entrypoint.sh serves it with ``gunicorn -k uvicorn_worker.UvicornWorker``;
+that is what makes the ``/api/events/`` push stream (workouts/push.py)
+available, and everything else works the same as under WSGI.
+
+Push streams skip Django's request handler: it runs the middleware hooks
+and request signals on a thread per request and keeps that thread until
+the response ends, so every open stream would hold one. They only go
+through CORS; the view does its own token auth.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
 
+import asyncio
+import io
 import os
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'strenghty_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, "WARMUP_ON_START", False):
+    from .warmup import warm_up
+
+    warm_up()
+
+from corsheaders.middleware import CorsMiddleware  # noqa: E402
+from django.core.handlers.asgi import ASGIRequest  # noqa: E402
+from django.core.handlers.exception import convert_exception_to_response  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from workouts.views import push_events  # noqa: E402
+
+PUSH_PATH = reverse("push_events")
+_push_handler = convert_exception_to_response(CorsMiddleware(convert_exception_to_response(push_events)))
+
+
+async def _disconnected(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _send_response(response, send):
+    headers = [(key.encode("latin-1"), value.encode("latin-1")) for key, value in response.items()]
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+    if response.streaming:
+        async for chunk in response.streaming_content:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    else:
+        await send({"type": "http.response.body", "body": response.content})
+
+
+async def _push_application(scope, receive, send):
+    # The stream is a GET: its one request message carries no body.
+    await receive()
+    response = await _push_handler(ASGIRequest(scope, io.BytesIO()))
+    tasks = [asyncio.create_task(_send_response(response, send)), asyncio.create_task(_disconnected(receive))]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # Cancelling the send ends the stream's subscription.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == PUSH_PATH:
+        return await _push_application(scope, receive, send)
+    return await django_application(scope, receive, send)
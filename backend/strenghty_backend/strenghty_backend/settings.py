@@ -40,7 +40,8 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 FRONTEND_URL = os.getenv("FRONTEND_URL", "")
 
 # Optional secret used for one-off admin operations (like data export).
-# When set in the environment, it is used by ExportDataView.
+# When set in the environment, ExportDataView (/api/export/) accepts it in
+# the X-Export-Secret header to export any user's data.
 EXPORT_SECRET = os.environ.get("EXPORT_SECRET", None)
 
 # Application definition
@@ -63,6 +64,8 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    "workouts.routing.ReplicaRoutingMiddleware",
+    "workouts.sharding.ShardMiddleware",
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -105,6 +108,31 @@ DATABASE_URL = os.environ.get('DATABASE_URL')
 if DATABASE_URL:
     DATABASES['default'] = dj_database_url.parse(DATABASE_URL, conn_max_age=600)
 
+# Optional read replicas, comma-separated URLs -> aliases replica1, replica2, ...
+# Safe-method requests read workouts data from them (see workouts/routing.py).
+DATABASE_REPLICA_URLS = [u.strip() for u in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+for _i, _url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    DATABASES[f"replica{_i}"] = dj_database_url.parse(_url, conn_max_age=600)
+    DATABASES[f"replica{_i}"]["TEST"] = {"MIRROR": "default"}
+# Read-your-writes window after an unsafe request, and the lag past which a
+# replica is skipped (checked at most every REPLICA_LAG_CHECK_SECONDS).
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", "10"))
+REPLICA_LAG_CHECK_SECONDS = float(os.environ.get("REPLICA_LAG_CHECK_SECONDS", "5"))
+
+# Optional sharding of workouts data by owner (see workouts/sharding.py):
+# comma-separated URLs -> aliases shard1, shard2, ..., used alongside default.
+# Run `migrate --database shardN` for each before enabling.
+DATABASE_SHARD_URLS = [u.strip() for u in os.environ.get("DATABASE_SHARD_URLS", "").split(",") if u.strip()]
+for _i, _url in enumerate(DATABASE_SHARD_URLS, start=1):
+    DATABASES[f"shard{_i}"] = dj_database_url.parse(_url, conn_max_age=600)
+# How long workers may route a user from a cached directory entry.
+SHARD_DIRECTORY_CACHE_SECONDS = int(os.environ.get("SHARD_DIRECTORY_CACHE_SECONDS", "30"))
+
+DATABASE_ROUTERS = (["workouts.sharding.ShardRouter"] if DATABASE_SHARD_URLS else []) + (
+    ["workouts.routing.ReplicaRouter"] if DATABASE_REPLICA_URLS else []
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -151,12 +179,27 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Google OAuth client ID removed — Google sign-in functionality disabled.
 
+# Reverse proxies in front of the app that append to X-Forwarded-For. DRF
+# takes the client address (used by the auth throttles) that many hops from
+# the right of the header; the rest of it is whatever the client sent.
+# Render's load balancer is one hop; set NUM_PROXIES=0 when clients connect
+# directly, or DRF would trust a client-supplied header.
+NUM_PROXIES = int(os.environ.get("NUM_PROXIES", "1"))
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        # DRF's TokenAuthentication, plus the last-used time `manage.py reap` goes by.
+        "workouts.authentication.TrackedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",  # keep for browsable API
-    ]
+    ],
+    "NUM_PROXIES": NUM_PROXIES,
 }
+if DATABASE_SHARD_URLS:
+    # Same classes, but they also activate the user's shard.
+    REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"] = [
+        "workouts.sharding.ShardedTokenAuthentication",
+        "workouts.sharding.ShardedSessionAuthentication",
+    ]
 
 
 # Basic logging configuration that prints to stdout (useful on Render).
@@ -260,6 +303,66 @@ DEFAULT_FROM_EMAIL = os.environ.get(
 # the following line to print emails to the console instead of sending:
 # EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
+# Password reset OTPs are accepted for this long; `manage.py reap` deletes
+# them once they expire or are used.
+PASSWORD_RESET_CODE_TTL_MINUTES = int(os.environ.get("PASSWORD_RESET_CODE_TTL_MINUTES", "30"))
+
+# Token-bucket limits for endpoints that hash passwords (login, register,
+# account update, password reset confirm). See workouts/throttling.py.
+# Format is "<burst>/<period>"; point CACHES at a shared backend to enforce
+# the limits across workers as well as per process.
+AUTH_THROTTLE_ENABLED = os.environ.get("AUTH_THROTTLE_ENABLED", "1") == "1"
+AUTH_THROTTLE_IP_RATE = os.environ.get("AUTH_THROTTLE_IP_RATE", "30/min")
+AUTH_THROTTLE_USERNAME_RATE = os.environ.get("AUTH_THROTTLE_USERNAME_RATE", "10/min")
+
+# Background job queue (see workouts/jobs.py and `manage.py run_worker`).
+# entrypoint.sh starts a worker next to gunicorn unless RUN_WORKER=0. Set
+# JOBS_EAGER=1 to run jobs in-process right after the request commits
+# instead, e.g. for local development without a worker.
+JOBS_EAGER = os.environ.get("JOBS_EAGER", "0") == "1"
+JOBS_MAX_ATTEMPTS = int(os.environ.get("JOBS_MAX_ATTEMPTS", "5"))
+JOBS_BACKOFF_BASE_SECONDS = int(os.environ.get("JOBS_BACKOFF_BASE_SECONDS", "10"))
+JOBS_BACKOFF_MAX_SECONDS = int(os.environ.get("JOBS_BACKOFF_MAX_SECONDS", "3600"))
+# Jobs left `running` longer than this are assumed orphaned and requeued.
+JOBS_LOCK_TIMEOUT_SECONDS = int(os.environ.get("JOBS_LOCK_TIMEOUT_SECONDS", "600"))
+
+# Idempotency-Key replay for create/update in the workouts viewsets (see
+# workouts/idempotency.py). Responses are kept per process and in CACHES.
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+# How long a retry waits for an in-flight original before answering 409.
+IDEMPOTENCY_WAIT_SECONDS = int(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# How long the cross-worker lock is held at most. Keep it above the longest a
+# write can take (gunicorn's --timeout, 30s by default) so it never expires
+# under a request that is still running.
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", "300"))
+
+# Prime URL resolution, serializer introspection and the DB driver when the
+# app is loaded instead of on the first request (strenghty_backend/warmup.py).
+# Combine with gunicorn --preload so it happens once in the master. Workers
+# only pre-open database connections with SERVER_MODE=wsgi (gunicorn.conf.py).
+WARMUP_ON_START = os.environ.get("WARMUP_ON_START", "0") == "1"
+
+# Cold storage for old history (workouts/archive.py, `manage.py archive_history`).
+# Finished workouts from calendar years that ended more than this many days
+# ago are moved into one compressed row per user and year. ARCHIVE_CODEC is
+# "gzip" or "zstd" (the latter needs the `zstandard` package).
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "730"))
+ARCHIVE_CODEC = os.environ.get("ARCHIVE_CODEC", "gzip")
+
+# Change notifications pushed to connected clients over Server-Sent Events
+# (workouts/push.py, served by the ASGI app at /api/events/). PUSH_BROKER is
+# "database" (PushEvent rows polled every PUSH_POLL_SECONDS; works across
+# the entrypoint's GUNICORN_WORKERS), "memory" (only with a single worker)
+# or a dotted path to a Broker.
+PUSH_BROKER = os.environ.get("PUSH_BROKER", "database")
+PUSH_POLL_SECONDS = float(os.environ.get("PUSH_POLL_SECONDS", "1"))
+PUSH_HEARTBEAT_SECONDS = float(os.environ.get("PUSH_HEARTBEAT_SECONDS", "15"))
+# How far back a reconnecting client can resume: events kept in memory, and
+# the age past which `manage.py reap` deletes PushEvent rows.
+PUSH_BACKLOG = int(os.environ.get("PUSH_BACKLOG", "1000"))
+PUSH_RETENTION_SECONDS = int(os.environ.get("PUSH_RETENTION_SECONDS", "3600"))
+
 # --------- HARD CORS SAFETY CONFIG (PRODUCTION) ---------
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -280,5 +383,6 @@ CORS_ALLOW_HEADERS = [
     "origin",
     "x-csrftoken",
     "x-requested-with",
+    "idempotency-key",
 ]
 # --------------------------------------------------------
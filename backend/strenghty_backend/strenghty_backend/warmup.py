@@ -0,0 +1,101 @@
+"""Prime per-process caches before the first request is served.
+
+Django defers a lot of work to the first request: importing the URLconf
+(and through it every view, serializer and the admin), compiling the URL
+patterns, building model `_meta` caches, importing DRF's default classes,
+and importing and configuring the database driver. On a cold-started
+instance that lands on a real user.
+
+`warm_up()` does that work up front. It is called from `wsgi.py` and
+`asgi.py` when `WARMUP_ON_START` is set. Under `gunicorn --preload` (see
+entrypoint.sh) it runs once in the master and the forked workers inherit
+the warm memory. Database connections can't be shared across a fork, so
+the check connection is closed again. With SERVER_MODE=wsgi each worker
+opens its own from the gunicorn `post_fork` hook in gunicorn.conf.py.
+Under ASGI there is nothing to pre-open: Django runs every request's
+database work on a fresh thread with its own connection, so only the
+import and driver set-up carry over.
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Representative paths resolved to compile the patterns they go through.
+_PATHS = ("/health", "/api/public-config/", "/api/workouts/", "/api/workouts/1/", "/admin/")
+
+
+def _urls():
+    from django.urls import Resolver404, get_resolver
+
+    resolver = get_resolver()
+    # Building the reverse dict imports every view module and compiles
+    # every pattern once.
+    resolver.reverse_dict
+    for path in _PATHS:
+        try:
+            resolver.resolve(path)
+        except Resolver404:
+            pass
+
+
+def _serializers():
+    from rest_framework import serializers
+
+    from workouts import serializers as workout_serializers
+
+    for obj in vars(workout_serializers).values():
+        if (
+            isinstance(obj, type)
+            and issubclass(obj, serializers.ModelSerializer)
+            and obj.__module__ == workout_serializers.__name__
+        ):
+            # `.fields` runs the model introspection DRF otherwise does on
+            # the first request using this serializer.
+            obj().fields
+
+
+def _rest_framework():
+    from rest_framework.settings import api_settings
+
+    # DRF imports its default classes from dotted paths on first access.
+    for name in (
+        "DEFAULT_RENDERER_CLASSES",
+        "DEFAULT_PARSER_CLASSES",
+        "DEFAULT_AUTHENTICATION_CLASSES",
+        "DEFAULT_PERMISSION_CLASSES",
+        "DEFAULT_THROTTLE_CLASSES",
+        "DEFAULT_CONTENT_NEGOTIATION_CLASS",
+        "DEFAULT_METADATA_CLASS",
+        "EXCEPTION_HANDLER",
+    ):
+        getattr(api_settings, name)
+
+
+def _database():
+    from django.db import connections
+
+    for conn in connections.all():
+        conn.ensure_connection()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    connections.close_all()
+
+
+def warm_up(database: bool = True) -> dict:
+    """Run every warm-up step; returns {step: seconds} for logging."""
+    timings = {}
+    steps = [("urls", _urls), ("serializers", _serializers), ("rest_framework", _rest_framework)]
+    if database:
+        steps.append(("database", _database))
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            # A failed warm-up only costs the first request its head start.
+            logger.exception("warm-up step %s failed", name)
+        timings[name] = time.perf_counter() - started
+    logger.info("warm-up done: %s", ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items()))
+    return timings
@@ -0,0 +1,66 @@
+"""Workout counts per day for the activity calendar and the monthly goal.
+
+Drawing the calendar and checking `Profile.monthly_workouts` used to mean
+fetching every workout. `calendar()` answers both with a GROUP BY on
+`(owner, date)` over the requested range (an index-only scan of the
+workout table's `(owner, date)` index) plus one count for the current
+month, so the response stays a few hundred bytes however long the account
+has existed. Archived years (`workouts.archive`) are only decoded when the
+range reaches into them.
+"""
+
+from datetime import date, timedelta
+
+from django.db.models import Count
+from django.utils import timezone
+
+from . import archive
+from .models import Profile, Workout
+
+DEFAULT_DAYS = 365
+MAX_DAYS = 731
+
+
+def default_range(today: date | None = None) -> tuple[date, date]:
+    """The `DEFAULT_DAYS` up to and including `today` (the current date by default)."""
+    today = today or timezone.localdate()
+    return today - timedelta(days=DEFAULT_DAYS - 1), today
+
+
+def day_counts(user, start: date, end: date) -> dict[date, int]:
+    """{date: workouts logged that day} for days with any, `start` to `end` inclusive."""
+    counts = archive.workout_days(user.pk, start, end)
+    rows = (
+        Workout.objects.filter(owner=user, date__gte=start, date__lte=end)
+        .order_by()
+        .values_list("date")
+        .annotate(n=Count("*"))
+    )
+    counts.update(dict(rows))
+    return dict(sorted(counts.items()))
+
+
+def month_progress(user, today: date | None = None) -> dict:
+    """Workouts logged so far this month against the profile's monthly goal."""
+    today = today or timezone.localdate()
+    start = today.replace(day=1)
+    done = Workout.objects.filter(owner=user, date__gte=start, date__lte=today).count()
+    goal = Profile.objects.filter(user=user).values_list("monthly_workouts", flat=True).first()
+    return {
+        "month": start.strftime("%Y-%m"),
+        "workouts": done,
+        "goal": goal,
+        "remaining": None if goal is None else max(0, goal - done),
+        "progress": round(done / goal, 3) if goal else None,
+    }
+
+
+def calendar(user, start: date, end: date, today: date | None = None) -> dict:
+    days = day_counts(user, start, end)
+    return {
+        "from": start,
+        "to": end,
+        "total": sum(days.values()),
+        "days": {day.isoformat(): n for day, n in days.items()},
+        "month": month_progress(user, today),
+    }
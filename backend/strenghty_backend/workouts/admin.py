@@ -1,28 +1,134 @@
+from django import forms
 from django.contrib import admin
-from .models import Exercise, Workout, WorkoutSet, CardioSet
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .models import ArchivedYear, Exercise, Workout, WorkoutSet, CardioSet, Job
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never runs an unbounded COUNT(*) on a large table.
+
+    Unfiltered changelists on Postgres use the planner's row estimate from
+    `pg_class` once the table is past `estimate_threshold`. Filtered ones
+    count at most `max_count` rows; beyond that the last pages simply
+    aren't linked, which nobody misses on a list of millions of sets.
+    """
+
+    estimate_threshold = 100_000
+    max_count = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            # reltuples is -1 for tables that have never been analyzed.
+            if row and row[0] >= self.estimate_threshold:
+                return row[0]
+            return queryset.count()
+        return queryset[: self.max_count].count()
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """Sidebar filter for a foreign key that uses the admin's autocomplete widget.
+
+    The stock `RelatedFieldListFilter` renders every related row as a link,
+    which for exercises means every exercise of every user. This one renders a
+    single select2 box backed by the related admin's `search_fields`, so only
+    the selected object is ever loaded.
+    """
+
+    template = "admin/workouts/autocomplete_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f"{field_path}__{field.target_field.name}__exact"
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.lookup_val = (self.used_parameters.get(self.lookup_kwarg) or [None])[-1]
+        self.title = getattr(field, "verbose_name", field_path)
+        form_field = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site),
+            required=False,
+        )
+        self.widget_id = f"id_filter_{self.lookup_kwarg}"
+        self.rendered_widget = form_field.widget.render(
+            self.lookup_kwarg, self.lookup_val, attrs={"id": self.widget_id}
+        )
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        return {}
+
+    def choices(self, changelist):
+        yield {
+            "selected": self.lookup_val is None,
+            "query_string": changelist.get_query_string(remove=[self.lookup_kwarg]),
+            "display": "All",
+        }
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Changelist defaults for tables that grow with every logged set."""
+
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) behind "N total".
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        # Filters don't contribute media, so pull in select2 for AutocompleteFilter.
+        return super().media + AutocompleteSelect(None, self.admin_site).media
+
 
 @admin.register(Exercise)
-class ExerciseAdmin(admin.ModelAdmin):
+class ExerciseAdmin(ScalableAdmin):
     list_display = ("name", "owner", "muscle_group","created_at")
-    list_filter = ("muscle_group",)
-    search_fields = ("name", "owner__username")
-    
-    
+    list_filter = ("muscle_group", ("owner", AutocompleteFilter))
+    ordering = ("name",)
+    list_select_related = ("owner",)
+    autocomplete_fields = ("owner",)
+    # Prefix/exact lookups only: both columns are indexed, `icontains` never is.
+    search_fields = ("name__startswith", "owner__username__exact")
+    search_help_text = "Exercise name prefix or exact username (case-sensitive)."
+
+
 @admin.register(Workout)
-class WorkoutAdmin(admin.ModelAdmin):
+class WorkoutAdmin(ScalableAdmin):
     list_display = ("owner","date","name","created_at")
-    list_filter = ("date"),
-    search_fields = ("owner__username","name" )
-    
-    
+    list_filter = ("date", ("owner", AutocompleteFilter))
+    list_select_related = ("owner",)
+    autocomplete_fields = ("owner",)
+    search_fields = ("owner__username__exact",)
+    search_help_text = "Exact username."
+
+
 @admin.register(WorkoutSet)
-class WorkoutSetAdmin(admin.ModelAdmin):
+class WorkoutSetAdmin(ScalableAdmin):
     list_display = ("workout","exercise","set_number","reps","weight","is_pr")
-    list_filter = ("exercise","is_pr")
+    list_filter = (("exercise", AutocompleteFilter), ("owner", AutocompleteFilter), "is_pr")
+    list_select_related = ("workout__owner", "exercise__owner")
+    raw_id_fields = ("workout",)
+    autocomplete_fields = ("exercise",)
+    search_fields = ("owner__username__exact",)
+    search_help_text = "Exact username."
+    # The model ordering sorts through Workout's (-date, -created_at); the
+    # primary key keeps the changelist an index scan.
+    ordering = ("-id",)
 
 
 @admin.register(CardioSet)
-class CardioSetAdmin(admin.ModelAdmin):
+class CardioSetAdmin(ScalableAdmin):
     list_display = (
         "workout",
         "exercise",
@@ -34,5 +140,28 @@ class CardioSetAdmin(admin.ModelAdmin):
         "level",
         "is_pr",
     )
-    list_filter = ("mode", "is_pr")
+    list_filter = ("mode", ("exercise", AutocompleteFilter), ("owner", AutocompleteFilter), "is_pr")
+    list_select_related = ("workout__owner", "exercise__owner")
+    raw_id_fields = ("workout",)
+    autocomplete_fields = ("exercise",)
+    search_fields = ("owner__username__exact",)
+    search_help_text = "Exact username."
+    ordering = ("-id",)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "priority", "attempts", "run_at", "locked_by", "updated_at")
+    list_filter = ("status", "name")
+    readonly_fields = ("created_at", "updated_at")
+
 
+@admin.register(ArchivedYear)
+class ArchivedYearAdmin(admin.ModelAdmin):
+    list_display = ("owner", "year", "workout_count", "set_count", "cardio_set_count", "codec", "updated_at")
+    list_filter = ("year", "codec")
+    list_select_related = ("owner",)
+    search_fields = ("owner__username__exact",)
+    search_help_text = "Exact username."
+    # Written only by workouts.archive; the payload isn't editable anyway.
+    readonly_fields = ("owner", "year", "codec", "bests", "workout_count", "set_count", "cardio_set_count", "created_at", "updated_at")
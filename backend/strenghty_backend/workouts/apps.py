@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class WorkoutsConfig(AppConfig):
+    # Shards hand out ids from N * sharding.ID_SPACING, past the int4 range.
+    default_auto_field = "django.db.models.BigAutoField"
     name = 'workouts'
+
+    def ready(self):
+        # Register background job handlers with the queue.
+        from . import tasks  # noqa: F401
+        from . import sharding
+
+        # Give each shard its own primary key range (no-op without shards).
+        post_migrate.connect(sharding.offset_sequences, sender=self)
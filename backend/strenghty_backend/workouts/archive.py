@@ -0,0 +1,335 @@
+"""Cold storage for old training history.
+
+Most reads touch the last few months, but the set tables and their indexes
+grow with every year of every user's history. `archive_user` (run by
+`manage.py archive_history`) moves finished workouts from calendar years
+that ended more than `ARCHIVE_AFTER_DAYS` ago out of the live tables: each
+user's year becomes one `ArchivedYear` row whose payload holds the
+workouts, sets and cardio sets as column arrays (JSON, compressed with
+`ARCHIVE_CODEC`), written in the same transaction that deletes the rows.
+
+Reads merge the archive back in. The workout and set endpoints and the
+export serve archived rows, with their original ids, next to live ones;
+the activity calendar counts archived workouts per day.
+Anything that writes to an archived workout or set calls `rehydrate_ids`
+first, which moves the whole year back into the live tables (ids and
+timestamps unchanged) and drops its archive row; a later run archives it
+again. PR checks read the per-exercise bests saved with each year
+(`workouts.prs`) instead of decoding payloads.
+
+Sets whose exercise has been deleted since are left out of reads and
+dropped on rehydration, as the live cascade would have done.
+
+Like `workouts.deletion`, everything except `archive_user` works on the
+active shard.
+"""
+
+import gzip
+import json
+import threading
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import router
+from django.utils import timezone
+
+from . import deletion
+from . import prs
+from . import sharding
+from . import summaries
+from .models import ArchivedYear, CardioSet, Exercise, Workout, WorkoutSet
+
+try:
+    import zstandard
+except ImportError:  # only needed for ARCHIVE_CODEC=zstd
+    zstandard = None
+
+FORMAT_VERSION = 1
+# entity -> model, parents first.
+ENTITIES = {"workouts": Workout, "sets": WorkoutSet, "cardio_sets": CardioSet}
+# Decoded payloads kept per process, keyed by (row id, updated_at).
+DECODE_CACHE_SIZE = 64
+
+_decode_cache: OrderedDict = OrderedDict()
+_decode_lock = threading.Lock()
+
+
+def archive_before_year(today: date | None = None, after_days: int | None = None) -> int:
+    """First calendar year that stays live: every earlier one ended over `after_days` ago.
+
+    `after_days` defaults to `ARCHIVE_AFTER_DAYS`.
+    """
+    today = today or timezone.localdate()
+    if after_days is None:
+        after_days = getattr(settings, "ARCHIVE_AFTER_DAYS", 730)
+    return (today - timedelta(days=after_days)).year
+
+
+def _codec() -> str:
+    codec = getattr(settings, "ARCHIVE_CODEC", ArchivedYear.CODEC_GZIP)
+    if codec not in dict(ArchivedYear.CODEC_CHOICES):
+        raise ImproperlyConfigured(f"ARCHIVE_CODEC must be one of: {', '.join(dict(ArchivedYear.CODEC_CHOICES))}.")
+    if codec == ArchivedYear.CODEC_ZSTD and zstandard is None:
+        raise ImproperlyConfigured("ARCHIVE_CODEC=zstd needs the zstandard package.")
+    return codec
+
+
+def _compress(raw: bytes, codec: str) -> bytes:
+    if codec == ArchivedYear.CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=19).compress(raw)
+    return gzip.compress(raw, compresslevel=9)
+
+
+def _decompress(blob, codec: str) -> bytes:
+    # Postgres hands BinaryField values back as memoryview.
+    blob = bytes(blob)
+    if codec == ArchivedYear.CODEC_ZSTD:
+        if zstandard is None:
+            raise ImproperlyConfigured("Archived years are zstd-compressed; install the zstandard package.")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _columns(model) -> list[str]:
+    # The owner is the archive row's.
+    return [f.attname for f in model._meta.concrete_fields if f.attname != "owner_id"]
+
+
+def _pack(objects: dict) -> bytes:
+    """{entity: [instances]} -> JSON with one array per column."""
+    payload = {"version": FORMAT_VERSION}
+    for entity, model in ENTITIES.items():
+        rows = sorted(objects[entity], key=lambda obj: obj.pk)
+        payload[entity] = {column: [_plain(getattr(obj, column)) for obj in rows] for column in _columns(model)}
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def _instances(model, columns: dict, owner_id: int, rows=None) -> list:
+    """Model instances for the given row indexes (default: all) of one entity's columns."""
+    rows = range(len(columns["id"])) if rows is None else rows
+    fields = model._meta.concrete_fields
+    converted = []
+    for field in fields:
+        if field.attname == "owner_id":
+            converted.append([owner_id] * len(rows))
+        elif field.attname in columns:
+            values = columns[field.attname]
+            converted.append([None if values[i] is None else field.to_python(values[i]) for i in rows])
+        else:
+            # Column added after this year was archived.
+            converted.append([field.get_default()] * len(rows))
+    names = [f.attname for f in fields]
+    alias = sharding.current()
+    objs = [model.from_db(alias, names, list(values)) for values in zip(*converted)]
+    if model is WorkoutSet and "weight_kg" not in columns:
+        # Archived before the kg metric columns existed; derive them.
+        for obj in objs:
+            obj.set_kg_metrics()
+    return objs
+
+
+def _decoded(user_id: int, years: range | None = None) -> list[tuple[int, dict]]:
+    """(year, decoded payload) for each of the user's archived years, newest first.
+
+    `years` limits this to the archived years within it. Payloads are
+    shared through the process cache; treat them as read-only.
+    """
+    entries = ArchivedYear.objects.filter(owner_id=user_id)
+    if years is not None:
+        entries = entries.filter(year__gte=years.start, year__lt=years.stop)
+    entries = list(entries.order_by("-year").values_list("pk", "year", "updated_at"))
+    found, missing = {}, []
+    with _decode_lock:
+        for pk, _, updated_at in entries:
+            data = _decode_cache.get((pk, updated_at))
+            if data is None:
+                missing.append(pk)
+            else:
+                _decode_cache.move_to_end((pk, updated_at))
+                found[pk] = data
+    if missing:
+        for pk, updated_at, codec, payload in ArchivedYear.objects.filter(pk__in=missing).values_list(
+            "pk", "updated_at", "codec", "payload"
+        ):
+            found[pk] = json.loads(_decompress(payload, codec))
+            with _decode_lock:
+                _decode_cache[(pk, updated_at)] = found[pk]
+                while len(_decode_cache) > DECODE_CACHE_SIZE:
+                    _decode_cache.popitem(last=False)
+    return [(year, found[pk]) for pk, year, _ in entries if pk in found]
+
+
+def _exercise_ids(user_id: int) -> set[int]:
+    return set(Exercise.objects.filter(owner_id=user_id).values_list("pk", flat=True))
+
+
+def _live_rows(entity: str, columns: dict, exercises: set[int] | None) -> list[int]:
+    rows = range(len(columns["id"]))
+    if entity == "workouts" or exercises is None:
+        return list(rows)
+    return [i for i in rows if columns["exercise_id"][i] in exercises]
+
+
+def archived(user_id: int, entity: str, *, ids=None, workout_id: int | None = None, exercise_id: int | None = None) -> list:
+    """Archived rows of `entity` ("workouts", "sets" or "cardio_sets") as model instances.
+
+    Ordered like the live querysets: workouts newest first, sets by
+    workout and then set number.
+    """
+    model = ENTITIES[entity]
+    years = _decoded(user_id)
+    if not years:
+        return []
+    exercises = None if model is Workout else _exercise_ids(user_id)
+    ids = None if ids is None else set(ids)
+    objs = []
+    for _, data in years:
+        columns = data[entity]
+        rows = _live_rows(entity, columns, exercises)
+        if ids is not None:
+            rows = [i for i in rows if columns["id"][i] in ids]
+        if workout_id is not None:
+            rows = [i for i in rows if columns["workout_id"][i] == workout_id]
+        if exercise_id is not None:
+            rows = [i for i in rows if columns["exercise_id"][i] == exercise_id]
+        workouts = data["workouts"]
+        when = dict(zip(workouts["id"], zip(workouts["date"], workouts["created_at"])))
+        if entity == "workouts":
+            rows.sort(key=lambda i: when[columns["id"][i]], reverse=True)
+        else:
+            rows.sort(key=lambda i: columns["set_number"][i])
+            rows.sort(key=lambda i: when[columns["workout_id"][i]], reverse=True)
+        objs.extend(_instances(model, columns, user_id, rows))
+    return objs
+
+
+def workout_days(user_id: int, start: date, end: date) -> Counter:
+    """Number of archived workouts on each date from `start` to `end` inclusive."""
+    counts = Counter()
+    first, last = start.isoformat(), end.isoformat()
+    for _, data in _decoded(user_id, range(start.year, end.year + 1)):
+        counts.update(date.fromisoformat(day) for day in data["workouts"]["date"] if first <= day <= last)
+    return counts
+
+
+def export_rows(user_id: int, entity: str, columns: list[str]) -> list[dict]:
+    """Archived rows shaped like `workouts.export.entity_queryset`, ordered by id."""
+    objs = archived(user_id, entity)
+    if not objs:
+        return []
+    dates = {w.pk: w.date for w in archived(user_id, "workouts")} if "workout__date" in columns else {}
+    names = dict(Exercise.objects.filter(owner_id=user_id).values_list("pk", "name")) if "exercise__name" in columns else {}
+    rows = []
+    for obj in objs:
+        row = {column: getattr(obj, column) for column in columns if "__" not in column}
+        if "workout__date" in columns:
+            row["workout__date"] = dates.get(obj.workout_id)
+        if "exercise__name" in columns:
+            row["exercise__name"] = names.get(obj.exercise_id)
+        rows.append(row)
+    rows.sort(key=itemgetter("id"))
+    return rows
+
+
+def _unpack(entry: ArchivedYear, exercises: set[int]) -> tuple[dict, set[int]]:
+    """Instances of everything in `entry`, and ids of workouts that lost sets."""
+    data = json.loads(_decompress(entry.payload, entry.codec))
+    objects, lost = {}, set()
+    for entity, model in ENTITIES.items():
+        columns = data[entity]
+        rows = _live_rows(entity, columns, exercises)
+        if len(rows) < len(columns["id"]):
+            kept = set(rows)
+            lost.update(columns["workout_id"][i] for i in range(len(columns["id"])) if i not in kept)
+        objects[entity] = _instances(model, columns, entry.owner_id, rows)
+    return objects, lost
+
+
+def archive_year(user_id: int, year: int) -> dict:
+    """Move the user's finished workouts of `year` into its archive row.
+
+    Merges into the row if the year was archived before. Returns the
+    number of rows moved per entity.
+    """
+    with sharding.atomic():
+        # Locked so no set can be added to them before they are deleted.
+        ids = list(
+            Workout.objects.select_for_update()
+            .filter(owner_id=user_id, date__year=year, ended_at__isnull=False)
+            .values_list("pk", flat=True)
+        )
+        if not ids:
+            return {}
+        entry = ArchivedYear.objects.select_for_update().filter(owner_id=user_id, year=year).first()
+        if entry is None:
+            entry = ArchivedYear(owner_id=user_id, year=year)
+            objects = {entity: [] for entity in ENTITIES}
+        else:
+            objects, _ = _unpack(entry, _exercise_ids(user_id))
+        moved = {
+            "workouts": list(Workout.objects.filter(pk__in=ids)),
+            "sets": list(WorkoutSet.objects.filter(workout_id__in=ids)),
+            "cardio_sets": list(CardioSet.objects.filter(workout_id__in=ids)),
+        }
+        for entity, objs in moved.items():
+            objects[entity] += objs
+
+        entry.codec = _codec()
+        entry.payload = _compress(_pack(objects), entry.codec)
+        entry.bests = prs.bests(objects["sets"], objects["cardio_sets"])
+        entry.workout_count = len(objects["workouts"])
+        entry.set_count = len(objects["sets"])
+        entry.cardio_set_count = len(objects["cardio_sets"])
+        entry.save()
+        deletion.delete_workouts(Workout.objects.filter(pk__in=ids))
+    return {entity: len(objs) for entity, objs in moved.items()}
+
+
+def archive_user(user_id: int, *, before_year: int | None = None) -> dict:
+    """Archive every year before `before_year` (default: `archive_before_year()`)."""
+    before_year = before_year or archive_before_year()
+    counts = Counter()
+    with sharding.for_user(user_id):
+        days = Workout.objects.filter(owner_id=user_id, ended_at__isnull=False, date__year__lt=before_year).dates("date", "year")
+        for day in days:
+            counts.update(archive_year(user_id, day.year))
+            counts["years"] += 1
+    return dict(counts)
+
+
+def rehydrate(user_id: int, year: int) -> dict:
+    """Move an archived year back into the live tables; returns rows restored per entity."""
+    with sharding.atomic():
+        entry = ArchivedYear.objects.select_for_update().filter(owner_id=user_id, year=year).first()
+        if entry is None:
+            # Already rehydrated by a concurrent request.
+            return {}
+        objects, lost = _unpack(entry, _exercise_ids(user_id))
+        counts = {}
+        for entity, model in ENTITIES.items():
+            counts[entity] = sharding.insert_raw(model, objects[entity], using=router.db_for_write(model))
+        ArchivedYear.objects.filter(pk=entry.pk).delete()
+        if lost:
+            summaries.refresh_many(lost)
+    return counts
+
+
+def rehydrate_ids(user_id: int, entity: str, ids) -> int:
+    """Rehydrate every year holding one of `ids` of `entity`; returns how many were."""
+    ids = {int(i) for i in ids}
+    years = [year for year, data in _decoded(user_id) if ids.intersection(data[entity]["id"])]
+    for year in years:
+        rehydrate(user_id, year)
+    return len(years)
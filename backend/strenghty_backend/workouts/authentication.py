@@ -0,0 +1,45 @@
+"""Token authentication that records when each token was last used.
+
+DRF's `Token` only knows when it was issued, and token requests don't
+touch `User.last_login`, so `TokenUsage` keeps the last-used time that
+`reaper.reap_tokens` expires idle tokens by. It is written at most once
+per `TOUCH_INTERVAL` per token, not on every request.
+"""
+
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import authentication, exceptions
+
+from .models import TokenUsage
+
+TOUCH_INTERVAL = timedelta(hours=1)
+
+
+def record_use(token) -> None:
+    """Note that `token` was just used; load it with `select_related("usage")`."""
+    now = timezone.now()
+    try:
+        last_used = token.usage.last_used
+    except TokenUsage.DoesNotExist:
+        last_used = None
+    if last_used is not None and now - last_used < TOUCH_INTERVAL:
+        return
+    if not TokenUsage.objects.filter(pk=token.pk).update(last_used=now):
+        TokenUsage.objects.get_or_create(token_id=token.pk, defaults={"last_used": now})
+
+
+class TrackedTokenAuthentication(authentication.TokenAuthentication):
+    def authenticate_credentials(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related("user", "usage").get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+        record_use(token)
+        return (token.user, token)
@@ -0,0 +1,242 @@
+"""Apply a list of create/update/delete operations in one transaction.
+
+An offline client replays its local queue as one `POST /api/batch/`:
+
+    {"operations": [
+        {"op": "create", "type": "workout", "temp_id": "w1",
+         "data": {"name": "Push", "date": "2024-05-01"}},
+        {"op": "create", "type": "set", "temp_id": "s1",
+         "data": {"workout": "$w1", "exercise": 12, "reps": 5, "weight": "100"}},
+        {"op": "update", "type": "set", "id": "$s1", "data": {"reps": 6}},
+        {"op": "update", "type": "workout", "id": "$w1", "data": {"ended_at": "..."}},
+        {"op": "delete", "type": "cardio_set", "id": 87}
+    ]}
+
+`type` is one of exercise, workout, set, cardio_set. Any `id` and the
+`workout`/`exercise` fields of set data accept either a real id or
+`"$<temp_id>"` naming an object created earlier in the same batch.
+
+Operations run in order through the same serializers as the REST
+endpoints, so validation, set numbering and PR flags behave identically.
+Every object a batch references is loaded up front in one owner-scoped
+query per type and shared between operations; ids found only in the
+user's archive have their year rehydrated first. The first failing
+operation rolls the whole batch back.
+"""
+
+from django.db import IntegrityError
+from rest_framework import serializers, status
+
+from . import archive
+from . import deletion
+from . import sharding
+from . import summaries
+from .models import CardioSet, Exercise, Workout, WorkoutSet
+from .serializers import CardioSetSerializer, ExerciseSerializer, WorkoutSerializer, WorkoutSetSerializer
+
+MAX_OPERATIONS = 500
+
+# type -> (model, serializer, owner lookup)
+_TYPES = {
+    "exercise": (Exercise, ExerciseSerializer, "owner"),
+    "workout": (Workout, WorkoutSerializer, "owner"),
+    "set": (WorkoutSet, WorkoutSetSerializer, "owner"),
+    "cardio_set": (CardioSet, CardioSetSerializer, "owner"),
+}
+# type -> entity name in workouts.archive, for types that can be archived
+_ARCHIVED = {"workout": "workouts", "set": "sets", "cardio_set": "cardio_sets"}
+# Foreign keys in set data that may hold temp-id references; each is named
+# after the type it points to.
+_REFERENCES = ("workout", "exercise")
+
+
+def _is_reference(value) -> bool:
+    """Whether `value` is a real id (int or digit string) or a "$temp_id"."""
+    if isinstance(value, str):
+        return value.isdecimal() or value.startswith("$")
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class OperationFailed(Exception):
+    def __init__(self, index: int | None, status_code: int, errors):
+        super().__init__(errors)
+        self.index = index
+        self.status_code = status_code
+        self.errors = errors
+
+    def response_data(self, operation_count: int) -> dict:
+        """Per-operation results for a rolled-back batch."""
+        results = []
+        for index in range(operation_count if self.index is not None else 0):
+            if index == self.index:
+                results.append({"index": index, "status": self.status_code, "errors": self.errors})
+            else:
+                results.append({"index": index, "status": status.HTTP_424_FAILED_DEPENDENCY})
+        return {"failed_index": self.index, "errors": self.errors, "results": results}
+
+
+class _BatchRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField that resolves against the batch's loaded objects."""
+
+    def __init__(self, objects: dict, **kwargs):
+        self.objects = objects
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        obj = self.objects.get(data) if isinstance(data, int) else None
+        if obj is None:
+            self.fail("does_not_exist", pk_value=data)
+        return obj
+
+
+class Batch:
+    def __init__(self, request, operations: list):
+        self.request = request
+        self.user = request.user
+        self.operations = operations
+        self.temp_ids: dict[str, int] = {}
+        # type -> {pk: instance}, limited to the user's own rows.
+        self.objects: dict[str, dict] = {name: {} for name in _TYPES}
+
+    def _ref(self, index: int, value):
+        """Turn a "$temp" reference into a real id; pass real ids through."""
+        if isinstance(value, str) and value.startswith("$"):
+            try:
+                return self.temp_ids[value[1:]]
+            except KeyError:
+                raise OperationFailed(index, status.HTTP_400_BAD_REQUEST, {"detail": f"Unknown temp id {value!r}."})
+        if isinstance(value, str) and value.isdigit():
+            return int(value)
+        return value
+
+    def _validate_shape(self):
+        if not isinstance(self.operations, list) or not self.operations:
+            raise OperationFailed(None, status.HTTP_400_BAD_REQUEST, {"operations": "Expected a non-empty list."})
+        if len(self.operations) > MAX_OPERATIONS:
+            raise OperationFailed(
+                None, status.HTTP_400_BAD_REQUEST, {"operations": f"At most {MAX_OPERATIONS} operations per batch."}
+            )
+        seen = set()
+        for index, op in enumerate(self.operations):
+            if not isinstance(op, dict):
+                raise OperationFailed(index, status.HTTP_400_BAD_REQUEST, {"detail": "Expected an object."})
+            if op.get("op") not in {"create", "update", "delete"}:
+                raise OperationFailed(index, status.HTTP_400_BAD_REQUEST, {"op": "Must be create, update or delete."})
+            if op.get("type") not in _TYPES:
+                raise OperationFailed(index, status.HTTP_400_BAD_REQUEST, {"type": f"Must be one of {', '.join(_TYPES)}."})
+            if op["op"] != "create" and op.get("id") is None:
+                raise OperationFailed(index, status.HTTP_400_BAD_REQUEST, {"id": "This field is required."})
+            if op["op"] != "create" and not _is_reference(op["id"]):
+                raise OperationFailed(index, status.HTTP_400_BAD_REQUEST, {"id": 'Expected an id or "$temp_id".'})
+            if op.get("data") is not None and not isinstance(op["data"], dict):
+                raise OperationFailed(index, status.HTTP_400_BAD_REQUEST, {"data": "Expected an object."})
+            if op["type"] in {"set", "cardio_set"}:
+                for field in _REFERENCES:
+                    value = (op.get("data") or {}).get(field)
+                    # None is left to the serializer's own required/null errors.
+                    if value is not None and not _is_reference(value):
+                        raise OperationFailed(
+                            index, status.HTTP_400_BAD_REQUEST, {"data": {field: 'Expected an id or "$temp_id".'}}
+                        )
+            temp_id = op.get("temp_id")
+            if temp_id is not None and not isinstance(temp_id, str):
+                raise OperationFailed(index, status.HTTP_400_BAD_REQUEST, {"temp_id": "Expected a string."})
+            if temp_id is not None:
+                if op["op"] != "create":
+                    raise OperationFailed(index, status.HTTP_400_BAD_REQUEST, {"temp_id": "Only create operations take a temp_id."})
+                if temp_id in seen:
+                    raise OperationFailed(index, status.HTTP_400_BAD_REQUEST, {"temp_id": f"Duplicate temp id {temp_id!r}."})
+                seen.add(temp_id)
+
+    def _prefetch(self):
+        """Load every existing object the batch mentions, one query per type."""
+        wanted = {name: set() for name in _TYPES}
+        for op in self.operations:
+            if op["op"] != "create":
+                wanted[op["type"]].add(op["id"])
+            if op["type"] in {"set", "cardio_set"}:
+                for field in _REFERENCES:
+                    wanted[field].add((op.get("data") or {}).get(field))
+        for name, ids in wanted.items():
+            ids = {int(i) for i in ids if isinstance(i, int) or (isinstance(i, str) and i.isdigit())}
+            if not ids:
+                continue
+            model, _, owner_lookup = _TYPES[name]
+            qs = model.objects.filter(**{owner_lookup: self.user})
+            if name in {"set", "cardio_set"}:
+                qs = qs.select_related("workout", "exercise")
+            objects = qs.in_bulk(ids)
+            missing = ids - objects.keys()
+            if missing and name in _ARCHIVED and archive.rehydrate_ids(self.user.pk, _ARCHIVED[name], missing):
+                objects = qs.in_bulk(ids)
+            # Everything here belongs to the requesting user; share that
+            # instance instead of lazily loading owner once per operation.
+            for obj in objects.values():
+                for parent in (obj.workout, obj.exercise) if name in {"set", "cardio_set"} else (obj,):
+                    parent.owner = self.user
+            self.objects[name].update(objects)
+
+    def _serializer(self, type_name: str, **kwargs):
+        _, serializer_class, _ = _TYPES[type_name]
+        serializer = serializer_class(context={"request": self.request}, **kwargs)
+        if type_name in {"set", "cardio_set"}:
+            for field in _REFERENCES:
+                serializer.fields[field] = _BatchRelatedField(self.objects[field], queryset=_TYPES[field][0].objects.none())
+        return serializer
+
+    def _apply(self, index: int, op: dict) -> dict:
+        type_name, action = op["type"], op["op"]
+        data = dict(op.get("data") or {})
+        if type_name in {"set", "cardio_set"}:
+            for field in _REFERENCES:
+                if field in data:
+                    data[field] = self._ref(index, data[field])
+
+        instance = None
+        if action != "create":
+            pk = self._ref(index, op["id"])
+            instance = self.objects[type_name].get(pk) if isinstance(pk, int) else None
+            if instance is None:
+                raise OperationFailed(index, status.HTTP_404_NOT_FOUND, {"detail": "Not found."})
+
+        result = {"index": index}
+        if action == "delete":
+            if type_name == "workout":
+                deletion.delete_workouts(Workout.objects.filter(pk=instance.pk))
+            elif type_name == "exercise":
+                deletion.delete_exercise(instance)
+            else:
+                instance.delete()
+                summaries.refresh(instance.workout_id)
+            del self.objects[type_name][pk]
+            result.update(status=status.HTTP_204_NO_CONTENT, id=pk)
+            return result
+
+        serializer = self._serializer(type_name, instance=instance, data=data, partial=action == "update")
+        if not serializer.is_valid():
+            raise OperationFailed(index, status.HTTP_400_BAD_REQUEST, serializer.errors)
+        extra = {"owner": self.user} if type_name in {"exercise", "workout"} and action == "create" else {}
+        try:
+            obj = serializer.save(**extra)
+        except IntegrityError:
+            # No savepoint needed: raising rolls the whole batch back anyway.
+            raise OperationFailed(index, status.HTTP_400_BAD_REQUEST, {"detail": "Invalid data or duplicate."})
+
+        self.objects[type_name][obj.pk] = obj
+        if op.get("temp_id") is not None:
+            self.temp_ids[op["temp_id"]] = obj.pk
+            result["temp_id"] = op["temp_id"]
+        result.update(
+            status=status.HTTP_201_CREATED if action == "create" else status.HTTP_200_OK,
+            id=obj.pk,
+            data=serializer.data,
+        )
+        return result
+
+    def execute(self) -> dict:
+        """Run all operations; raises `OperationFailed` after rolling back."""
+        self._validate_shape()
+        with sharding.atomic():
+            self._prefetch()
+            results = [self._apply(index, op) for index, op in enumerate(self.operations)]
+        return {"results": results, "temp_ids": self.temp_ids}
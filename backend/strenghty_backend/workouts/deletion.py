@@ -0,0 +1,166 @@
+"""Set-based deletion of accounts, workouts and exercises.
+
+`Model.delete()` goes through Django's Collector, which loads every
+dependent `WorkoutSet`/`CardioSet` into memory before deleting them, in one
+long transaction. For an account with years of history that is slow and
+holds locks on the set tables for its whole duration.
+
+The functions here delete leaf-first with plain `DELETE ... WHERE fk IN
+(...)` statements instead. Workouts go in batches: one short transaction
+per batch deletes the batch's sets, cardio sets and then the workouts
+themselves, each statement driven by a foreign-key index. Nothing is
+loaded beyond a list of ids, and no transaction covers more than one batch.
+Every function returns a `{table: rows deleted}` dict.
+
+None of the models involved have delete signals, so skipping the Collector
+loses nothing. If one ever gets a receiver, delete it through the ORM here.
+"""
+
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from . import sharding
+from . import summaries
+from .models import (
+    ArchivedYear,
+    CardioSet,
+    Exercise,
+    PasswordResetCode,
+    Profile,
+    SetNumberCounter,
+    TokenUsage,
+    Workout,
+    WorkoutSet,
+)
+
+User = get_user_model()
+
+# Workouts per transaction; at ~25 sets per workout this is ~5k set rows.
+DEFAULT_BATCH_SIZE = 200
+
+
+def _raw_delete(queryset) -> int:
+    # `_raw_delete` issues a single DELETE without collecting related rows or
+    # sending signals; callers make sure dependents are already gone.
+    return queryset._raw_delete(queryset.db)
+
+
+def _batches(queryset, batch_size: int):
+    """Yield lists of primary keys from `queryset` until it is empty.
+
+    Each batch is re-queried after the previous one was deleted, so this is
+    safe to interleave with the deletes and never needs an OFFSET.
+    """
+    while True:
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        if len(ids) < batch_size:
+            return
+
+
+def _lock(model, ids) -> list:
+    """Lock parent rows for the rest of the transaction.
+
+    A concurrent insert of a set needs a key-share lock on its workout or
+    exercise, so it waits for the delete and then fails its FK check,
+    instead of sneaking a child in between our DELETEs.
+    """
+    return list(model.objects.select_for_update().filter(pk__in=ids).values_list("pk", flat=True))
+
+
+def delete_workouts(queryset, *, batch_size: int = DEFAULT_BATCH_SIZE, pause: float = 0) -> dict:
+    """Delete the workouts in `queryset` along with their sets and cardio sets."""
+    counts = Counter()
+    for ids in _batches(queryset, batch_size):
+        with sharding.atomic():
+            ids = _lock(Workout, ids)
+            counts["sets"] += _raw_delete(WorkoutSet.objects.filter(workout_id__in=ids))
+            counts["cardio_sets"] += _raw_delete(CardioSet.objects.filter(workout_id__in=ids))
+            _raw_delete(SetNumberCounter.objects.filter(workout_id__in=ids))
+            counts["workouts"] += _raw_delete(Workout.objects.filter(pk__in=ids))
+        if pause:
+            time.sleep(pause)
+    return dict(counts)
+
+
+def delete_exercise(exercise, *, batch_size: int = DEFAULT_BATCH_SIZE * 25, pause: float = 0) -> dict:
+    """Delete one exercise and every set logged against it.
+
+    Summaries of the workouts that lose sets are recomputed afterwards.
+    """
+    counts = Counter()
+    workout_ids = set(WorkoutSet.objects.filter(exercise_id=exercise.pk).values_list("workout_id", flat=True)) | set(
+        CardioSet.objects.filter(exercise_id=exercise.pk).values_list("workout_id", flat=True)
+    )
+    for model, key in ((WorkoutSet, "sets"), (CardioSet, "cardio_sets")):
+        for ids in _batches(model.objects.filter(exercise_id=exercise.pk), batch_size):
+            with sharding.atomic():
+                counts[key] += _raw_delete(model.objects.filter(pk__in=ids))
+            if pause:
+                time.sleep(pause)
+    with sharding.atomic():
+        # Sets logged while the batches ran are swept up with the exercise.
+        ids = _lock(Exercise, [exercise.pk])
+        counts["sets"] += _raw_delete(WorkoutSet.objects.filter(exercise_id__in=ids))
+        counts["cardio_sets"] += _raw_delete(CardioSet.objects.filter(exercise_id__in=ids))
+        _raw_delete(SetNumberCounter.objects.filter(exercise_id__in=ids))
+        counts["exercises"] += _raw_delete(Exercise.objects.filter(pk__in=ids))
+    summaries.refresh_many(workout_ids)
+    return dict(counts)
+
+
+def delete_exercises(queryset, *, batch_size: int = DEFAULT_BATCH_SIZE * 25, pause: float = 0) -> dict:
+    """Delete the exercises in `queryset` along with any sets still using them.
+
+    Meant for exercises whose owner's workouts are already gone, so no
+    summaries need refreshing.
+    """
+    counts = Counter()
+    for ids in _batches(queryset, batch_size):
+        with sharding.atomic():
+            ids = _lock(Exercise, ids)
+            # Only sets in other users' workouts can be left by now, which
+            # takes bad data, but the FK would still block the delete.
+            counts["sets"] += _raw_delete(WorkoutSet.objects.filter(exercise_id__in=ids))
+            counts["cardio_sets"] += _raw_delete(CardioSet.objects.filter(exercise_id__in=ids))
+            _raw_delete(SetNumberCounter.objects.filter(exercise_id__in=ids))
+            counts["exercises"] += _raw_delete(Exercise.objects.filter(pk__in=ids))
+        if pause:
+            time.sleep(pause)
+    return dict(counts)
+
+
+def delete_archives(user_id: int) -> dict:
+    """Delete a user's archived years (see `workouts.archive`)."""
+    with sharding.atomic():
+        return {"archived_years": _raw_delete(ArchivedYear.objects.filter(owner_id=user_id))}
+
+
+def delete_user_data(user_id: int, *, batch_size: int = DEFAULT_BATCH_SIZE, pause: float = 0) -> dict:
+    """Delete a user and everything they own, workouts first.
+
+    Meant to run in the background after the account has been deactivated,
+    so nothing new is being logged against it while this runs.
+    """
+    with sharding.for_user(user_id) as alias:
+        counts = Counter(delete_workouts(Workout.objects.filter(owner_id=user_id), batch_size=batch_size, pause=pause))
+        counts.update(delete_exercises(Exercise.objects.filter(owner_id=user_id), batch_size=batch_size * 25))
+        counts.update(delete_archives(user_id))
+    sharding.drop_stub(alias, user_id)
+    with transaction.atomic():
+        counts["profiles"] += _raw_delete(Profile.objects.filter(user_id=user_id))
+        counts["password_reset_codes"] += _raw_delete(PasswordResetCode.objects.filter(user_id=user_id))
+        _raw_delete(TokenUsage.objects.filter(token__user_id=user_id))
+        counts["tokens"] += _raw_delete(Token.objects.filter(user_id=user_id))
+        # Whatever is left (admin log entries, group links, the shard
+        # directory entry) is small; let the Collector handle it along with
+        # the user row.
+        counts["users"] += User.objects.filter(pk=user_id).delete()[1].get(User._meta.label, 0)
+    sharding.forget(user_id)
+    return {key: value for key, value in counts.items() if value}
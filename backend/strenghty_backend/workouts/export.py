@@ -0,0 +1,117 @@
+"""Streaming export of a user's training data.
+
+Everything here is a generator: rows are read with `.values().iterator()`
+(a server-side cursor on Postgres) in chunks, rendered as NDJSON or CSV, and
+optionally gzip-compressed on the fly, so memory use stays flat no matter how
+many sets an account has. `ExportDataView` wraps the output in a
+`StreamingHttpResponse`; the `export_user` management command writes it to a
+file.
+
+Rows in cold storage (`workouts.archive`) are decoded up front, one entity
+at a time, and merged into the live stream by id.
+"""
+
+import csv
+import heapq
+import io
+import json
+import zlib
+from operator import itemgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import archive
+from .models import CardioSet, Exercise, Profile, Workout, WorkoutSet
+
+CHUNK_SIZE = 2000
+# Flush rendered output once this many characters have accumulated.
+BUFFER_SIZE = 64 * 1024
+
+ENTITIES = ("profile", "exercises", "workouts", "sets", "cardio_sets")
+
+
+# entity -> (model, owner lookup, joined columns)
+_SOURCES = {
+    "profile": (Profile, "user", ()),
+    "exercises": (Exercise, "owner", ()),
+    "workouts": (Workout, "owner", ()),
+    "sets": (WorkoutSet, "owner", ("workout__date", "exercise__name")),
+    "cardio_sets": (CardioSet, "owner", ("workout__date", "exercise__name")),
+}
+
+
+def entity_columns(entity: str) -> list[str]:
+    try:
+        model, _, extra = _SOURCES[entity]
+    except KeyError:
+        raise ValueError(f"Unknown export entity {entity!r}")
+    # Owner columns are implied by the export itself.
+    return [f.attname for f in model._meta.concrete_fields if f.attname not in {"owner_id", "user_id"}] + list(extra)
+
+
+def entity_queryset(user, entity: str):
+    """Return the `.values()` queryset backing one exported entity, ordered by id."""
+    model, owner_lookup, _ = _SOURCES[entity]
+    return model.objects.filter(**{owner_lookup: user}).values(*entity_columns(entity)).order_by("id")
+
+
+def iter_rows(user, entity: str):
+    rows = entity_queryset(user, entity).iterator(chunk_size=CHUNK_SIZE)
+    if entity in archive.ENTITIES:
+        archived = archive.export_rows(user.pk, entity, entity_columns(entity))
+        if archived:
+            rows = heapq.merge(rows, archived, key=itemgetter("id"))
+    return rows
+
+
+def _buffered(pieces):
+    buf = []
+    size = 0
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if size >= BUFFER_SIZE:
+            yield "".join(buf).encode("utf-8")
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def ndjson_chunks(user, entities=ENTITIES):
+    """Yield UTF-8 NDJSON chunks; every line carries a `type` naming its entity."""
+
+    def lines():
+        for entity in entities:
+            for row in iter_rows(user, entity):
+                yield json.dumps({"type": entity, **row}, cls=DjangoJSONEncoder) + "\n"
+
+    return _buffered(lines())
+
+
+def csv_chunks(user, entity: str = "sets"):
+    """Yield UTF-8 CSV chunks for a single entity, header first."""
+    columns = entity_columns(entity)
+
+    def lines():
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for row in iter_rows(user, entity):
+            writer.writerow([row.get(c) for c in columns])
+            if out.tell() >= BUFFER_SIZE:
+                yield out.getvalue()
+                out.seek(0)
+                out.truncate()
+        yield out.getvalue()
+
+    return _buffered(lines())
+
+
+def gzip_chunks(chunks, level: int = 6):
+    """Gzip-compress an iterable of byte chunks incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,203 @@
+"""Idempotency-Key support for create/update endpoints.
+
+Mobile clients on flaky connections retry writes whose response they never
+saw. With an `Idempotency-Key` header, the first response for a
+(user, method, path, key) is remembered and every retry gets that same
+response back without re-running validation, set-number allocation or the
+PR history scan, and without creating a duplicate row.
+
+Responses are kept in two tiers, like the auth throttles:
+
+* an in-process store, an OrderedDict guarded by a lock, bounded by
+  `IDEMPOTENCY_MAX_ENTRIES` (LRU) and `IDEMPOTENCY_TTL_SECONDS`. It also
+  coalesces in-flight duplicates: a retry that arrives while the original
+  is still running waits for it and replays its response;
+* the Django cache, so a retry landing on another worker still replays.
+  An `add()` lock there stops two workers from running the same key at
+  once; the loser answers 409 and the client retries. The lock lives for
+  `IDEMPOTENCY_LOCK_SECONDS`, longer than any request may run, and holds a
+  per-request token so a handler that outlived it never releases a lock
+  another request has taken since.
+
+Only responses below 500 are stored, so a server error can be retried for
+real. Reusing a key with a different body is rejected with 422.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = "Idempotency-Key"
+# Set on responses served from the store instead of by running the request.
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+# Response headers worth replaying along with the body.
+_REPLAYED_HEADERS = ("Location",)
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "expires", "done", "response")
+
+    def __init__(self, fingerprint: str, expires: float):
+        self.fingerprint = fingerprint
+        self.expires = expires
+        self.done = threading.Event()
+        self.response = None
+
+
+class ReplayStore:
+    """Per-process (key -> stored response) map with TTL and LRU eviction."""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, fingerprint: str, now: float | None = None) -> tuple[_Entry, bool]:
+        """Return (entry, owner). `owner` is True if the caller must run the request."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > now:
+                self._entries.move_to_end(key)
+                return entry, False
+            entry = _Entry(fingerprint, now + self.ttl)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                # Never strand a waiter on an evicted in-flight entry.
+                evicted.done.set()
+            return entry, True
+
+    def finish(self, key: str, entry: _Entry, response: dict | None):
+        """Publish the owner's stored response (None if it isn't replayable)."""
+        entry.response = response
+        if response is None:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+        entry.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+store = ReplayStore(
+    max_entries=getattr(settings, "IDEMPOTENCY_MAX_ENTRIES", 10000),
+    ttl=getattr(settings, "IDEMPOTENCY_TTL_SECONDS", 86400),
+)
+
+
+def _fingerprint(data) -> str:
+    body = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _replay(stored: dict) -> Response:
+    headers = dict(stored["headers"], **{REPLAYED_HEADER: "true"})
+    return Response(stored["data"], status=stored["status"], headers=headers)
+
+
+def _mismatch() -> Response:
+    return Response(
+        {"detail": "This Idempotency-Key was already used with a different request body."},
+        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    )
+
+
+def _in_progress() -> Response:
+    return Response(
+        {"detail": "A request with this Idempotency-Key is still being processed."},
+        status=status.HTTP_409_CONFLICT,
+        headers={"Retry-After": "1"},
+    )
+
+
+def _scope(request, key: str) -> str:
+    return hashlib.sha256(f"{request.user.pk}:{request.method}:{request.path}:{key}".encode("utf-8")).hexdigest()
+
+
+def _release(lock_key: str, token: str):
+    # Compare-and-delete: only drop the lock if it is still ours. The cache API
+    # has no atomic form of this, but the lock outlives the handler by design,
+    # so it cannot expire between the get and the delete in practice.
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def run(request, handler) -> Response:
+    """Call `handler()` at most once per Idempotency-Key and replay its response."""
+    key = request.headers.get(HEADER)
+    if not key:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response({"detail": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."}, status=400)
+
+    scope = _scope(request, key)
+    fingerprint = _fingerprint(request.data)
+    wait = getattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 10)
+    deadline = time.monotonic() + wait
+
+    while True:
+        entry, owner = store.begin(scope, fingerprint)
+        if owner:
+            break
+        if entry.fingerprint != fingerprint:
+            return _mismatch()
+        if not entry.done.wait(max(0.0, deadline - time.monotonic())):
+            return _in_progress()
+        if entry.response is not None:
+            return _replay(entry.response)
+        # The original failed without a storable response; try it ourselves.
+
+    cache_key = f"idempotency:{scope}"
+    lock_key = f"{cache_key}:lock"
+    stored = None
+    try:
+        shared = cache.get(cache_key)
+        if shared is not None:
+            if shared["fingerprint"] != fingerprint:
+                return _mismatch()
+            stored = shared
+            return _replay(stored)
+        token = uuid.uuid4().hex
+        if not cache.add(lock_key, token, timeout=getattr(settings, "IDEMPOTENCY_LOCK_SECONDS", 300)):
+            return _in_progress()
+        try:
+            response = handler()
+            if response.status_code < 500:
+                stored = {
+                    "fingerprint": fingerprint,
+                    "status": response.status_code,
+                    "data": response.data,
+                    "headers": {h: response[h] for h in _REPLAYED_HEADERS if response.has_header(h)},
+                }
+                cache.set(cache_key, stored, timeout=store.ttl)
+            return response
+        finally:
+            _release(lock_key, token)
+    finally:
+        store.finish(scope, entry, stored)
+
+
+class IdempotentWritesMixin:
+    """Viewset mixin honouring `Idempotency-Key` on POST and PUT/PATCH."""
+
+    def create(self, request, *args, **kwargs):
+        handler = super().create
+        return run(request, lambda: handler(request, *args, **kwargs))
+
+    def update(self, request, *args, **kwargs):
+        handler = super().update
+        return run(request, lambda: handler(request, *args, **kwargs))
@@ -0,0 +1,376 @@
+"""Bulk import of training history from CSV or NDJSON.
+
+The file is parsed as a stream and processed in chunks of rows. For each
+chunk, exercise names are resolved case-insensitively against the user's
+existing exercises in one query (missing ones are bulk-created), new
+workouts are bulk-created, and sets/cardio sets go in with `bulk_create`.
+PR flags are computed afterwards in a single chronological pass per
+touched exercise (see `workouts.prs`) instead of a history scan per row,
+and workout summaries are recomputed once per affected workout.
+The whole import runs in one transaction, so a failure leaves nothing
+behind.
+
+Accepted input:
+
+* NDJSON as produced by `/api/export/`: lines tagged `"type": "workouts"`
+  define workouts, `"sets"` / `"cardio_sets"` lines reference them by
+  `workout_id` and name their exercise with `exercise__name`.
+* NDJSON or CSV with one set per line/row. Column names are matched
+  case-insensitively, spaces count as underscores, and `date`,
+  `exercise` (or `exercise_name`), `workout` (or `workout_name`), `reps`,
+  `weight`, `unit`, `set_type`, `rpe`, `half_reps` describe strength sets.
+  Rows with a `mode` (TREADMILL, BIKE, ELLIPTICAL, STAIRS, ROW) are cardio
+  sets, using `duration_seconds`, `distance_meters`, `floors`, `level`,
+  `split_seconds` and `spm`. Rows sharing a date and workout name are
+  grouped into one workout.
+
+Gzip-compressed input is detected automatically. Rows that don't parse,
+or hold values their columns can't store, are skipped and listed in the
+result's `errors`.
+"""
+
+import csv
+import gzip
+import io
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils.dateparse import parse_datetime
+
+from . import prs, sharding, summaries
+from .models import CardioSet, Exercise, Workout, WorkoutSet
+
+CHUNK_SIZE = 5000
+MAX_ERRORS = 50
+
+_ALIASES = {
+    "workout__date": "date",
+    "exercise__name": "exercise",
+    "exercise_name": "exercise",
+    "workout_name": "workout",
+    "weight_unit": "unit",
+    "seconds": "duration_seconds",
+}
+_SET_TYPES = {code for code, _ in WorkoutSet.SET_TYPE_CHOICES}
+_CARDIO_MODES = {code for code, _ in CardioSet.CARDIO_MODE_CHOICES}
+_MUSCLE_GROUPS = {code for code, _ in Exercise.MUSCLE_GROUP_CHOICES}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    workouts: int = 0
+    sets: int = 0
+    cardio_sets: int = 0
+    exercises_created: int = 0
+    prs_updated: int = 0
+    skipped: int = 0
+    errors: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "workouts": self.workouts,
+            "sets": self.sets,
+            "cardio_sets": self.cardio_sets,
+            "exercises_created": self.exercises_created,
+            "prs_updated": self.prs_updated,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+def open_text(fileobj) -> io.TextIOBase:
+    """Wrap a binary file, transparently gunzipping it if needed."""
+    buffered = io.BufferedReader(fileobj) if not hasattr(fileobj, "peek") else fileobj
+    if buffered.peek(2)[:2] == b"\x1f\x8b":
+        buffered = gzip.GzipFile(fileobj=buffered)
+    return io.TextIOWrapper(buffered, encoding="utf-8-sig", newline="")
+
+
+def _normalize_keys(row: dict) -> dict:
+    out = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        k = key.strip().lower().replace(" ", "_")
+        out[_ALIASES.get(k, k)] = value
+    return out
+
+
+def iter_records(text, fmt: str):
+    """Yield (line number, record dict) pairs from a CSV or NDJSON text stream."""
+    if fmt == "csv":
+        for lineno, row in enumerate(csv.DictReader(text), start=2):
+            yield lineno, _normalize_keys(row)
+    elif fmt == "ndjson":
+        for lineno, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                yield lineno, {"_error": "invalid JSON"}
+                continue
+            yield lineno, _normalize_keys(obj) if isinstance(obj, dict) else {"_error": "expected a JSON object"}
+    else:
+        raise ImportFormatError("Format must be csv or ndjson.")
+
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _int(value, default=None):
+    if _blank(value):
+        return default
+    try:
+        number = int(float(value))
+    except OverflowError:
+        raise ValueError(f"not a number: {value!r}")
+    if number < 0:
+        raise ValueError(f"must not be negative: {value!r}")
+    return number
+
+
+def _decimal(value):
+    if _blank(value):
+        return None
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"not a number: {value!r}")
+    if not number.is_finite():
+        raise ValueError(f"not a number: {value!r}")
+    return number
+
+
+def _fit(model, values: dict) -> dict:
+    """Round decimals to their column's places and run each column's validators.
+
+    A value its column can't hold would otherwise fail the bulk insert (a
+    DataError on Postgres), and with it the whole import instead of one row.
+    """
+    for name, value in values.items():
+        if value is None:
+            continue
+        model_field = model._meta.get_field(name)
+        if isinstance(model_field, models.DecimalField):
+            try:
+                value = values[name] = value.quantize(Decimal(1).scaleb(-model_field.decimal_places))
+            except InvalidOperation:
+                raise ValueError(f"{name} is too large: {value}")
+        try:
+            model_field.run_validators(value)
+        except ValidationError as exc:
+            raise ValueError(f"{name}: {' '.join(exc.messages)}")
+    return values
+
+
+def _date(value) -> date:
+    if _blank(value):
+        raise ValueError("date is required")
+    # Accept plain dates as well as timestamps such as "2023-01-05 18:20:00".
+    return date.fromisoformat(str(value).strip()[:10])
+
+
+class _Importer:
+    def __init__(self, user, result: ImportResult):
+        self.user = user
+        self.result = result
+        self.exercises = {e.name.lower(): e.pk for e in Exercise.objects.filter(owner=user).only("id", "name")}
+        self.touched_exercises: set[int] = set()
+        # External workout definitions from export files: id -> (name, date, notes, ended_at)
+        self.workout_defs: dict = {}
+        # Import-side workout key -> Workout pk
+        self.workouts: dict = {}
+        # (workout pk, exercise pk) -> last set number used, per table
+        self.set_numbers: dict = {}
+        self.cardio_numbers: dict = {}
+
+    def error(self, lineno: int, message: str):
+        self.result.skipped += 1
+        if len(self.result.errors) < MAX_ERRORS:
+            self.result.errors.append({"line": lineno, "error": message})
+
+    def _workout_key(self, rec: dict):
+        ext = rec.get("workout_id")
+        if not _blank(ext) and str(ext) in self.workout_defs:
+            return ("ext", str(ext)), self.workout_defs[str(ext)]
+        day = _date(rec.get("date"))
+        name = (rec.get("workout") or "").strip() or "Imported workout"
+        return ("day", day, name), (name, day, "", None)
+
+    def process(self, chunk: list):
+        """Insert one chunk of (lineno, record) pairs."""
+        parsed = []
+        new_exercises = {}
+        new_workouts = {}
+        for lineno, rec in chunk:
+            if "_error" in rec:
+                self.error(lineno, rec["_error"])
+                continue
+            kind = rec.get("type")
+            if kind == "workouts":
+                try:
+                    self.workout_defs[str(rec["id"])] = (
+                        (rec.get("name") or "").strip() or "Imported workout",
+                        _date(rec.get("date")),
+                        rec.get("notes") or "",
+                        parse_datetime(rec["ended_at"]) if not _blank(rec.get("ended_at")) else None,
+                    )
+                except (KeyError, ValueError) as exc:
+                    self.error(lineno, str(exc))
+                continue
+            if kind in {"profile", "exercises"}:
+                if kind == "exercises" and not _blank(rec.get("name")):
+                    name = rec["name"].strip()[:100]
+                    if name.lower() not in self.exercises:
+                        new_exercises.setdefault(name.lower(), (name, rec.get("muscle_group")))
+                continue
+
+            try:
+                exercise_name = (rec.get("exercise") or "").strip()[:100]
+                if not exercise_name:
+                    raise ValueError("exercise is required")
+                key, definition = self._workout_key(rec)
+                mode = (rec.get("mode") or "").strip().upper()
+                if kind == "cardio_sets" or mode:
+                    if mode not in _CARDIO_MODES:
+                        raise ValueError(f"unknown cardio mode {mode!r}")
+                    values = _fit(CardioSet, {
+                        "mode": mode,
+                        "duration_seconds": _int(rec.get("duration_seconds"), 0),
+                        "distance_meters": _decimal(rec.get("distance_meters")),
+                        "floors": _int(rec.get("floors")),
+                        "level": _decimal(rec.get("level")),
+                        "split_seconds": _decimal(rec.get("split_seconds")),
+                        "spm": _decimal(rec.get("spm")),
+                    })
+                    is_cardio = True
+                else:
+                    set_type = (rec.get("set_type") or "S").strip().upper()[:1]
+                    if set_type not in _SET_TYPES:
+                        raise ValueError(f"unknown set_type {set_type!r}")
+                    unit = (rec.get("unit") or "lbs").strip().lower()
+                    values = _fit(WorkoutSet, {
+                        "reps": _int(rec.get("reps"), 0),
+                        "half_reps": min(max(_int(rec.get("half_reps"), 0), 0), 5),
+                        "weight": _decimal(rec.get("weight")),
+                        "unit": "kg" if unit in {"kg", "kgs"} else "lbs",
+                        "set_type": set_type,
+                        "rpe": _decimal(rec.get("rpe")),
+                    })
+                    is_cardio = False
+            except (TypeError, ValueError) as exc:
+                self.error(lineno, str(exc))
+                continue
+
+            if exercise_name.lower() not in self.exercises:
+                new_exercises.setdefault(exercise_name.lower(), (exercise_name, rec.get("muscle_group")))
+            if key not in self.workouts:
+                new_workouts.setdefault(key, definition)
+            parsed.append((is_cardio, key, exercise_name.lower(), values))
+
+        self._create_exercises(new_exercises)
+        self._create_workouts(new_workouts)
+        self._create_sets(parsed)
+
+    def _create_exercises(self, new: dict):
+        if not new:
+            return
+        objs = [
+            Exercise(
+                owner=self.user,
+                name=name,
+                muscle_group=group.upper() if group and group.upper() in _MUSCLE_GROUPS else "OTHER",
+            )
+            for name, group in new.values()
+        ]
+        for obj in Exercise.objects.bulk_create(objs):
+            self.exercises[obj.name.lower()] = obj.pk
+        self.result.exercises_created += len(objs)
+
+    def _create_workouts(self, new: dict):
+        if not new:
+            return
+        keys = list(new)
+        objs = [
+            Workout(owner=self.user, name=name[:100], date=day, notes=notes, ended_at=ended_at)
+            for name, day, notes, ended_at in (new[k] for k in keys)
+        ]
+        for key, obj in zip(keys, Workout.objects.bulk_create(objs)):
+            self.workouts[key] = obj.pk
+        self.result.workouts += len(objs)
+
+    def _create_sets(self, parsed: list):
+        sets, cardio = [], []
+        for is_cardio, key, exercise_key, values in parsed:
+            workout_id = self.workouts[key]
+            exercise_id = self.exercises[exercise_key]
+            self.touched_exercises.add(exercise_id)
+            counters = self.cardio_numbers if is_cardio else self.set_numbers
+            number = counters.get((workout_id, exercise_id), 0) + 1
+            counters[(workout_id, exercise_id)] = number
+            model = CardioSet if is_cardio else WorkoutSet
+            (cardio if is_cardio else sets).append(
+                model(workout_id=workout_id, owner_id=self.user.pk, exercise_id=exercise_id, set_number=number, **values)
+            )
+        if sets:
+            for obj in sets:
+                obj.set_kg_metrics()  # bulk_create skips save()
+            WorkoutSet.objects.bulk_create(sets, batch_size=1000)
+        if cardio:
+            CardioSet.objects.bulk_create(cardio, batch_size=1000)
+        self.result.sets += len(sets)
+        self.result.cardio_sets += len(cardio)
+
+
+def import_history(user, fileobj, fmt: str, *, chunk_size: int = CHUNK_SIZE, progress=None) -> ImportResult:
+    """Import a CSV/NDJSON (optionally gzipped) binary stream into `user`'s history.
+
+    `progress`, if given, is called with the running `ImportResult` after
+    every chunk.
+    """
+    result = ImportResult()
+    started = time.monotonic()
+    text = open_text(fileobj)
+
+    with sharding.atomic():
+        importer = _Importer(user, result)
+        chunk = []
+        for lineno, rec in iter_records(text, fmt):
+            chunk.append((lineno, rec))
+            result.rows += 1
+            if len(chunk) >= chunk_size:
+                importer.process(chunk)
+                chunk = []
+                if progress:
+                    progress(result)
+        if chunk:
+            importer.process(chunk)
+
+        # Workouts whose totals changed: the new ones plus older ones whose
+        # sets gained or lost PR flags.
+        changed_workouts = set(importer.workouts.values())
+        if importer.touched_exercises:
+            result.prs_updated += prs.recompute_strength_prs(user, importer.touched_exercises, changed_workouts)
+            result.prs_updated += prs.recompute_cardio_prs(user, importer.touched_exercises, changed_workouts)
+        summaries.refresh_many(changed_workouts)
+
+    result.seconds = time.monotonic() - started
+    if progress:
+        progress(result)
+    return result
@@ -0,0 +1,172 @@
+"""Lightweight database-backed job queue.
+
+Work that shouldn't run inside a request (sending email, deleting a user's
+whole history, ...) is recorded as a `Job` row with `enqueue()` and executed
+later by `python manage.py run_worker`. Handlers are plain functions
+registered by name with the `@task` decorator (see `workouts/tasks.py`) and
+receive the job payload as keyword arguments.
+
+Claiming uses `SELECT ... FOR UPDATE SKIP LOCKED` where the database supports
+it (Postgres). SQLite has no row locks, so there each candidate is claimed
+with a conditional UPDATE on its status and only the worker whose UPDATE
+touched the row runs it.
+"""
+
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(name: str):
+    """Register the decorated function as the handler for jobs named `name`."""
+
+    def decorator(func):
+        _registry[name] = func
+        return func
+
+    return decorator
+
+
+def get_handler(name: str):
+    return _registry.get(name)
+
+
+def enqueue(
+    name: str,
+    payload: dict | None = None,
+    *,
+    priority: int = Job.PRIORITY_NORMAL,
+    delay_seconds: float = 0,
+    max_attempts: int | None = None,
+) -> Job | None:
+    """Queue `name` to run in the background with `payload` as kwargs.
+
+    The row is written in the caller's transaction, so a job enqueued from a
+    view that later rolls back is never picked up. When `JOBS_EAGER` is set
+    the handler runs right after commit in the current process instead,
+    which keeps local development and single-process deploys working
+    without a worker.
+    """
+    payload = payload or {}
+    if get_handler(name) is None:
+        raise LookupError(f"No job handler registered for {name!r}")
+
+    if getattr(settings, "JOBS_EAGER", False):
+        transaction.on_commit(lambda: _run_eager(name, payload))
+        return None
+
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        priority=priority,
+        run_at=timezone.now() + timedelta(seconds=delay_seconds),
+        max_attempts=max_attempts or getattr(settings, "JOBS_MAX_ATTEMPTS", 5),
+    )
+
+
+def _run_eager(name: str, payload: dict):
+    try:
+        get_handler(name)(**payload)
+    except Exception:
+        logger.exception("Eager job %s failed", name)
+
+
+def _due_jobs():
+    return Job.objects.filter(status=Job.STATUS_QUEUED, run_at__lte=timezone.now()).order_by(
+        "priority", "run_at", "id"
+    )
+
+
+def claim_jobs(worker_id: str, limit: int = 10) -> list[Job]:
+    """Atomically mark up to `limit` due jobs as running for `worker_id`."""
+    now = timezone.now()
+    claim = {
+        "status": Job.STATUS_RUNNING,
+        "locked_by": worker_id,
+        "locked_at": now,
+        "attempts": F("attempts") + 1,
+        "updated_at": now,
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(_due_jobs().select_for_update(skip_locked=True).values_list("id", flat=True)[:limit])
+            if ids:
+                Job.objects.filter(id__in=ids).update(**claim)
+    else:
+        # No row locks: claim candidates one at a time with a compare-and-swap
+        # on status. Losing a race just means another worker got that row.
+        ids = []
+        for job_id in _due_jobs().values_list("id", flat=True)[: limit * 2]:
+            if Job.objects.filter(id=job_id, status=Job.STATUS_QUEUED).update(**claim):
+                ids.append(job_id)
+                if len(ids) >= limit:
+                    break
+
+    if not ids:
+        return []
+    return list(Job.objects.filter(id__in=ids).order_by("priority", "run_at", "id"))
+
+
+def requeue_stale(timeout_seconds: int | None = None) -> int:
+    """Return jobs whose worker died mid-run to the queue."""
+    if timeout_seconds is None:
+        timeout_seconds = getattr(settings, "JOBS_LOCK_TIMEOUT_SECONDS", 600)
+    cutoff = timezone.now() - timedelta(seconds=timeout_seconds)
+    return Job.objects.filter(status=Job.STATUS_RUNNING, locked_at__lt=cutoff).update(
+        status=Job.STATUS_QUEUED, locked_by="", locked_at=None
+    )
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with a little jitter, capped at JOBS_BACKOFF_MAX_SECONDS."""
+    base = getattr(settings, "JOBS_BACKOFF_BASE_SECONDS", 10)
+    cap = getattr(settings, "JOBS_BACKOFF_MAX_SECONDS", 3600)
+    delay = min(base * (2 ** max(attempts - 1, 0)), cap)
+    return delay + random.uniform(0, delay * 0.1)
+
+
+def run_job(job: Job) -> bool:
+    """Execute a claimed job and record the outcome. Returns True on success."""
+    handler = get_handler(job.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No job handler registered for {job.name!r}")
+        handler(**(job.payload or {}))
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s #%s failed permanently after %s attempts", job.name, job.pk, job.attempts)
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.STATUS_FAILED, last_error=error, locked_by="", locked_at=None, updated_at=now
+            )
+        else:
+            delay = backoff_seconds(job.attempts)
+            logger.warning("Job %s #%s failed (attempt %s), retrying in %.0fs", job.name, job.pk, job.attempts, delay)
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.STATUS_QUEUED,
+                last_error=error,
+                run_at=now + timedelta(seconds=delay),
+                locked_by="",
+                locked_at=None,
+                updated_at=now,
+            )
+        return False
+
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.STATUS_DONE, last_error="", locked_by="", locked_at=None, updated_at=timezone.now()
+    )
+    return True
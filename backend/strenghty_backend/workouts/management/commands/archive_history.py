@@ -0,0 +1,78 @@
+"""Move old finished workouts into per-user, per-year cold storage.
+
+Run periodically, e.g. nightly from cron; see `workouts.archive`:
+    python manage.py archive_history
+    python manage.py archive_history --user alice --older-than-days 365
+    python manage.py archive_history --user alice --rehydrate 2019
+"""
+
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from workouts import archive, sharding
+from workouts.models import Workout
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Archive finished workouts from old calendar years, or bring one year back with --rehydrate."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only this user id or username")
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            help="Archive calendar years that ended more than this many days ago (default: ARCHIVE_AFTER_DAYS)",
+        )
+        parser.add_argument("--rehydrate", type=int, metavar="YEAR", help="Move this archived year of --user back instead")
+
+    def handle(self, *args, **options):
+        ident = options["user"]
+        owner = None
+        if ident:
+            lookup = {"pk": ident} if ident.isdigit() else {"username": ident}
+            try:
+                owner = User.objects.get(**lookup)
+            except User.DoesNotExist:
+                raise CommandError(f"No such user: {ident}")
+
+        year = options["rehydrate"]
+        if year is not None:
+            if owner is None:
+                raise CommandError("--rehydrate needs --user.")
+            with sharding.for_user(owner.pk):
+                counts = archive.rehydrate(owner.pk, year)
+            if not counts:
+                raise CommandError(f"{owner.username} has no archived {year}.")
+            self.stdout.write(self.style.SUCCESS(f"Rehydrated {year}: {self._describe(counts)}"))
+            return
+
+        before_year = archive.archive_before_year(after_days=options["older_than_days"])
+        started = time.monotonic()
+        totals = Counter()
+        if owner is not None:
+            owner_ids = [owner.pk]
+        else:
+            owner_ids = []
+            for alias in sharding.shard_aliases():
+                with sharding.for_shard(alias):
+                    old = Workout.objects.filter(ended_at__isnull=False, date__year__lt=before_year)
+                    owner_ids += old.order_by().values_list("owner_id", flat=True).distinct()
+        for owner_id in owner_ids:
+            counts = archive.archive_user(owner_id, before_year=before_year)
+            totals.update(counts)
+            if counts:
+                self.stdout.write(f"  user {owner_id}: {self._describe(counts)}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived years before {before_year}: {self._describe(totals) or 'nothing to do'} "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
+
+    def _describe(self, counts) -> str:
+        return ", ".join(f"{value} {key.replace('_', ' ')}" for key, value in counts.items() if value)
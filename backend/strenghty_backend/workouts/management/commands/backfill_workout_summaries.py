@@ -0,0 +1,63 @@
+"""Recompute the denormalized summary columns on every workout.
+
+Run once after migration 0015, and any time the summaries are suspected to
+have drifted (e.g. after editing sets directly in the database):
+    python manage.py backfill_workout_summaries
+    python manage.py backfill_workout_summaries --user alice --batch-size 200
+"""
+
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from workouts import sharding, summaries
+from workouts.models import Workout
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Recompute Workout set/exercise/PR counts, volume, cardio totals and duration in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only this user id or username")
+        parser.add_argument("--batch-size", type=int, default=summaries.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        ident = options["user"]
+        owner = None
+        if ident:
+            lookup = {"pk": ident} if ident.isdigit() else {"username": ident}
+            try:
+                owner = User.objects.get(**lookup)
+            except User.DoesNotExist:
+                raise CommandError(f"No such user: {ident}")
+
+        started = time.monotonic()
+        done = 0
+        if owner is not None:
+            with sharding.for_user(owner.pk):
+                done = self._refresh(Workout.objects.filter(owner=owner), options["batch_size"], done)
+        else:
+            for alias in sharding.shard_aliases():
+                with sharding.for_shard(alias):
+                    done = self._refresh(Workout.objects.all(), options["batch_size"], done)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {done} workouts in {time.monotonic() - started:.1f}s"))
+
+    def _refresh(self, workouts, batch_size: int, done: int) -> int:
+        workouts = workouts.order_by("pk")
+        batches = 0
+        last_pk = 0
+        # Walk the primary key so each batch is an index range scan and
+        # workouts created mid-run are still picked up.
+        while True:
+            ids = list(workouts.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            done += summaries.refresh_many(ids, batch_size=batch_size)
+            last_pk = ids[-1]
+            batches += 1
+            if batches % 20 == 0:
+                self.stdout.write(f"  {done} workouts...")
+        return done
@@ -0,0 +1,55 @@
+"""Export one user's data to a file without loading it into memory.
+
+Usage:
+    python manage.py export_user alice -o alice.ndjson.gz --gzip
+    python manage.py export_user 42 --fmt csv --entity sets -o sets.csv
+"""
+
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from workouts import export, sharding
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Stream a user's workouts, sets, cardio sets, exercises and profile as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", help="User id or username")
+        parser.add_argument("--fmt", choices=["ndjson", "csv"], default="ndjson")
+        parser.add_argument("--entity", choices=export.ENTITIES, help="Single entity (CSV defaults to sets).")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("-o", "--output", help="File to write (default: stdout)")
+
+    def handle(self, *args, **options):
+        ident = options["user"]
+        lookup = {"pk": ident} if ident.isdigit() else {"username": ident}
+        try:
+            user = User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"No user {ident!r}")
+
+        if options["fmt"] == "csv":
+            chunks = export.csv_chunks(user, options["entity"] or "sets")
+        else:
+            chunks = export.ndjson_chunks(user, [options["entity"]] if options["entity"] else export.ENTITIES)
+        if options["gzip"]:
+            chunks = export.gzip_chunks(chunks)
+
+        chunks = sharding.bind(chunks, sharding.lookup(user.pk)[0])
+
+        out = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        written = 0
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if options["output"]:
+                out.close()
+        if options["output"]:
+            self.stderr.write(f"Wrote {written} bytes to {options['output']}")
@@ -0,0 +1,54 @@
+"""Import workout history for a user from a CSV or NDJSON file.
+
+Usage:
+    python manage.py import_history alice history.csv
+    python manage.py import_history 42 export.ndjson.gz --fmt ndjson
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from workouts import importer, sharding
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Bulk-import sets and cardio sets (CSV or NDJSON, optionally gzipped) into a user's history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", help="User id or username")
+        parser.add_argument("path")
+        parser.add_argument("--fmt", choices=["csv", "ndjson"], help="Defaults to the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=importer.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        ident = options["user"]
+        lookup = {"pk": ident} if ident.isdigit() else {"username": ident}
+        try:
+            user = User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"No user {ident!r}")
+
+        path = options["path"]
+        fmt = options["fmt"] or ("csv" if path.lower().removesuffix(".gz").endswith(".csv") else "ndjson")
+
+        def progress(result):
+            self.stderr.write(f"  {result.rows} rows read, {result.sets} sets, {result.cardio_sets} cardio sets")
+
+        with open(path, "rb") as f, sharding.for_user(user.pk):
+            try:
+                result = importer.import_history(user, f, fmt, chunk_size=options["chunk_size"], progress=progress)
+            except importer.ImportFormatError as exc:
+                raise CommandError(str(exc))
+
+        rate = result.rows / result.seconds if result.seconds else 0
+        self.stdout.write(
+            f"Imported {result.sets} sets, {result.cardio_sets} cardio sets into {result.workouts} workouts "
+            f"({result.exercises_created} new exercises, {result.prs_updated} PR flags updated) "
+            f"from {result.rows} rows in {result.seconds:.1f}s ({rate:.0f} rows/s)"
+        )
+        if result.skipped:
+            self.stdout.write(f"Skipped {result.skipped} row(s):")
+            for err in result.errors:
+                self.stdout.write(f"  line {err['line']}: {err['error']}")
@@ -0,0 +1,54 @@
+"""Move one user's workouts data to another shard (see workouts/sharding.py).
+
+    python manage.py move_user_shard alice shard2
+    python manage.py move_user_shard 42 default --no-wait --keep-source
+
+The user's requests get a 503 while the move runs. Without --no-wait the
+copy starts only after SHARD_DIRECTORY_CACHE_SECONDS, once no worker can
+still be routing them to the old shard from a cached directory entry.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from workouts import sharding
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Copy a user's exercises, workouts and sets to another shard, switch the directory, then clean up."
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", help="User id or username")
+        parser.add_argument("shard", help="Target database alias (default, shard1, ...)")
+        parser.add_argument("--no-wait", action="store_true", help="Don't wait for cached directory entries to expire")
+        parser.add_argument("--keep-source", action="store_true", help="Leave the copied rows on the old shard")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError("Sharding is not configured; set DATABASE_SHARD_URLS.")
+        ident = options["user"]
+        lookup = {"pk": ident} if ident.isdigit() else {"username": ident}
+        try:
+            user = User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"No user {ident!r}")
+
+        source = sharding.lookup(user.pk)[0]
+        try:
+            copied = sharding.move_user(
+                user.pk,
+                options["shard"],
+                wait=not options["no_wait"],
+                batch_size=options["batch_size"],
+                keep_source=options["keep_source"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if not copied:
+            self.stdout.write(f"{user.username} is already on {source}")
+            return
+        summary = ", ".join(f"{count} {label.split('.')[1]}" for label, count in copied.items())
+        self.stdout.write(self.style.SUCCESS(f"Moved {user.username} from {source} to {options['shard']}: {summary}"))
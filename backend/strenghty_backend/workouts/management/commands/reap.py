@@ -0,0 +1,56 @@
+"""Purge expired password reset codes, stale tokens, finished jobs and old push events.
+
+Safe to run as often as you like, e.g. hourly from cron:
+    python manage.py reap
+    python manage.py reap --tokens-max-age-days 180 --dry-run
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from workouts import reaper
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired/used password reset codes, stale auth tokens, old finished jobs "
+        "and expired push events in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=reaper.DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.05,
+            help="Seconds to sleep between delete batches to let other writers through.",
+        )
+        parser.add_argument(
+            "--tokens-max-age-days",
+            type=int,
+            default=None,
+            help="Also delete tokens older than this that haven't been used since. Off by default.",
+        )
+        parser.add_argument("--jobs-max-age-days", type=int, default=7)
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted.")
+
+    def handle(self, *args, **options):
+        common = {
+            "batch_size": options["batch_size"],
+            "pause": options["pause"],
+            "dry_run": options["dry_run"],
+        }
+        started = time.monotonic()
+        counts = {
+            "password_reset_codes": reaper.reap_password_reset_codes(**common),
+            "tokens": reaper.reap_tokens(max_age_days=options["tokens_max_age_days"], **common),
+            "jobs": reaper.reap_jobs(max_age_days=options["jobs_max_age_days"], **common),
+            "push_events": reaper.reap_push_events(**common),
+        }
+        elapsed = time.monotonic() - started
+
+        verb = "would reclaim" if options["dry_run"] else "reclaimed"
+        for name, count in counts.items():
+            self.stdout.write(f"{name}: {verb} {count} row(s)")
+        self.stdout.write(f"total: {verb} {sum(counts.values())} row(s) in {elapsed:.2f}s")
@@ -0,0 +1,88 @@
+"""Run background jobs from the `Job` table.
+
+Usage:
+    python manage.py run_worker --threads 4
+    python manage.py run_worker --burst   # drain due jobs, then exit
+"""
+
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from workouts import jobs
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Process queued background jobs with a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=int(os.environ.get("WORKER_THREADS", "2")))
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to sleep when the queue is empty.",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once no due jobs remain instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        threads = max(1, options["threads"])
+        poll_interval = options["poll_interval"]
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        stop = threading.Event()
+
+        def _request_stop(signum, frame):
+            logger.info("Worker %s stopping after in-flight jobs", worker_id)
+            stop.set()
+
+        signal.signal(signal.SIGTERM, _request_stop)
+        signal.signal(signal.SIGINT, _request_stop)
+
+        self.stdout.write(f"Worker {worker_id} started with {threads} thread(s)")
+        processed = 0
+        last_stale_check = 0.0
+
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="job") as pool:
+            while not stop.is_set():
+                close_old_connections()
+                if time.monotonic() - last_stale_check > 60:
+                    requeued = jobs.requeue_stale()
+                    if requeued:
+                        logger.warning("Requeued %s stale job(s)", requeued)
+                    last_stale_check = time.monotonic()
+
+                # Claim a couple of jobs per thread so the pool stays busy
+                # without holding rows other workers could be running.
+                claimed = jobs.claim_jobs(worker_id, limit=threads * 2)
+                if not claimed:
+                    if options["burst"]:
+                        break
+                    stop.wait(poll_interval)
+                    continue
+
+                futures = [pool.submit(self._run, job) for job in claimed]
+                wait(futures)
+                processed += len(futures)
+
+        self.stdout.write(f"Worker {worker_id} exiting after {processed} job(s)")
+
+    @staticmethod
+    def _run(job):
+        try:
+            return jobs.run_job(job)
+        finally:
+            # Each pool thread holds its own connection; don't leak them.
+            connections.close_all()
@@ -0,0 +1,17 @@
+"""Index PasswordResetCode.created_at so the reaper can find expired codes."""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workouts", "0011_job"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="passwordresetcode",
+            index=models.Index(fields=["created_at"], name="workouts_pa_created_9983b3_idx"),
+        ),
+    ]
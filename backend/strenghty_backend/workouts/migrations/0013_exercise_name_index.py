@@ -0,0 +1,18 @@
+"""Index Exercise.name for admin prefix search across all users."""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workouts", "0012_passwordresetcode_created_at_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="exercise",
+            name="name",
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,41 @@
+"""Add per-(workout, exercise) set number counters.
+
+Existing pairs have no counter row; the first allocation for a pair seeds
+it from the current `Max(set_number)`, so no data migration is needed.
+"""
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workouts", "0013_exercise_name_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SetNumberCounter",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("kind", models.CharField(choices=[("strength", "Strength"), ("cardio", "Cardio")], max_length=8)),
+                ("last_number", models.PositiveIntegerField(default=0)),
+                (
+                    "exercise",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="workouts.exercise"
+                    ),
+                ),
+                (
+                    "workout",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="workouts.workout"
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("workout", "exercise", "kind")},
+            },
+        ),
+    ]
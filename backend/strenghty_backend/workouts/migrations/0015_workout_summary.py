@@ -0,0 +1,51 @@
+"""Add denormalized summary columns to Workout.
+
+Existing rows start at zero; 0026 fills them in.
+"""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workouts", "0014_setnumbercounter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="workout",
+            name="set_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="workout",
+            name="exercise_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="workout",
+            name="total_volume_kg",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="workout",
+            name="pr_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="workout",
+            name="cardio_duration_seconds",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="workout",
+            name="cardio_distance_meters",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name="workout",
+            name="duration_seconds",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+"""Add the user -> database directory used by the optional sharding mode.
+
+Empty until sharding is configured; see `workouts.sharding`.
+"""
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("workouts", "0015_workout_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserShard",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("alias", models.CharField(max_length=64)),
+                ("moving", models.BooleanField(default=False)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
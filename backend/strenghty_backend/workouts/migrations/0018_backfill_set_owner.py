@@ -0,0 +1,45 @@
+"""Copy each set's workout owner onto the set.
+
+Runs outside a migration-wide transaction, one short transaction per
+primary-key chunk, so a large table is never locked as a whole and an
+interrupted run simply resumes with the rows still missing an owner.
+"""
+
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+
+CHUNK_SIZE = 5000
+
+
+def _backfill(model_name):
+    def run(apps, schema_editor):
+        db = schema_editor.connection.alias
+        model = apps.get_model("workouts", model_name)
+        Workout = apps.get_model("workouts", "Workout")
+        owner = Subquery(Workout.objects.filter(pk=OuterRef("workout_id")).values("owner_id")[:1])
+        pending = model.objects.using(db).filter(owner__isnull=True).order_by("pk")
+        last_pk = 0
+        while True:
+            ids = list(pending.filter(pk__gt=last_pk).values_list("pk", flat=True)[:CHUNK_SIZE])
+            if not ids:
+                break
+            with transaction.atomic(using=db):
+                model.objects.using(db).filter(pk__in=ids).update(owner_id=owner)
+            last_pk = ids[-1]
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("workouts", "0017_set_owner"),
+    ]
+
+    operations = [
+        # Hints let the shard router run each step wherever the model lives.
+        migrations.RunPython(_backfill("WorkoutSet"), migrations.RunPython.noop, hints={"model_name": "workoutset"}),
+        migrations.RunPython(_backfill("CardioSet"), migrations.RunPython.noop, hints={"model_name": "cardioset"}),
+    ]
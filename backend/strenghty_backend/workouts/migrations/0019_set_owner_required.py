@@ -0,0 +1,46 @@
+"""Make the set `owner` columns required and index them for per-user scans."""
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("workouts", "0018_backfill_set_owner"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="workoutset",
+            name="owner",
+            field=models.ForeignKey(
+                db_index=False,
+                editable=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="cardioset",
+            name="owner",
+            field=models.ForeignKey(
+                db_index=False,
+                editable=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="workoutset",
+            index=models.Index(fields=["owner", "exercise", "set_type"], name="workouts_wo_owner_i_135685_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="cardioset",
+            index=models.Index(fields=["owner", "exercise", "mode"], name="workouts_ca_owner_i_b8375e_idx"),
+        ),
+    ]
@@ -0,0 +1,46 @@
+"""Add the per-user, per-year cold-storage table; see `workouts.archive`."""
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("workouts", "0019_set_owner_required"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedYear",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("year", models.PositiveSmallIntegerField()),
+                (
+                    "codec",
+                    models.CharField(choices=[("gzip", "gzip"), ("zstd", "Zstandard")], default="gzip", max_length=8),
+                ),
+                ("payload", models.BinaryField()),
+                ("bests", models.JSONField(blank=True, default=dict)),
+                ("workout_count", models.PositiveIntegerField(default=0)),
+                ("set_count", models.PositiveIntegerField(default=0)),
+                ("cardio_set_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("owner", "year")},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+"""Add the canonical kg, e1RM and volume columns to WorkoutSet.
+
+0022 fills them in for existing sets and 0023 indexes them.
+"""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("workouts", "0020_archivedyear"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="workoutset",
+            name="weight_kg",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="workoutset",
+            name="e1rm_kg",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="workoutset",
+            name="volume_kg",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,56 @@
+"""Compute the kg metric columns for sets logged before they existed.
+
+Same shape as 0018: no migration-wide transaction, one short UPDATE per
+primary-key chunk, resumable from the rows still missing `weight_kg`. The
+expressions do the arithmetic in the same order as
+`WorkoutSet.set_kg_metrics()`, so backfilled and newly saved values agree.
+"""
+
+from django.db import migrations, transaction
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+
+CHUNK_SIZE = 5000
+# Copied from workouts.models when this was written: migrations must not
+# depend on the current models module.
+LBS_PER_KG = 2.20462
+
+_WEIGHT = Cast("weight", FloatField())
+_WEIGHT_KG = Case(When(unit="kg", then=_WEIGHT), default=_WEIGHT / Value(LBS_PER_KG), output_field=FloatField())
+_REPS = Cast("reps", FloatField())
+
+
+def backfill(apps, schema_editor):
+    db = schema_editor.connection.alias
+    WorkoutSet = apps.get_model("workouts", "WorkoutSet")
+    values = {
+        "weight_kg": _WEIGHT_KG,
+        "volume_kg": _WEIGHT_KG * _REPS,
+        "e1rm_kg": Case(
+            When(Q(reps__gt=0, reps__lt=37), then=_WEIGHT_KG * Value(36.0) / (Value(37.0) - _REPS)),
+            default=None,
+            output_field=FloatField(),
+        ),
+    }
+    pending = WorkoutSet.objects.using(db).filter(weight__isnull=False, weight_kg__isnull=True).order_by("pk")
+    last_pk = 0
+    while True:
+        ids = list(pending.filter(pk__gt=last_pk).values_list("pk", flat=True)[:CHUNK_SIZE])
+        if not ids:
+            break
+        with transaction.atomic(using=db):
+            WorkoutSet.objects.using(db).filter(pk__in=ids).update(**values)
+        last_pk = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("workouts", "0021_set_kg_metrics"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop, hints={"model_name": "workoutset"}),
+    ]
@@ -0,0 +1,27 @@
+"""Index the kg metric columns per user and exercise for top-N / max lookups."""
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("workouts", "0022_backfill_set_kg_metrics"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="workoutset",
+            index=models.Index(fields=["owner", "exercise", "weight_kg"], name="workouts_wo_owner_i_3a2128_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="workoutset",
+            index=models.Index(fields=["owner", "exercise", "e1rm_kg"], name="workouts_wo_owner_i_6148cf_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="workoutset",
+            index=models.Index(fields=["owner", "exercise", "volume_kg"], name="workouts_wo_owner_i_824743_idx"),
+        ),
+    ]
@@ -0,0 +1,34 @@
+"""Index workouts by (owner, date) in place of the plain owner index.
+
+The composite index is built before the old one is dropped, so per-user
+workout queries are never left without one.
+"""
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("workouts", "0023_set_kg_metric_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="workout",
+            index=models.Index(fields=["owner", "date"], name="workouts_wo_owner_i_d6d06f_idx"),
+        ),
+        migrations.AlterField(
+            model_name="workout",
+            name="owner",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="workouts",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,101 @@
+"""Fill in the Workout summary columns added by 0015 for existing workouts.
+
+Mirrors `workouts.summaries` with the historical models. Runs outside a
+migration-wide transaction, one short transaction per primary-key chunk,
+so a large table is never locked as a whole. Only workouts that have sets
+or an end time are touched, and recomputing is idempotent, so an
+interrupted run can simply be repeated (as can
+`manage.py backfill_workout_summaries`).
+"""
+
+from decimal import Decimal
+
+from django.db import migrations, transaction
+from django.db.models import Case, Count, DecimalField, Exists, F, OuterRef, Q, Sum, Value, When
+
+CHUNK_SIZE = 500
+CENT = Decimal("0.01")
+# workouts.models.LBS_PER_KG when this was written, as a decimal.
+LBS_PER_KG = Decimal("2.20462")
+
+
+def backfill(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Workout = apps.get_model("workouts", "Workout")
+    WorkoutSet = apps.get_model("workouts", "WorkoutSet")
+    CardioSet = apps.get_model("workouts", "CardioSet")
+    volume_kg = Case(
+        When(unit="kg", then=F("weight") * F("reps")),
+        default=F("weight") * F("reps") / Value(LBS_PER_KG),
+        output_field=DecimalField(max_digits=14, decimal_places=4),
+    )
+    pending = (
+        Workout.objects.using(db)
+        .filter(
+            Q(Exists(WorkoutSet.objects.filter(workout_id=OuterRef("pk"))))
+            | Q(Exists(CardioSet.objects.filter(workout_id=OuterRef("pk"))))
+            | Q(ended_at__isnull=False)
+        )
+        .order_by("pk")
+    )
+    last_pk = 0
+    while True:
+        workouts = list(pending.filter(pk__gt=last_pk).only("id", "created_at", "ended_at")[:CHUNK_SIZE])
+        if not workouts:
+            break
+        ids = [w.pk for w in workouts]
+        totals = {
+            pk: {"set_count": 0, "exercise_count": 0, "total_volume_kg": Decimal(0), "pr_count": 0,
+                 "cardio_duration_seconds": 0, "cardio_distance_meters": Decimal(0)}
+            for pk in ids
+        }
+        strength = (
+            WorkoutSet.objects.using(db).filter(workout_id__in=ids).order_by().values("workout_id")
+            .annotate(n=Count("id"), prs=Count("id", filter=Q(is_pr=True)), volume=Sum(volume_kg))
+        )
+        for row in strength:
+            t = totals[row["workout_id"]]
+            t["set_count"] += row["n"]
+            t["pr_count"] += row["prs"]
+            t["total_volume_kg"] = Decimal(row["volume"] or 0).quantize(CENT)
+        cardio = (
+            CardioSet.objects.using(db).filter(workout_id__in=ids).order_by().values("workout_id")
+            .annotate(n=Count("id"), prs=Count("id", filter=Q(is_pr=True)),
+                      duration=Sum("duration_seconds"), distance=Sum("distance_meters"))
+        )
+        for row in cardio:
+            t = totals[row["workout_id"]]
+            t["set_count"] += row["n"]
+            t["pr_count"] += row["prs"]
+            t["cardio_duration_seconds"] = row["duration"] or 0
+            t["cardio_distance_meters"] = Decimal(row["distance"] or 0).quantize(CENT)
+        pairs = (
+            WorkoutSet.objects.using(db).filter(workout_id__in=ids).order_by().values_list("workout_id", "exercise_id")
+        ).union(
+            CardioSet.objects.using(db).filter(workout_id__in=ids).order_by().values_list("workout_id", "exercise_id")
+        )
+        for workout_id, _ in pairs:
+            totals[workout_id]["exercise_count"] += 1
+
+        for w in workouts:
+            for field, value in totals[w.pk].items():
+                setattr(w, field, value)
+            if w.ended_at is not None and w.created_at is not None:
+                w.duration_seconds = max(0, int((w.ended_at - w.created_at).total_seconds()))
+        with transaction.atomic(using=db):
+            Workout.objects.using(db).bulk_update(workouts, [*totals[ids[0]], "duration_seconds"])
+        last_pk = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("workouts", "0025_pushevent"),
+    ]
+
+    operations = [
+        # The hint lets the shard router run it wherever workouts live.
+        migrations.RunPython(backfill, migrations.RunPython.noop, hints={"model_name": "workout"}),
+    ]
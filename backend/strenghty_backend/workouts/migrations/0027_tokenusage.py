@@ -0,0 +1,61 @@
+"""Track when auth tokens were last used; see `workouts.authentication`.
+
+Existing tokens count as used now, so `manage.py reap --tokens-max-age-days`
+gives them a full window to show up before treating them as idle. The
+rows are created in primary-key chunks, one short transaction each.
+"""
+
+from django.db import migrations, models, transaction
+from django.utils import timezone
+import django.db.models.deletion
+
+CHUNK_SIZE = 1000
+
+
+def backfill(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Token = apps.get_model("authtoken", "Token")
+    TokenUsage = apps.get_model("workouts", "TokenUsage")
+    now = timezone.now()
+    last_key = ""
+    while True:
+        keys = list(
+            Token.objects.using(db).filter(key__gt=last_key).order_by("key").values_list("key", flat=True)[:CHUNK_SIZE]
+        )
+        if not keys:
+            break
+        with transaction.atomic(using=db):
+            TokenUsage.objects.using(db).bulk_create(
+                [TokenUsage(token_id=key, last_used=now) for key in keys], ignore_conflicts=True
+            )
+        last_key = keys[-1]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("authtoken", "0003_tokenproxy"),
+        ("workouts", "0026_backfill_workout_summaries"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TokenUsage",
+            fields=[
+                (
+                    "token",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="usage",
+                        serialize=False,
+                        to="authtoken.token",
+                    ),
+                ),
+                ("last_used", models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop, hints={"model_name": "tokenusage"}),
+    ]
@@ -1,9 +1,27 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 
 User = get_user_model()
 
+# The one lbs -> kg factor: PR flags, the kg metric columns and workout
+# volume totals all convert with it, so they always agree.
+LBS_PER_KG = 2.20462
+
+
+def to_kg(weight, unit: str | None) -> float | None:
+    """`weight` in kg; any unit other than "kg" (including none) means lbs."""
+    if weight is None:
+        return None
+    try:
+        w = float(weight)
+    except (TypeError, ValueError):
+        return None
+    return w if (unit or "lbs") == "kg" else w / LBS_PER_KG
+
+
 class Exercise(models.Model):
     MUSCLE_GROUP_CHOICES = [
         ("CHEST", "Chest"),
@@ -16,7 +34,9 @@ class Exercise(models.Model):
     ]
     
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="exercises")
-    name = models.CharField(max_length=100)
+    # Indexed on its own for admin prefix search across all users; the
+    # (owner, name) unique index only helps per-owner lookups.
+    name = models.CharField(max_length=100, db_index=True)
     muscle_group = models.CharField(max_length=20, choices=MUSCLE_GROUP_CHOICES)
     description = models.TextField(blank=True)
     # Mark exercises explicitly created by the user via the "New Exercise"
@@ -34,22 +54,42 @@ class Exercise(models.Model):
     
 
 class Workout(models.Model):
-    owner = models.ForeignKey(User, on_delete=models.CASCADE,related_name="workouts")
+    # Indexed by the (owner, date) index below.
+    owner = models.ForeignKey(User, on_delete=models.CASCADE,related_name="workouts", db_index=False)
     name = models.CharField(max_length=100, blank=False)
     date = models.DateField()
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     ended_at = models.DateTimeField(null=True, blank=True)
-    
+
+    # Denormalized summary, kept in step with the workout's sets by
+    # `workouts.summaries.refresh` inside the same transaction as each write.
+    # Strength and cardio sets both count towards set/exercise/PR counts.
+    set_count = models.PositiveIntegerField(default=0)
+    exercise_count = models.PositiveIntegerField(default=0)
+    total_volume_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    pr_count = models.PositiveIntegerField(default=0)
+    cardio_duration_seconds = models.PositiveIntegerField(default=0)
+    cardio_distance_meters = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Seconds from created_at to ended_at; null until the workout is finished.
+    duration_seconds = models.PositiveIntegerField(null=True, blank=True)
+
     class Meta:
         ordering = ["-date", "-created_at"]
+        indexes = [
+            # Per-user date ranges: the workout list and the activity calendar.
+            models.Index(fields=["owner", "date"]),
+        ]
         
     def __str__(self) -> str:
         return f"Workout on {self.date} by {self. owner.username}"
     
 class WorkoutSet(models.Model):
     workout = models.ForeignKey(Workout, on_delete=models.CASCADE, related_name="sets")
+    # Copy of workout.owner so per-user set queries skip the join; the
+    # composite index below leads with it, so no separate FK index.
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", db_index=False, editable=False)
     exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE,related_name="sets")
     set_number = models.PositiveIntegerField()
     reps = models.PositiveIntegerField()
@@ -76,14 +116,53 @@ class WorkoutSet(models.Model):
     set_type = models.CharField(max_length=1, choices=SET_TYPE_CHOICES, default="S")
     rpe = models.DecimalField(max_digits=3, decimal_places=1, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Canonical metrics derived from weight/unit/reps by `set_kg_metrics()`,
+    # kept so the database can index and aggregate them. Null without a
+    # weight; e1RM (Brzycki, as the PR flags use) also needs 1..36 reps.
+    weight_kg = models.FloatField(null=True, blank=True, editable=False)
+    e1rm_kg = models.FloatField(null=True, blank=True, editable=False)
+    volume_kg = models.FloatField(null=True, blank=True, editable=False)
+
+    KG_METRIC_FIELDS = ("weight_kg", "e1rm_kg", "volume_kg")
     
     class Meta:
         ordering = ["workout" , "set_number"]
         unique_together = ("workout", "exercise", "set_number")
+        indexes = [
+            # The PR history scan: one user's working sets of one exercise.
+            models.Index(fields=["owner", "exercise", "set_type"]),
+            # Heaviest / best-e1RM / best-volume set of an exercise, read as
+            # ORDER BY metric DESC LIMIT 1 off the end of the index.
+            models.Index(fields=["owner", "exercise", "weight_kg"]),
+            models.Index(fields=["owner", "exercise", "e1rm_kg"]),
+            models.Index(fields=["owner", "exercise", "volume_kg"]),
+        ]
         
     def __str__(self) -> str:
         return f"{self.exercise.name} - Set {self.set_number} ({self.reps}reps)"
 
+    def set_kg_metrics(self):
+        """Recompute `weight_kg`, `e1rm_kg` and `volume_kg` from weight/unit/reps.
+
+        `save()` calls this; paths that skip it (`bulk_create`) must call it
+        themselves.
+        """
+        if self.weight is None:
+            self.weight_kg = self.e1rm_kg = self.volume_kg = None
+            return
+        w_kg = to_kg(self.weight, self.unit)
+        reps = self.reps or 0
+        self.weight_kg = w_kg
+        self.volume_kg = w_kg * reps
+        self.e1rm_kg = w_kg * 36.0 / (37.0 - reps) if 0 < reps < 37 else None
+
+    def save(self, *args, **kwargs):
+        self.set_kg_metrics()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"weight", "unit", "reps"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, *self.KG_METRIC_FIELDS}
+        super().save(*args, **kwargs)
+
 
 class CardioSet(models.Model):
     """Structured cardio metrics tracked per workout set.
@@ -101,6 +180,8 @@ class CardioSet(models.Model):
     ]
 
     workout = models.ForeignKey(Workout, on_delete=models.CASCADE, related_name="cardio_sets")
+    # Copy of workout.owner, as on WorkoutSet.
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", db_index=False, editable=False)
     exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, related_name="cardio_sets")
     set_number = models.PositiveIntegerField(default=1)
     mode = models.CharField(max_length=16, choices=CARDIO_MODE_CHOICES)
@@ -127,9 +208,40 @@ class CardioSet(models.Model):
     class Meta:
         ordering = ["workout", "set_number"]
         unique_together = ("workout", "exercise", "set_number")
+        indexes = [
+            models.Index(fields=["owner", "exercise", "mode"]),
+        ]
 
     def __str__(self) -> str:
         return f"Cardio {self.exercise.name} - Set {self.set_number}"
+
+
+class SetNumberCounter(models.Model):
+    """Last set number handed out per workout, exercise and set table.
+
+    `workouts.numbering.next_set_number` bumps `last_number` with a single
+    `UPDATE ... SET last_number = last_number + 1`, so concurrent requests
+    for the same pair serialize on this one row instead of racing a
+    `Max(set_number)` scan into the unique constraint.
+    """
+
+    KIND_STRENGTH = "strength"
+    KIND_CARDIO = "cardio"
+    KIND_CHOICES = [
+        (KIND_STRENGTH, "Strength"),
+        (KIND_CARDIO, "Cardio"),
+    ]
+
+    workout = models.ForeignKey(Workout, on_delete=models.CASCADE, related_name="+")
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, related_name="+")
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    last_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("workout", "exercise", "kind")
+
+    def __str__(self) -> str:
+        return f"{self.kind} counter for workout {self.workout_id} / exercise {self.exercise_id}: {self.last_number}"
     
 class PasswordResetCode(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="password_reset_codes")
@@ -140,6 +252,8 @@ class PasswordResetCode(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=["user", "code", "created_at"]),
+            # Lets the reaper find expired codes without a full scan.
+            models.Index(fields=["created_at"]),
         ]
 
     def __str__(self):
@@ -166,3 +280,139 @@ class Profile(models.Model):
 
     def __str__(self):
         return f"Profile for {self.user.username}"
+
+
+class Job(models.Model):
+    """A unit of background work picked up by the `run_worker` command.
+
+    Rows are claimed by workers with row locks (or an optimistic status
+    swap on SQLite), executed by the handler registered under `name` in
+    `workouts.jobs`, and retried with exponential backoff on failure.
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    # Lower numbers run first.
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 100
+    PRIORITY_LOW = 200
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=PRIORITY_NORMAL)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "priority", "run_at"]),
+        ]
+
+    def __str__(self):
+        return f"Job {self.name} #{self.pk} ({self.status})"
+
+
+class PushEvent(models.Model):
+    """A change notification queued by the `database` push broker.
+
+    See `workouts.push`. Rows live on `default`; the primary key is the
+    event's version and `manage.py reap` prunes them after
+    `PUSH_RETENTION_SECONDS`.
+    """
+
+    # Indexed by the (user, id) index below, for resuming one user's stream.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", db_index=False)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"]),
+        ]
+
+    def __str__(self):
+        return f"PushEvent #{self.pk} for user {self.user_id}"
+
+
+class TokenUsage(models.Model):
+    """When an auth token was last used, for `manage.py reap --tokens-max-age-days`.
+
+    Written by `workouts.authentication` at most once per
+    `TOUCH_INTERVAL`, so it lags real use by up to that long.
+    """
+
+    token = models.OneToOneField(Token, on_delete=models.CASCADE, primary_key=True, related_name="usage")
+    last_used = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Token last used {self.last_used:%Y-%m-%d %H:%M}"
+
+
+class UserShard(models.Model):
+    """Directory entry: which database holds a user's workouts data.
+
+    Only used when sharding is configured (see `workouts.sharding`). Rows
+    live on `default` and are created on a user's first authenticated
+    request; `move_user_shard` rewrites them to rebalance.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="+")
+    alias = models.CharField(max_length=64)
+    # Set while `move_user_shard` copies the user's rows; requests are
+    # turned away with 503 until the move finishes.
+    moving = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"user {self.user_id} -> {self.alias}"
+
+
+class ArchivedYear(models.Model):
+    """One user's finished workouts of one calendar year in cold storage.
+
+    Written by `workouts.archive`, which deletes the archived workouts, sets
+    and cardio sets from the live tables. `payload` holds them as compressed
+    column arrays; `bests` keeps per-exercise PR bests over the archived
+    sets so PR checks never have to decode the payload.
+    """
+
+    CODEC_GZIP = "gzip"
+    CODEC_ZSTD = "zstd"
+    CODEC_CHOICES = [
+        (CODEC_GZIP, "gzip"),
+        (CODEC_ZSTD, "Zstandard"),
+    ]
+
+    # The (owner, year) unique index leads with it, so no separate FK index.
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", db_index=False)
+    year = models.PositiveSmallIntegerField()
+    codec = models.CharField(max_length=8, choices=CODEC_CHOICES, default=CODEC_GZIP)
+    payload = models.BinaryField()
+    bests = models.JSONField(default=dict, blank=True)
+    workout_count = models.PositiveIntegerField(default=0)
+    set_count = models.PositiveIntegerField(default=0)
+    cardio_set_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("owner", "year")
+
+    def __str__(self):
+        return f"{self.year} archive of user {self.owner_id} ({self.workout_count} workouts)"
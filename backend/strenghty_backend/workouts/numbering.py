@@ -0,0 +1,62 @@
+"""Atomic set-number allocation.
+
+Set numbers used to be picked with `Max(set_number) + 1` followed by an
+insert, so two requests adding a set to the same workout/exercise at once
+could both pick the same number and one would fail the `unique_together`
+check. Here each (workout, exercise, table) pair has a `SetNumberCounter`
+row that is bumped with one `UPDATE ... SET last_number = last_number + 1`.
+The row lock taken by that UPDATE serializes concurrent callers for the
+same pair only, and only until the allocating transaction commits; no
+aggregate is scanned once the counter exists.
+"""
+
+from django.db import IntegrityError
+from django.db.models import F, Max
+from django.db.models.functions import Greatest
+
+from . import sharding
+from .models import CardioSet, SetNumberCounter, WorkoutSet
+
+_KINDS = {
+    WorkoutSet: SetNumberCounter.KIND_STRENGTH,
+    CardioSet: SetNumberCounter.KIND_CARDIO,
+}
+
+
+def _counter(model, workout_id: int, exercise_id: int):
+    return SetNumberCounter.objects.filter(workout_id=workout_id, exercise_id=exercise_id, kind=_KINDS[model])
+
+
+def next_set_number(model, workout_id: int, exercise_id: int) -> int:
+    """Reserve and return the next set number for `model` (WorkoutSet or CardioSet).
+
+    Numbers are never handed out twice, but a reservation whose insert then
+    fails leaves a gap, which is harmless: set numbers only order sets.
+    """
+    counter = _counter(model, workout_id, exercise_id)
+    with sharding.atomic():
+        if counter.update(last_number=F("last_number") + 1):
+            return counter.values_list("last_number", flat=True).get()
+
+        # First set for this pair since counters were introduced (or an
+        # imported workout): seed from the rows already there.
+        seed = model.objects.filter(workout_id=workout_id, exercise_id=exercise_id).aggregate(n=Max("set_number"))["n"] or 0
+        try:
+            with sharding.atomic():
+                SetNumberCounter.objects.create(
+                    workout_id=workout_id, exercise_id=exercise_id, kind=_KINDS[model], last_number=seed + 1
+                )
+            return seed + 1
+        except IntegrityError:
+            # Another request created the counter first; take a number from it.
+            counter.update(last_number=F("last_number") + 1)
+            return counter.values_list("last_number", flat=True).get()
+
+
+def reserve_through(model, workout_id: int, exercise_id: int, number: int):
+    """Make sure the pair's counter won't hand out `number` or anything below it.
+
+    Used when an existing set moves to another workout or exercise and keeps
+    its number there.
+    """
+    _counter(model, workout_id, exercise_id).update(last_number=Greatest(F("last_number"), number))
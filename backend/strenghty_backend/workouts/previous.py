@@ -0,0 +1,73 @@
+"""Last-time sets for a batch of exercises, to prefill a workout being logged.
+
+Starting a routine used to fetch each exercise's full set history, one
+request per exercise. `previous_sessions()` instead ranks each requested
+exercise's workouts newest first with a DENSE_RANK() window (partitioned
+by exercise, read through the `(owner, exercise, ...)` indexes) and keeps
+only the sets from the last N of them: one query for strength sets and
+one for cardio sets, whatever the number of exercises.
+
+Exercises last done in an archived year (`workouts.archive`) are filled
+from the archive; archived workouts are always older than live ones.
+"""
+
+from django.db.models import F, Window
+from django.db.models.functions import DenseRank
+
+from . import archive
+from .models import ArchivedYear, CardioSet, WorkoutSet
+
+DEFAULT_SESSIONS = 1
+MAX_SESSIONS = 10
+MAX_EXERCISES = 100
+
+
+def _recent(model, user, exercise_ids: list[int], sessions: int):
+    session = Window(
+        DenseRank(),
+        partition_by=[F("exercise_id")],
+        order_by=[F("workout__date").desc(), F("workout_id").desc()],
+    )
+    return (
+        model.objects.filter(owner=user, exercise_id__in=exercise_ids)
+        .annotate(session=session, workout_date=F("workout__date"))
+        .filter(session__lte=sessions)
+        .order_by("exercise_id", "session", "set_number", "id")
+    )
+
+
+def previous_sessions(user, exercise_ids: list[int], sessions: int = DEFAULT_SESSIONS) -> dict[int, list[dict]]:
+    """{exercise id: [{"workout", "date", "sets", "cardio_sets"}, ...]}, newest session first.
+
+    Sets are model instances in set order; exercises with no history map to [].
+    """
+    grouped = {pk: {} for pk in exercise_ids}
+
+    def add(objs, key: str):
+        for obj in objs:
+            found = grouped.get(obj.exercise_id)
+            if found is None:
+                continue
+            entry = found.setdefault(
+                obj.workout_id, {"workout": obj.workout_id, "date": obj.workout_date, "sets": [], "cardio_sets": []}
+            )
+            entry[key].append(obj)
+
+    add(_recent(WorkoutSet, user, exercise_ids, sessions), "sets")
+    add(_recent(CardioSet, user, exercise_ids, sessions), "cardio_sets")
+
+    short = {pk for pk, found in grouped.items() if len(found) < sessions}
+    if short and ArchivedYear.objects.filter(owner=user).exists():
+        dates = {w.pk: w.date for w in archive.archived(user.pk, "workouts")}
+        for entity in ("sets", "cardio_sets"):
+            objs = [obj for obj in archive.archived(user.pk, entity) if obj.exercise_id in short]
+            for obj in objs:
+                obj.workout_date = dates.get(obj.workout_id)
+            add(objs, entity)
+
+    # An exercise logged as both strength and cardio is ranked per kind;
+    # keep the newest sessions across the two.
+    return {
+        pk: sorted(found.values(), key=lambda s: (s["date"], s["workout"]), reverse=True)[:sessions]
+        for pk, found in grouped.items()
+    }
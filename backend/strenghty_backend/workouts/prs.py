@@ -0,0 +1,299 @@
+"""Recompute PR flags for a user's history in one chronological pass.
+
+`WorkoutSetSerializer._compute_pr_flags` and `CardioSetSerializer._compute_pr_flags`
+judge a single new set against everything logged before it, scanning the
+history each time. That's fine for one set but quadratic for a bulk import,
+so this module walks each exercise's sets once in (workout date, workout,
+set) order, keeping running bests, and applies the same rules to every set.
+Only rows whose flags actually change are written back, in chunks.
+
+Sets moved to cold storage (`workouts.archive`) are represented by the
+running bests saved with each archived year; every history here starts
+from those.
+"""
+
+from .models import ArchivedYear, CardioSet, WorkoutSet, to_kg
+
+UPDATE_CHUNK_SIZE = 1000
+
+STRENGTH_FLAGS = ("is_pr", "is_abs_weight_pr", "is_e1rm_pr", "is_volume_pr", "is_rep_pr")
+CARDIO_FLAGS = ("is_pr", "is_distance_pr", "is_pace_pr", "is_ascent_pr", "is_intensity_pr", "is_split_pr")
+
+
+def _float(val) -> float | None:
+    try:
+        return None if val is None else float(val)
+    except (TypeError, ValueError):
+        return None
+
+
+class _StrengthHistory:
+    """Running bests over the working sets seen so far for one exercise."""
+
+    def __init__(self):
+        self.seen = False
+        self.max_weight = None
+        self.max_volume = None
+        self.max_e1rm = None
+        self.reps_at_weight: dict[float, int] = {}
+
+    def flags_for(self, w_kg: float, reps: int) -> dict:
+        flags = dict.fromkeys(STRENGTH_FLAGS[1:], False)
+        if self.seen:
+            volume = w_kg * reps
+            e1rm = w_kg * 36.0 / (37.0 - reps) if reps < 37 else None
+            flags["is_abs_weight_pr"] = self.max_weight is None or w_kg > self.max_weight
+            flags["is_volume_pr"] = self.max_volume is None or volume > self.max_volume
+            flags["is_e1rm_pr"] = e1rm is not None and (self.max_e1rm is None or e1rm > self.max_e1rm)
+            best_reps = self.reps_at_weight.get(round(w_kg, 2))
+            flags["is_rep_pr"] = best_reps is None or reps > best_reps
+        flags["is_pr"] = any(flags.values())
+        return flags
+
+    def add(self, w_kg: float, reps: int):
+        self.seen = True
+        volume = w_kg * reps
+        e1rm = w_kg * 36.0 / (37.0 - reps) if reps < 37 else None
+        if self.max_weight is None or w_kg > self.max_weight:
+            self.max_weight = w_kg
+        if self.max_volume is None or volume > self.max_volume:
+            self.max_volume = volume
+        if e1rm is not None and (self.max_e1rm is None or e1rm > self.max_e1rm):
+            self.max_e1rm = e1rm
+        key = round(w_kg, 2)
+        if reps > self.reps_at_weight.get(key, 0):
+            self.reps_at_weight[key] = reps
+
+    def to_dict(self) -> dict:
+        return {
+            "max_weight": self.max_weight,
+            "max_volume": self.max_volume,
+            "max_e1rm": self.max_e1rm,
+            "reps_at_weight": {str(w): reps for w, reps in self.reps_at_weight.items()},
+        }
+
+    def merge(self, data: dict):
+        """Fold in bests saved with `to_dict`."""
+        self.seen = True
+        for attr in ("max_weight", "max_volume", "max_e1rm"):
+            value, best = data.get(attr), getattr(self, attr)
+            if value is not None and (best is None or value > best):
+                setattr(self, attr, value)
+        for key, reps in (data.get("reps_at_weight") or {}).items():
+            key = float(key)
+            if reps > self.reps_at_weight.get(key, 0):
+                self.reps_at_weight[key] = reps
+
+
+def _working_kg(s) -> float | None:
+    """The set's weight in kg if it counts towards strength PRs, else None."""
+    w_kg = to_kg(s.weight, s.unit)
+    if (s.set_type or "S").upper() in {"S", "F"} and (s.reps or 0) > 0 and w_kg is not None and w_kg > 0:
+        return w_kg
+    return None
+
+
+def _flush(model, pending: list, fields):
+    """Write changed flags back with one UPDATE per distinct flag combination.
+
+    There are only a handful of combinations, so this is far cheaper than
+    `bulk_update`'s per-row CASE expressions.
+    """
+    groups: dict[tuple, list[int]] = {}
+    for obj in pending:
+        groups.setdefault(tuple(getattr(obj, f) for f in fields), []).append(obj.pk)
+    for values, ids in groups.items():
+        model.objects.filter(pk__in=ids).update(**dict(zip(fields, values)))
+    pending.clear()
+
+
+def recompute_strength_prs(user, exercise_ids=None, changed_workouts: set | None = None) -> int:
+    """Recompute WorkoutSet PR flags for `user`; returns the number of rows changed.
+
+    Ids of workouts with changed rows are added to `changed_workouts` if given.
+    """
+    qs = WorkoutSet.objects.filter(owner=user)
+    if exercise_ids is not None:
+        qs = qs.filter(exercise_id__in=list(exercise_ids))
+    qs = qs.order_by("exercise_id", "workout__date", "workout_id", "set_number", "id").only(
+        "id", "workout_id", "exercise_id", "reps", "weight", "unit", "set_type", *STRENGTH_FLAGS
+    )
+
+    archived = _archived_bests(user.pk)["strength"]
+    changed = 0
+    pending = []
+    current_exercise = None
+    history = None
+    for s in qs.iterator(chunk_size=UPDATE_CHUNK_SIZE):
+        if s.exercise_id != current_exercise:
+            current_exercise, history = s.exercise_id, _StrengthHistory()
+            for data in archived.get(f"e{s.exercise_id}", ()):
+                history.merge(data)
+
+        w_kg = _working_kg(s)
+        if w_kg is not None:
+            flags = history.flags_for(w_kg, s.reps)
+            history.add(w_kg, s.reps)
+        else:
+            flags = dict.fromkeys(STRENGTH_FLAGS, False)
+
+        if any(getattr(s, k) != v for k, v in flags.items()):
+            for k, v in flags.items():
+                setattr(s, k, v)
+            pending.append(s)
+            changed += 1
+            if changed_workouts is not None:
+                changed_workouts.add(s.workout_id)
+            if len(pending) >= UPDATE_CHUNK_SIZE:
+                _flush(WorkoutSet, pending, STRENGTH_FLAGS)
+    _flush(WorkoutSet, pending, STRENGTH_FLAGS)
+    return changed
+
+
+class _CardioHistory:
+    def __init__(self):
+        self.seen = False
+        self.max_dist = 0.0
+        self.max_pace = 0.0
+        self.max_floors = 0
+        self.max_rate = 0.0
+        self.best_split = None
+
+    def flags_for(self, mode: str, duration: int, dist: float, floors: int, split: float | None) -> dict:
+        flags = dict.fromkeys(CARDIO_FLAGS[1:], False)
+        if self.seen:
+            if mode in {"TREADMILL", "BIKE", "ELLIPTICAL"} and dist > 0 and duration > 0:
+                flags["is_distance_pr"] = dist > self.max_dist
+                flags["is_pace_pr"] = dist / duration > self.max_pace
+            if mode == "STAIRS" and floors > 0 and duration > 0:
+                flags["is_ascent_pr"] = floors > self.max_floors
+                flags["is_intensity_pr"] = floors / (duration / 60.0) > self.max_rate
+            if mode == "ROW" and dist > 0:
+                flags["is_distance_pr"] = dist > self.max_dist
+                if split is not None and split > 0:
+                    flags["is_split_pr"] = self.best_split is None or split < self.best_split
+        flags["is_pr"] = any(flags.values())
+        return flags
+
+    def add(self, duration: int, dist: float, floors: int, split: float | None):
+        self.seen = True
+        self.max_dist = max(self.max_dist, dist)
+        if dist > 0 and duration > 0:
+            self.max_pace = max(self.max_pace, dist / duration)
+        self.max_floors = max(self.max_floors, floors)
+        if floors > 0 and duration > 0:
+            self.max_rate = max(self.max_rate, floors / (duration / 60.0))
+        if split and (self.best_split is None or split < self.best_split):
+            self.best_split = split
+
+    def to_dict(self) -> dict:
+        return {
+            "max_dist": self.max_dist,
+            "max_pace": self.max_pace,
+            "max_floors": self.max_floors,
+            "max_rate": self.max_rate,
+            "best_split": self.best_split,
+        }
+
+    def merge(self, data: dict):
+        """Fold in bests saved with `to_dict`."""
+        self.seen = True
+        for attr in ("max_dist", "max_pace", "max_floors", "max_rate"):
+            setattr(self, attr, max(getattr(self, attr), data.get(attr) or 0))
+        split = data.get("best_split")
+        if split and (self.best_split is None or split < self.best_split):
+            self.best_split = split
+
+
+def _cardio_values(c) -> tuple:
+    """(duration, distance, floors, split) of a cardio set as plain numbers."""
+    return int(c.duration_seconds or 0), _float(c.distance_meters) or 0.0, int(c.floors or 0), _float(c.split_seconds)
+
+
+def recompute_cardio_prs(user, exercise_ids=None, changed_workouts: set | None = None) -> int:
+    """Recompute CardioSet PR flags for `user`; same contract as `recompute_strength_prs`."""
+    qs = CardioSet.objects.filter(owner=user)
+    if exercise_ids is not None:
+        qs = qs.filter(exercise_id__in=list(exercise_ids))
+    qs = qs.order_by("exercise_id", "mode", "workout__date", "workout_id", "set_number", "id").only(
+        "id", "workout_id", "exercise_id", "mode", "duration_seconds", "distance_meters", "floors", "split_seconds", *CARDIO_FLAGS
+    )
+
+    archived = _archived_bests(user.pk)["cardio"]
+    changed = 0
+    pending = []
+    current = None
+    history = None
+    for c in qs.iterator(chunk_size=UPDATE_CHUNK_SIZE):
+        if (c.exercise_id, c.mode) != current:
+            current, history = (c.exercise_id, c.mode), _CardioHistory()
+            for data in archived.get(f"e{c.exercise_id}", ()):
+                if c.mode in data:
+                    history.merge(data[c.mode])
+
+        duration, dist, floors, split = _cardio_values(c)
+        flags = history.flags_for((c.mode or "").upper(), duration, dist, floors, split)
+        history.add(duration, dist, floors, split)
+
+        if any(getattr(c, k) != v for k, v in flags.items()):
+            for k, v in flags.items():
+                setattr(c, k, v)
+            pending.append(c)
+            changed += 1
+            if changed_workouts is not None:
+                changed_workouts.add(c.workout_id)
+            if len(pending) >= UPDATE_CHUNK_SIZE:
+                _flush(CardioSet, pending, CARDIO_FLAGS)
+    _flush(CardioSet, pending, CARDIO_FLAGS)
+    return changed
+
+
+def bests(sets, cardio_sets) -> dict:
+    """Running bests over `sets` and `cardio_sets`, as kept in `ArchivedYear.bests`.
+
+    Keyed by `e<exercise id>` (and mode, for cardio) so single entries can
+    be read with a JSON key lookup.
+    """
+    strength, cardio = {}, {}
+    for s in sets:
+        w_kg = _working_kg(s)
+        if w_kg is not None:
+            strength.setdefault(f"e{s.exercise_id}", _StrengthHistory()).add(w_kg, s.reps)
+    for c in cardio_sets:
+        cardio.setdefault(f"e{c.exercise_id}", {}).setdefault(c.mode, _CardioHistory()).add(*_cardio_values(c))
+    return {
+        "strength": {key: history.to_dict() for key, history in strength.items()},
+        "cardio": {key: {mode: h.to_dict() for mode, h in modes.items()} for key, modes in cardio.items()},
+    }
+
+
+def _archived_bests(owner_id: int) -> dict:
+    """Every archived year's bests for `owner_id`, as lists per exercise key."""
+    merged = {"strength": {}, "cardio": {}}
+    for year_bests in ArchivedYear.objects.filter(owner_id=owner_id).values_list("bests", flat=True):
+        for kind in merged:
+            for key, data in (year_bests.get(kind) or {}).items():
+                merged[kind].setdefault(key, []).append(data)
+    return merged
+
+
+def archived_strength_history(owner_id: int, exercise_id: int) -> _StrengthHistory:
+    """Bests over the owner's archived sets of one exercise; `seen` is False if there are none."""
+    history = _StrengthHistory()
+    lookup = f"bests__strength__e{exercise_id}"
+    for data in ArchivedYear.objects.filter(owner_id=owner_id).values_list(lookup, flat=True):
+        if data:
+            history.merge(data)
+    return history
+
+
+def archived_cardio_history(owner_id: int, exercise_id: int, mode: str) -> _CardioHistory:
+    """Bests over the owner's archived cardio sets of one exercise and mode."""
+    history = _CardioHistory()
+    if not mode:
+        return history
+    lookup = f"bests__cardio__e{exercise_id}__{mode}"
+    for data in ArchivedYear.objects.filter(owner_id=owner_id).values_list(lookup, flat=True):
+        if data:
+            history.merge(data)
+    return history
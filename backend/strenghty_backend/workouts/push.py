@@ -0,0 +1,393 @@
+"""Push change notifications to a user's connected clients.
+
+Clients used to poll to notice changes made on another device. The ASGI
+app now serves `GET /api/events/` as a Server-Sent Events stream, and every
+successful create, update or delete through the workouts viewsets and
+`/api/batch/` is announced on it once the write has committed:
+
+    id: 1760870400123
+    event: change
+    data: {"entity":"sets","action":"created","ids":[12],"version":1760870400123}
+
+Events are hints to refetch, not a replicated log. Versions go up, except
+that with the database broker an event whose transaction committed late
+can arrive after one with a higher version. A client reconnecting with
+`Last-Event-ID` first gets the missed events the broker still holds. A comment line goes out every `PUSH_HEARTBEAT_SECONDS`
+so proxies keep idle streams open and dead connections are noticed.
+
+Within a process, `_Hub` fans events out to one bounded asyncio queue per
+connection, fed thread-safely from the request threads. A connection whose
+queue overflows (a stalled client) is closed, and the client resumes from
+its last id. How events reach each process is up to the broker
+(`PUSH_BROKER`):
+
+* `database` (default): events are `PushEvent` rows. While a process has
+  connections, it runs one poller that reads new rows every
+  `PUSH_POLL_SECONDS` and hands its connected users theirs, so this works
+  across workers and hosts. `manage.py reap` prunes rows after `PUSH_RETENTION_SECONDS`.
+* `memory`: only connections on the publishing process are notified. The
+  last `PUSH_BACKLOG` events are kept for resumes. Only for a single ASGI
+  worker (`GUNICORN_WORKERS=1`); with more, a write on one worker never
+  reaches streams held by another.
+* a dotted path to a `Broker` subclass.
+
+The stream needs an ASGI server, e.g.
+`gunicorn -k uvicorn_worker.UvicornWorker strenghty_backend.asgi:application`
+as entrypoint.sh runs it.
+An open connection holds a queue, not a thread: `asgi.py` serves the
+stream outside Django's request handler, and its database work goes to a
+small shared pool.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+from . import idempotency, sharding
+from .models import PushEvent
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 256
+FETCH_SIZE = 1000
+# How long the database poller keeps looking for a row whose id it passed
+# before the row committed, in seconds.
+GAP_SECONDS = 30
+DB_THREADS = 4
+# Reconnect delay suggested to EventSource clients, in milliseconds.
+RETRY_MS = 3000
+
+# /api/batch/ operation names -> entity and action names used in events.
+BATCH_ENTITIES = {"exercise": "exercises", "workout": "workouts", "set": "sets", "cardio_set": "cardio_sets"}
+BATCH_ACTIONS = {"create": "created", "update": "updated", "delete": "deleted"}
+
+_CLOSE = object()
+
+# Streams do their database work (auth, replays, polling) on this pool
+# rather than on a thread of their own, which would be held for as long as
+# the stream is open. It also bounds the connections they use.
+_db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="push-db")
+
+
+def db_sync_to_async(func):
+    """`sync_to_async` on the push pool, expiring connections as the request cycle would."""
+
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False, executor=_db_executor)
+
+
+class _Subscription:
+    __slots__ = ("user_id", "loop", "queue")
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def put(self, event):
+        """Queue `event`; on overflow, drop the backlog and close the stream. Runs on `loop`."""
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = _CLOSE
+        self.queue.put_nowait(event)
+
+
+class _Hub:
+    """This process's open connections, by user."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: dict[int, set[_Subscription]] = {}
+
+    def subscribe(self, user_id: int) -> _Subscription:
+        subscription = _Subscription(user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: _Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def users(self) -> list[int]:
+        with self._lock:
+            return list(self._subscriptions)
+
+    def connections(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscriptions.values())
+
+    def deliver(self, user_id: int, event: dict):
+        """Hand `event` to each of the user's connections; callable from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The connection's loop has shut down.
+                pass
+
+
+class Broker:
+    """Carries events from the writing process to every process with listeners.
+
+    Subclasses implement `publish` (called after commit from request
+    threads; it assigns the version and must end in `self.hub.deliver` on
+    each process with listeners) and may implement `replay` for resumes.
+    """
+
+    def __init__(self):
+        self.hub = _Hub()
+
+    def publish(self, user_id: int, event: dict):
+        raise NotImplementedError
+
+    def replay(self, user_id: int, after: int) -> list[dict]:
+        """The user's events with a version above `after` that are still held, oldest first."""
+        return []
+
+    def connected(self):
+        """Called on the event loop whenever a connection opens."""
+
+    async def listen(self, user_id: int, after: int | None = None, heartbeat: float = 15):
+        """Yield the user's events as they arrive, or None after `heartbeat` quiet seconds.
+
+        Ends if the connection falls too far behind.
+        """
+        subscription = self.hub.subscribe(user_id)
+        try:
+            self.connected()
+            replayed = set()
+            if after is not None:
+                # Subscribed first, so nothing published meanwhile is lost;
+                # anything replayed that also arrives live is skipped below.
+                for event in await db_sync_to_async(self.replay)(user_id, after):
+                    replayed.add(event["version"])
+                    yield event
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is _CLOSE:
+                    return
+                if event["version"] not in replayed:
+                    yield event
+        finally:
+            self.hub.unsubscribe(subscription)
+
+
+class MemoryBroker(Broker):
+    """Delivers within the publishing process only."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        # Starting from the clock keeps versions increasing across restarts.
+        self._versions = itertools.count(int(time.time() * 1000))
+        self._backlog = deque(maxlen=getattr(settings, "PUSH_BACKLOG", 1000))
+
+    def publish(self, user_id: int, event: dict):
+        with self._lock:
+            event = {**event, "version": next(self._versions)}
+            self._backlog.append((user_id, event))
+        self.hub.deliver(user_id, event)
+
+    def replay(self, user_id: int, after: int) -> list[dict]:
+        with self._lock:
+            return [event for uid, event in self._backlog if uid == user_id and event["version"] > after]
+
+
+class DatabaseBroker(Broker):
+    """Queues events in `PushEvent`; each process polls for its connected users.
+
+    Ids are handed out when a row is inserted but the row only shows up
+    once its transaction commits, so a poll can see id 12 before id 11.
+    Ids skipped over this way are remembered as gaps and looked up again
+    on every poll for `GAP_SECONDS`; after that the insert is taken to
+    have rolled back.
+
+    Always reads the primary: a replica could lag behind the events.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._poller = None
+
+    def publish(self, user_id: int, event: dict):
+        # The poller delivers it, on this process too.
+        PushEvent.objects.using(DEFAULT_DB_ALIAS).create(user_id=user_id, payload=event)
+
+    def replay(self, user_id: int, after: int) -> list[dict]:
+        rows = (
+            PushEvent.objects.using(DEFAULT_DB_ALIAS)
+            .filter(user_id=user_id, pk__gt=after)
+            .order_by("pk")
+            .values_list("pk", "payload")[: getattr(settings, "PUSH_BACKLOG", 1000)]
+        )
+        return [{**payload, "version": pk} for pk, payload in rows]
+
+    def connected(self):
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+
+    def _latest(self) -> int:
+        return PushEvent.objects.using(DEFAULT_DB_ALIAS).order_by("-pk").values_list("pk", flat=True).first() or 0
+
+    def _fetch(self, after: int, gaps: list[int]) -> tuple[int, list]:
+        """(new high-water mark, [(pk, user id, payload)]) for rows after `after` or in `gaps`.
+
+        Reads every user's rows, not just connected ones: telling a gap from
+        another user's event needs all the ids.
+        """
+        events = PushEvent.objects.using(DEFAULT_DB_ALIAS).values_list("pk", "user_id", "payload")
+        rows = list(events.filter(pk__in=gaps)) if gaps else []
+        latest = self._latest()
+        if latest > after:
+            new = list(events.filter(pk__gt=after, pk__lte=latest).order_by("pk")[:FETCH_SIZE])
+            rows += new
+            after = new[-1][0] if len(new) == FETCH_SIZE else latest
+        return after, rows
+
+    @staticmethod
+    def _track_gaps(gaps: dict, last: int, rows: list, now: float):
+        """Update `gaps` ({id: first missed at}) after reading `rows` past `last`."""
+        seen = sorted(pk for pk, _, _ in rows)
+        for pk in seen:
+            gaps.pop(pk, None)
+        previous = last
+        for pk in seen:
+            # A jump wider than a page isn't concurrent inserts (e.g. a
+            # restored sequence); don't chase it.
+            if pk > previous and pk - previous <= FETCH_SIZE:
+                gaps.update(dict.fromkeys(range(previous + 1, pk), now))
+            previous = max(previous, pk)
+        for pk in [pk for pk, missed in gaps.items() if now - missed > GAP_SECONDS]:
+            del gaps[pk]
+
+    async def _poll(self):
+        interval = getattr(settings, "PUSH_POLL_SECONDS", 1.0)
+        last = await db_sync_to_async(self._latest)()
+        gaps = {}
+        while True:
+            await asyncio.sleep(interval)
+            if not self.hub.users():
+                # Restarted by the next connection.
+                return
+            try:
+                mark, rows = await db_sync_to_async(self._fetch)(last, list(gaps))
+            except Exception:
+                logger.exception("Polling push events failed")
+                continue
+            self._track_gaps(gaps, last, rows, time.monotonic())
+            last = mark
+            for pk, user_id, payload in sorted(rows, key=lambda row: row[0]):
+                self.hub.deliver(user_id, {**payload, "version": pk})
+
+
+BROKERS = {"memory": MemoryBroker, "database": DatabaseBroker}
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker() -> Broker:
+    """This process's broker, built from `PUSH_BROKER` on first use."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            name = getattr(settings, "PUSH_BROKER", "database")
+            if name in BROKERS:
+                broker_class = BROKERS[name]
+            elif "." in name:
+                broker_class = import_string(name)
+            else:
+                raise ImproperlyConfigured(f"PUSH_BROKER must be one of {', '.join(BROKERS)} or a dotted path, not {name!r}.")
+            _broker = broker_class()
+        return _broker
+
+
+def _publish(user_id: int, event: dict):
+    try:
+        broker().publish(user_id, event)
+    except Exception:
+        # A lost notification only means a client refetches later; never
+        # let it surface as a failed write.
+        logger.exception("Publishing push event failed")
+
+
+def changed(user_id: int, entity: str, action: str, ids):
+    """Announce a change to the user's clients once the active shard's transaction commits."""
+    event = {"entity": entity, "action": action, "ids": list(ids)}
+    transaction.on_commit(lambda: _publish(user_id, event), using=sharding.current())
+
+
+def batch_changed(user_id: int, operations: list, results: list):
+    """Announce an applied `/api/batch/`, one event per entity and action."""
+    grouped = {}
+    for op, result in zip(operations, results):
+        key = (BATCH_ENTITIES[op["type"]], BATCH_ACTIONS[op["op"]])
+        grouped.setdefault(key, []).append(result["id"])
+    for (entity, action), ids in grouped.items():
+        changed(user_id, entity, action, ids)
+
+
+class PushChangesMixin:
+    """Viewset mixin announcing successful creates, updates and deletes of `push_entity`.
+
+    Responses replayed for a retried `Idempotency-Key` changed nothing and
+    aren't announced again.
+    """
+
+    push_entity = None
+    _PUSH_ACTIONS = {"create": "created", "update": "updated", "partial_update": "updated", "destroy": "deleted"}
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        action = self._PUSH_ACTIONS.get(getattr(self, "action", None))
+        fresh = 200 <= response.status_code < 300 and not response.has_header(idempotency.REPLAYED_HEADER)
+        if action is not None and fresh and request.user.is_authenticated:
+            if action == "created":
+                pk = response.data.get("id") if isinstance(response.data, dict) else None
+            else:
+                pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+            if pk is not None:
+                changed(request.user.pk, self.push_entity, action, [int(pk)])
+        return response
+
+
+def _format(event: dict) -> str:
+    data = json.dumps(event, separators=(",", ":"))
+    return f"id: {event['version']}\nevent: change\ndata: {data}\n\n"
+
+
+async def stream(user_id: int, after: int | None = None):
+    """The `text/event-stream` body for one connection."""
+    heartbeat = getattr(settings, "PUSH_HEARTBEAT_SECONDS", 15)
+    yield f"retry: {RETRY_MS}\n\n"
+    async for event in broker().listen(user_id, after, heartbeat):
+        yield ": keepalive\n\n" if event is None else _format(event)
@@ -0,0 +1,111 @@
+"""Purge rows that have outlived their usefulness.
+
+Each `reap_*` function deletes matching rows in primary-key batches, one
+short transaction per batch, so no single statement holds locks for long
+and a large backlog can't bloat a transaction. Every function returns the
+number of rows removed (or that would be removed when `dry_run` is set).
+
+Run them all from cron or a Render cron job with `python manage.py reap`.
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .models import Job, PasswordResetCode, PushEvent
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _delete_in_batches(queryset, *, batch_size: int, pause: float = 0, dry_run: bool = False) -> int:
+    if dry_run:
+        return queryset.count()
+
+    model = queryset.model
+    total = 0
+    while True:
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            _, deleted = model.objects.filter(pk__in=ids).delete()
+        # Rows of this model only, as in a dry run, not what cascaded from them.
+        total += deleted.get(model._meta.label, 0)
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def reap_password_reset_codes(*, batch_size: int = DEFAULT_BATCH_SIZE, pause: float = 0, dry_run: bool = False) -> int:
+    """Delete reset codes that are used or older than the OTP lifetime."""
+    ttl = getattr(settings, "PASSWORD_RESET_CODE_TTL_MINUTES", 30)
+    cutoff = timezone.now() - timedelta(minutes=ttl)
+    # Two disjoint passes so each one can use the created_at index instead
+    # of an OR scan.
+    expired = PasswordResetCode.objects.filter(created_at__lt=cutoff)
+    used = PasswordResetCode.objects.filter(created_at__gte=cutoff, is_used=True)
+    return _delete_in_batches(expired, batch_size=batch_size, pause=pause, dry_run=dry_run) + _delete_in_batches(
+        used, batch_size=batch_size, pause=pause, dry_run=dry_run
+    )
+
+
+def reap_tokens(
+    *,
+    max_age_days: int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pause: float = 0,
+    dry_run: bool = False,
+) -> int:
+    """Delete auth tokens belonging to deactivated users.
+
+    When `max_age_days` is given, also delete tokens issued before that
+    cutoff and not used since (see `workouts.authentication`). Those
+    clients simply have to sign in again.
+    """
+    stale = Q(user__is_active=False)
+    if max_age_days is not None:
+        cutoff = timezone.now() - timedelta(days=max_age_days)
+        stale |= Q(created__lt=cutoff) & (Q(usage__isnull=True) | Q(usage__last_used__lt=cutoff))
+    return _delete_in_batches(Token.objects.filter(stale), batch_size=batch_size, pause=pause, dry_run=dry_run)
+
+
+def reap_jobs(
+    *,
+    max_age_days: int = 7,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pause: float = 0,
+    dry_run: bool = False,
+) -> int:
+    """Delete finished background jobs last touched more than `max_age_days` ago.
+
+    Failed jobs are kept for the same window so their errors can be
+    inspected in the admin.
+    """
+    cutoff = timezone.now() - timedelta(days=max_age_days)
+    finished = Job.objects.filter(status__in=[Job.STATUS_DONE, Job.STATUS_FAILED], updated_at__lt=cutoff)
+    return _delete_in_batches(finished, batch_size=batch_size, pause=pause, dry_run=dry_run)
+
+
+def reap_push_events(
+    *,
+    max_age_seconds: int | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pause: float = 0,
+    dry_run: bool = False,
+) -> int:
+    """Delete push events older than `max_age_seconds` (default `PUSH_RETENTION_SECONDS`).
+
+    Clients reconnecting after longer than that just refetch.
+    """
+    if max_age_seconds is None:
+        max_age_seconds = getattr(settings, "PUSH_RETENTION_SECONDS", 3600)
+    cutoff = timezone.now() - timedelta(seconds=max_age_seconds)
+    expired = PushEvent.objects.filter(created_at__lt=cutoff)
+    return _delete_in_batches(expired, batch_size=batch_size, pause=pause, dry_run=dry_run)
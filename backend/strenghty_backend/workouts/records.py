@@ -0,0 +1,204 @@
+"""All-time records per exercise for the records board.
+
+`board()` returns, for every exercise the user owns, the set that holds
+each record (heaviest weight, best e1RM, best volume; for cardio, per mode:
+longest distance, fastest pace, most floors, best floors/min, best split)
+and the date of the most recent PR. Strength and cardio are one query
+each: every metric is ranked per exercise with a ROW_NUMBER() window over
+the user's sets (read through the `(owner, exercise, ...)` indexes) and
+only rows ranked first for some metric come back, so the work is one pass
+over the user's sets however many exercises they have. Ties go to the
+earliest set, the one that set the record.
+
+Archived years (`workouts.archive`) only keep bare maxima, so when a user
+has any, their archived sets are ranked the same way in Python and merged.
+
+Units: weight, e1RM and volume in kg, distance in metres, pace in seconds
+per km, intensity in floors per minute, split in seconds per 500 m.
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.db.models import Case, F, FloatField, Max, Q, Value, When, Window
+from django.db.models.functions import Cast, RowNumber
+
+from . import archive
+from .models import ArchivedYear, CardioSet, Exercise, WorkoutSet
+
+STRENGTH_RECORDS = {"weight": "weight_kg", "e1rm": "e1rm_kg", "volume": "volume_kg"}
+
+
+def _float(name: str):
+    return Cast(name, FloatField())
+
+
+def _where(condition: Q, value):
+    return Case(When(condition, then=value), default=None, output_field=FloatField())
+
+
+# record -> (value expression, lower is better)
+CARDIO_RECORDS = {
+    "distance": (_where(Q(distance_meters__gt=0), _float("distance_meters")), False),
+    "pace": (
+        _where(
+            Q(distance_meters__gt=0, duration_seconds__gt=0),
+            _float("duration_seconds") * Value(1000.0) / _float("distance_meters"),
+        ),
+        True,
+    ),
+    "floors": (_where(Q(floors__gt=0), _float("floors")), False),
+    "intensity": (
+        _where(Q(floors__gt=0, duration_seconds__gt=0), _float("floors") * Value(60.0) / _float("duration_seconds")),
+        False,
+    ),
+    "split": (_where(Q(split_seconds__gt=0), _float("split_seconds")), True),
+}
+
+
+def _cardio_value(record: str, c) -> float | None:
+    """Python mirror of `CARDIO_RECORDS`, for archived cardio sets."""
+    duration = float(c.duration_seconds or 0)
+    distance = float(c.distance_meters or 0)
+    floors = float(c.floors or 0)
+    split = float(c.split_seconds or 0)
+    if record == "distance":
+        return distance if distance > 0 else None
+    if record == "pace":
+        return duration * 1000.0 / distance if distance > 0 and duration > 0 else None
+    if record == "floors":
+        return floors if floors > 0 else None
+    if record == "intensity":
+        return floors * 60.0 / duration if floors > 0 and duration > 0 else None
+    return split if split > 0 else None
+
+
+def _ranked(qs, partition: list[str], values: dict, lower: dict, fields: list[str]):
+    """Rows of `qs` that rank first on some value within their partition."""
+    annotations = {"date": F("workout__date")}
+    annotations.update({f"{name}_value": expression for name, expression in values.items()})
+    for name in values:
+        value = F(f"{name}_value")
+        annotations[f"{name}_rank"] = Window(
+            RowNumber(),
+            partition_by=[F(p) for p in partition],
+            order_by=[value.asc(nulls_last=True) if lower[name] else value.desc(nulls_last=True), F("date").asc(), F("id").asc()],
+        )
+    annotations["last_pr"] = Window(Max("workout__date", filter=Q(is_pr=True)), partition_by=[F(p) for p in partition])
+    leaders = reduce(or_, [Q(**{f"{name}_rank": 1}) for name in values])
+    return (
+        qs.annotate(**annotations)
+        .filter(leaders)
+        .order_by()
+        .values("id", "workout_id", "date", "last_pr", *partition, *fields, *(f"{n}_value" for n in values), *(f"{n}_rank" for n in values))
+    )
+
+
+def _entry(row: dict, value: float, fields: list[str]) -> dict:
+    entry = {"value": value, "set": row["id"], "workout": row["workout_id"], "date": row["date"]}
+    entry.update({field: row[field] for field in fields})
+    return entry
+
+
+def _better(entry: dict, current: dict | None, lower: bool) -> bool:
+    if current is None:
+        return True
+    if entry["value"] != current["value"]:
+        return entry["value"] < current["value"] if lower else entry["value"] > current["value"]
+    return (entry["date"], entry["set"]) < (current["date"], current["set"])
+
+
+class _Board:
+    """Records being collected, keyed by exercise id."""
+
+    STRENGTH_FIELDS = ["weight", "unit", "reps"]
+
+    def __init__(self, exercises):
+        self.exercises = {
+            e["id"]: {**e, "last_pr_date": None, **dict.fromkeys(STRENGTH_RECORDS), "cardio": {}} for e in exercises
+        }
+
+    def _note_pr(self, exercise: dict, day):
+        if day is not None and (exercise["last_pr_date"] is None or day > exercise["last_pr_date"]):
+            exercise["last_pr_date"] = day
+
+    def strength(self, row: dict, values: dict, last_pr=None):
+        exercise = self.exercises.get(row["exercise_id"])
+        if exercise is None:
+            return
+        self._note_pr(exercise, last_pr)
+        for name, value in values.items():
+            if value is None:
+                continue
+            entry = _entry(row, value, self.STRENGTH_FIELDS)
+            entry["weight"] = str(entry["weight"])  # as the set endpoints render it
+            if _better(entry, exercise[name], False):
+                exercise[name] = entry
+
+    def cardio(self, row: dict, values: dict, last_pr=None):
+        exercise = self.exercises.get(row["exercise_id"])
+        if exercise is None:
+            return
+        self._note_pr(exercise, last_pr)
+        mode = exercise["cardio"].setdefault(row["mode"], dict.fromkeys(CARDIO_RECORDS))
+        for name, value in values.items():
+            if value is None:
+                continue
+            entry = _entry(row, value, [])
+            if _better(entry, mode[name], CARDIO_RECORDS[name][1]):
+                mode[name] = entry
+
+    def result(self) -> list[dict]:
+        out = []
+        for exercise in self.exercises.values():
+            cardio = [{"mode": mode, **records} for mode, records in sorted(exercise["cardio"].items())]
+            out.append({**exercise, "cardio": cardio})
+        return out
+
+
+def _add_live(board: _Board, user):
+    strength = _ranked(
+        WorkoutSet.objects.filter(owner=user, set_type__in=["S", "F"], reps__gt=0, weight_kg__gt=0),
+        ["exercise_id"],
+        {name: F(column) for name, column in STRENGTH_RECORDS.items()},
+        dict.fromkeys(STRENGTH_RECORDS, False),
+        _Board.STRENGTH_FIELDS,
+    )
+    for row in strength:
+        values = {n: row[f"{n}_value"] for n in STRENGTH_RECORDS if row[f"{n}_rank"] == 1}
+        board.strength(row, values, row["last_pr"])
+
+    cardio = _ranked(
+        CardioSet.objects.filter(owner=user),
+        ["exercise_id", "mode"],
+        {name: expression for name, (expression, _) in CARDIO_RECORDS.items()},
+        {name: lower for name, (_, lower) in CARDIO_RECORDS.items()},
+        [],
+    )
+    for row in cardio:
+        values = {n: row[f"{n}_value"] for n in CARDIO_RECORDS if row[f"{n}_rank"] == 1}
+        board.cardio(row, values, row["last_pr"])
+
+
+def _add_archived(board: _Board, user):
+    dates = {w.pk: w.date for w in archive.archived(user.pk, "workouts")}
+    for s in archive.archived(user.pk, "sets"):
+        if s.set_type not in {"S", "F"} or not s.reps or not s.weight_kg or s.weight_kg <= 0:
+            continue
+        row = {"id": s.pk, "workout_id": s.workout_id, "exercise_id": s.exercise_id, "date": dates.get(s.workout_id),
+               **{field: getattr(s, field) for field in _Board.STRENGTH_FIELDS}}
+        board.strength(row, {n: getattr(s, column) for n, column in STRENGTH_RECORDS.items()},
+                       row["date"] if s.is_pr else None)
+    for c in archive.archived(user.pk, "cardio_sets"):
+        row = {"id": c.pk, "workout_id": c.workout_id, "exercise_id": c.exercise_id, "mode": c.mode,
+               "date": dates.get(c.workout_id)}
+        board.cardio(row, {n: _cardio_value(n, c) for n in CARDIO_RECORDS}, row["date"] if c.is_pr else None)
+
+
+def board(user) -> list[dict]:
+    """The records board: one entry per exercise the user owns, by name."""
+    collected = _Board(Exercise.objects.filter(owner=user).order_by("name", "id").values("id", "name", "muscle_group"))
+    _add_live(collected, user)
+    if ArchivedYear.objects.filter(owner=user).exists():
+        _add_archived(collected, user)
+    return collected.result()
@@ -0,0 +1,179 @@
+"""Send read-only API traffic to database replicas.
+
+`ReplicaRoutingMiddleware` decides per request whether its reads may go to
+a replica, and `ReplicaRouter` applies that decision to queries on the
+workouts app's models. Auth, sessions, tokens and every write always use
+`default`.
+
+A request reads from a replica only if:
+
+* its method is safe (GET/HEAD/OPTIONS);
+* the client hasn't written recently. After any unsafe request the client
+  is pinned to `default` for `REPLICA_STICKY_SECONDS`, so it reads its own
+  writes. The pin is kept in a cookie and in the Django cache, keyed by
+  the request's credentials, because token clients don't keep cookies;
+* at least one replica is reachable and no more than
+  `REPLICA_MAX_LAG_SECONDS` behind. Lag is measured at most every
+  `REPLICA_LAG_CHECK_SECONDS` per process. A replica that fails the check
+  is skipped until the next check passes; with none left, reads use
+  `default`.
+
+Replicas are configured with `DATABASE_REPLICA_URLS` (comma-separated),
+which become the aliases `replica1`, `replica2`, ... For a local test,
+point it at a copy of the SQLite file:
+
+    cp db.sqlite3 /tmp/replica.sqlite3
+    DATABASE_REPLICA_URLS=sqlite:////tmp/replica.sqlite3 python manage.py runserver
+"""
+
+import hashlib
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+ROUTED_APPS = {"workouts"}
+PIN_COOKIE = "db_pin"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Replica alias this request may read from, or None for `default`.
+_read_alias: ContextVar[str | None] = ContextVar("read_alias", default=None)
+
+
+def replica_aliases() -> list[str]:
+    return [alias for alias in settings.DATABASES if alias.startswith("replica")]
+
+
+# Seconds behind the primary; None if it can't tell.
+_LAG_SQL = {
+    "postgresql": (
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+    ),
+}
+
+
+class _LagMonitor:
+    """Per-process cache of which replicas are currently fit to read from."""
+
+    def __init__(self):
+        self._checked: dict[str, tuple[float, bool]] = {}
+        self._lock = threading.Lock()
+
+    def _measure(self, alias: str) -> bool:
+        max_lag = getattr(settings, "REPLICA_MAX_LAG_SECONDS", 10)
+        conn = connections[alias]
+        try:
+            with conn.cursor() as cursor:
+                sql = _LAG_SQL.get(conn.vendor)
+                if sql is None:
+                    # No replication lag to ask about (e.g. SQLite copies);
+                    # just make sure it answers.
+                    cursor.execute("SELECT 1")
+                    return True
+                cursor.execute(sql)
+                lag = cursor.fetchone()[0]
+        except DatabaseError:
+            logger.warning("replica %s unreachable, reading from default", alias, exc_info=True)
+            return False
+        # NULL means it is not replaying (not a standby, or never synced).
+        if lag is None or float(lag) > max_lag:
+            logger.warning("replica %s lagging (%s s), reading from default", alias, lag)
+            return False
+        return True
+
+    def healthy(self, aliases: list[str], now: float | None = None) -> list[str]:
+        now = time.monotonic() if now is None else now
+        interval = getattr(settings, "REPLICA_LAG_CHECK_SECONDS", 5)
+        result = []
+        for alias in aliases:
+            with self._lock:
+                checked_at, ok = self._checked.get(alias, (None, False))
+                stale = checked_at is None or now - checked_at >= interval
+                if stale:
+                    # Claim the check so concurrent requests keep using the
+                    # previous verdict instead of all measuring at once.
+                    self._checked[alias] = (now, ok)
+            if stale:
+                ok = self._measure(alias)
+                with self._lock:
+                    self._checked[alias] = (now, ok)
+            if ok:
+                result.append(alias)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._checked.clear()
+
+
+monitor = _LagMonitor()
+
+
+def _pin_key(request) -> str | None:
+    credential = request.headers.get("Authorization") or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return "db-pin:" + hashlib.sha256(credential.encode("utf-8")).hexdigest()
+
+
+def _is_pinned(request) -> bool:
+    if request.COOKIES.get(PIN_COOKIE):
+        return True
+    key = _pin_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+def _pin(request, response):
+    seconds = getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+    response.set_cookie(PIN_COOKIE, "1", max_age=seconds, httponly=True, samesite="Lax")
+    key = _pin_key(request)
+    if key is not None:
+        cache.set(key, 1, timeout=seconds)
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        aliases = replica_aliases()
+        if not aliases:
+            return self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            # Pin even when the request failed: it may have written before failing.
+            _pin(request, response)
+            return response
+
+        healthy = [] if _is_pinned(request) else monitor.healthy(aliases)
+        token = _read_alias.set(random.choice(healthy) if healthy else None)
+        try:
+            return self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in ROUTED_APPS:
+            return _read_alias.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as `default`.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
@@ -1,6 +1,9 @@
 from rest_framework import serializers
-from django.db import models
-from .models import Exercise, Workout, WorkoutSet, CardioSet
+from . import numbering
+from . import prs
+from . import sharding
+from . import summaries
+from .models import Exercise, Workout, WorkoutSet, CardioSet, to_kg
 from .models import Profile
 from django.contrib.auth import get_user_model
 
@@ -31,8 +34,24 @@ class ExerciseSerializer(serializers.ModelSerializer):
 class WorkoutSerializer(serializers.ModelSerializer):
     class Meta:
         model = Workout
-        fields = ["id","date","name","notes","created_at","updated_at","ended_at"]
-        read_only_fields = ["id","created_at","updated_at"]
+        fields = ["id","date","name","notes","created_at","updated_at","ended_at", *summaries.SUMMARY_FIELDS]
+        read_only_fields = ["id","created_at","updated_at", *summaries.SUMMARY_FIELDS]
+
+    def _finalize(self, workout):
+        # Finishing (or un-finishing) a workout settles its duration; recompute
+        # the whole summary at the same time so it's exact from then on.
+        summaries.refresh(workout.pk)
+        workout.refresh_from_db(fields=summaries.SUMMARY_FIELDS)
+        return workout
+
+    def create(self, validated_data):
+        workout = super().create(validated_data)
+        return self._finalize(workout) if workout.ended_at else workout
+
+    def update(self, instance, validated_data):
+        with sharding.atomic():
+            workout = super().update(instance, validated_data)
+            return self._finalize(workout) if "ended_at" in validated_data else workout
         
 class WorkoutSetSerializer(serializers.ModelSerializer):
     class Meta:
@@ -66,20 +85,6 @@ class WorkoutSetSerializer(serializers.ModelSerializer):
             "is_rep_pr",
         ]
 
-    LBS_PER_KG = 2.20462
-
-    def _to_kg(self, weight, unit: str | None) -> float | None:
-        if weight is None:
-            return None
-        try:
-            w = float(weight)
-        except (TypeError, ValueError):
-            return None
-        u = unit or "lbs"
-        if u == "kg":
-            return w
-        return w / self.LBS_PER_KG
-
     def _compute_pr_flags(
         self,
         *,
@@ -113,7 +118,7 @@ class WorkoutSetSerializer(serializers.ModelSerializer):
         if reps is None or reps <= 0 or weight is None:
             return flags
 
-        current_w_kg = self._to_kg(weight, unit)
+        current_w_kg = to_kg(weight, unit)
         if current_w_kg is None or current_w_kg <= 0:
             return flags
 
@@ -131,58 +136,33 @@ class WorkoutSetSerializer(serializers.ModelSerializer):
         # Historical metrics across all workouts for this user+exercise
         # Consider only prior working sets with positive weight and reps.
         qs = WorkoutSet.objects.filter(
-            workout__owner=workout.owner,
+            owner_id=workout.owner_id,
             exercise=exercise,
             set_type__in=["S", "F"],
-            weight__isnull=False,
-            weight__gt=0,
             reps__gt=0,
         )
         if exclude_id is not None:
             qs = qs.exclude(id=exclude_id)
 
-        # If there is literally no prior working set for this exercise,
-        # treat this set as establishing a baseline, not a PR.
-        if not qs.exists():
-            return flags
+        def best(column: str, **filters):
+            # ORDER BY column DESC LIMIT 1 off the (owner, exercise, metric)
+            # index. A positive kg metric implies a positive weight.
+            return qs.filter(**filters).order_by(f"-{column}").values_list(column, flat=True).first()
 
-        max_weight_kg = None
-        max_e1rm = None
-        max_volume = None
-        reps_at_weight: dict[float, int] = {}
+        def higher(a, b):
+            return b if a is None or (b is not None and b > a) else a
 
-        for s in qs.iterator():
-            w_kg = self._to_kg(s.weight, getattr(s, "unit", None))
-            if w_kg is None or w_kg <= 0:
-                continue
-            if s.reps is None or s.reps <= 0:
-                continue
+        # Archived years only keep their bests; start from those.
+        archived = prs.archived_strength_history(workout.owner_id, exercise.pk)
 
-            # Track absolute max weight
-            if max_weight_kg is None or w_kg > max_weight_kg:
-                max_weight_kg = w_kg
-
-            # Volume
-            vol = w_kg * s.reps
-            if max_volume is None or vol > max_volume:
-                max_volume = vol
+        # If there is literally no prior working set for this exercise,
+        # treat this set as establishing a baseline, not a PR.
+        max_weight_kg = higher(archived.max_weight, best("weight_kg", weight_kg__gt=0))
+        if max_weight_kg is None:
+            return flags
 
-            # Estimated 1RM
-            try:
-                if s.reps < 37:
-                    e1rm = w_kg * 36.0 / (37.0 - s.reps)
-                else:
-                    e1rm = None
-            except ZeroDivisionError:
-                e1rm = None
-            if e1rm is not None and (max_e1rm is None or e1rm > max_e1rm):
-                max_e1rm = e1rm
-
-            # Rep PR tracking per exact weight (rounded to 2 decimals)
-            key = round(w_kg, 2)
-            prev_best = reps_at_weight.get(key)
-            if prev_best is None or s.reps > prev_best:
-                reps_at_weight[key] = s.reps
+        max_e1rm = higher(archived.max_e1rm, best("e1rm_kg", e1rm_kg__gt=0))
+        max_volume = higher(archived.max_volume, best("volume_kg", volume_kg__gt=0))
 
         # Absolute weight PR vs historical max
         if max_weight_kg is None or current_w_kg > max_weight_kg:
@@ -198,7 +178,10 @@ class WorkoutSetSerializer(serializers.ModelSerializer):
 
         # Rep PR at this exact weight (no tolerance beyond 2 decimal rounding)
         key = round(current_w_kg, 2)
-        hist_reps = reps_at_weight.get(key)
+        hist_reps = higher(
+            archived.reps_at_weight.get(key),
+            best("reps", weight_kg__gt=0, weight_kg__gte=key - 0.005, weight_kg__lt=key + 0.005),
+        )
         # At this point we know there is some history for the exercise.
         # If there were no prior sets at this exact weight, treat this as
         # a rep PR for that weight (baseline at this load), but still only
@@ -211,16 +194,6 @@ class WorkoutSetSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         workout = validated_data["workout"]
         exercise = validated_data["exercise"]
-        # Always assign the next available set_number for this workout+exercise
-        # to avoid unique_together collisions when the client has added/removed
-        # sets locally.
-        existing_max = (
-            WorkoutSet.objects.filter(workout=workout, exercise=exercise)
-            .aggregate(models.Max("set_number"))
-            .get("set_number__max")
-            or 0
-        )
-        validated_data["set_number"] = existing_max + 1
         reps = validated_data.get("reps")
         weight = validated_data.get("weight")
         unit = validated_data.get("unit") or "lbs"
@@ -238,7 +211,16 @@ class WorkoutSetSerializer(serializers.ModelSerializer):
             validated_data[k] = v
         validated_data["is_pr"] = any(flags.values())
 
-        return super().create(validated_data)
+        # Always assign the next available set_number for this workout+exercise
+        # to avoid unique_together collisions when the client has added/removed
+        # sets locally. Allocated last so the counter row is locked as briefly
+        # as possible.
+        validated_data["set_number"] = numbering.next_set_number(WorkoutSet, workout.pk, exercise.pk)
+        validated_data["owner_id"] = workout.owner_id
+        with sharding.atomic():
+            obj = super().create(validated_data)
+            summaries.refresh(obj.workout_id)
+        return obj
 
     def update(self, instance, validated_data):
         workout = validated_data.get("workout", instance.workout)
@@ -261,7 +243,16 @@ class WorkoutSetSerializer(serializers.ModelSerializer):
             validated_data[k] = v
         validated_data["is_pr"] = any(flags.values())
 
-        return super().update(instance, validated_data)
+        if (workout.pk, exercise.pk) != (instance.workout_id, instance.exercise_id):
+            numbering.reserve_through(WorkoutSet, workout.pk, exercise.pk, instance.set_number)
+        previous_workout_id = instance.workout_id
+        validated_data["owner_id"] = workout.owner_id
+        with sharding.atomic():
+            obj = super().update(instance, validated_data)
+            # Sorted so two moves in opposite directions can't deadlock.
+            for workout_id in sorted({previous_workout_id, obj.workout_id}):
+                summaries.refresh(workout_id)
+        return obj
 
 
 class CardioSetSerializer(serializers.ModelSerializer):
@@ -298,6 +289,10 @@ class CardioSetSerializer(serializers.ModelSerializer):
             "is_split_pr",
             "created_at",
         ]
+        # set_number is allocated in create(); without this DRF would check
+        # unique_together against the model default (1) and reject every
+        # cardio set after the first for a workout/exercise.
+        validators = []
 
     def _compute_pr_flags(
         self,
@@ -343,15 +338,18 @@ class CardioSetSerializer(serializers.ModelSerializer):
         spm_val = _to_float(spm)
 
         qs = CardioSet.objects.filter(
-            workout__owner=workout.owner,
+            owner_id=workout.owner_id,
             exercise=exercise,
             mode=mode,
-        )
+        ).order_by()
         if exclude_id is not None:
             qs = qs.exclude(id=exclude_id)
 
+        # Archived years only keep their bests; start from those.
+        archived = prs.archived_cardio_history(workout.owner_id, exercise.pk, mode)
+
         # No history: treat this as establishing a baseline, not a PR.
-        if not qs.exists():
+        if not archived.seen and not qs.exists():
             return flags
 
         mode = (mode or "").upper()
@@ -371,8 +369,8 @@ class CardioSetSerializer(serializers.ModelSerializer):
         # 1) Treadmill/Bike/Elliptical: distance + pace PRs
         if mode in {"TREADMILL", "BIKE", "ELLIPTICAL"}:
             if dist > 0 and duration > 0:
-                max_dist = 0.0
-                max_pace = 0.0
+                max_dist = archived.max_dist
+                max_pace = archived.max_pace
                 for h in hist():
                     if h["dist"] > max_dist:
                         max_dist = h["dist"]
@@ -391,8 +389,8 @@ class CardioSetSerializer(serializers.ModelSerializer):
         # 2) Stair Climber: total ascent + intensity (floors per minute)
         if mode == "STAIRS":
             if fl > 0 and duration > 0:
-                max_floors = 0
-                max_rate = 0.0
+                max_floors = archived.max_floors
+                max_rate = archived.max_rate
                 for h in hist():
                     if h["floors"] > max_floors:
                         max_floors = h["floors"]
@@ -411,8 +409,8 @@ class CardioSetSerializer(serializers.ModelSerializer):
         # 3) Rowing: distance + split PR (lower split is better)
         if mode == "ROW":
             if dist > 0:
-                max_dist = 0.0
-                best_split = None
+                max_dist = archived.max_dist
+                best_split = archived.best_split
                 for h in hist():
                     if h["dist"] > max_dist:
                         max_dist = h["dist"]
@@ -433,14 +431,6 @@ class CardioSetSerializer(serializers.ModelSerializer):
         exercise = validated_data["exercise"]
         mode = validated_data.get("mode") or ""
 
-        existing_max = (
-            CardioSet.objects.filter(workout=workout, exercise=exercise)
-            .aggregate(models.Max("set_number"))
-            .get("set_number__max")
-            or 0
-        )
-        validated_data["set_number"] = existing_max + 1
-
         flags = self._compute_pr_flags(
             workout=workout,
             exercise=exercise,
@@ -456,7 +446,16 @@ class CardioSetSerializer(serializers.ModelSerializer):
             validated_data[k] = v
         validated_data["is_pr"] = any(flags.values())
 
-        return super().create(validated_data)
+        # Always assign the next available set_number for this workout+exercise
+        # to avoid unique_together collisions when the client has added/removed
+        # sets locally. Allocated last so the counter row is locked as briefly
+        # as possible.
+        validated_data["set_number"] = numbering.next_set_number(CardioSet, workout.pk, exercise.pk)
+        validated_data["owner_id"] = workout.owner_id
+        with sharding.atomic():
+            obj = super().create(validated_data)
+            summaries.refresh(obj.workout_id)
+        return obj
 
     def update(self, instance, validated_data):
         workout = validated_data.get("workout", instance.workout)
@@ -479,7 +478,16 @@ class CardioSetSerializer(serializers.ModelSerializer):
             validated_data[k] = v
         validated_data["is_pr"] = any(flags.values())
 
-        return super().update(instance, validated_data)
+        if (workout.pk, exercise.pk) != (instance.workout_id, instance.exercise_id):
+            numbering.reserve_through(CardioSet, workout.pk, exercise.pk, instance.set_number)
+        previous_workout_id = instance.workout_id
+        validated_data["owner_id"] = workout.owner_id
+        with sharding.atomic():
+            obj = super().update(instance, validated_data)
+            # Sorted so two moves in opposite directions can't deadlock.
+            for workout_id in sorted({previous_workout_id, obj.workout_id}):
+                summaries.refresh(workout_id)
+        return obj
 
 
 class ProfileSerializer(serializers.ModelSerializer):
@@ -0,0 +1,365 @@
+"""Optional sharding of workouts data by owner.
+
+Every query on workouts data is scoped to one owner, so a user's
+exercises, workouts, sets, cardio sets, set-number counters and archived
+years can live together on one of several databases. `DATABASE_SHARD_URLS`
+adds the aliases `shard1`, `shard2`, ...; together with `default` they form the
+shard list. Everything else (users, tokens, sessions, profiles, jobs and
+the `UserShard` directory) stays on `default`.
+
+Placement is looked up in the `UserShard` directory, cached for
+`SHARD_DIRECTORY_CACHE_SECONDS`. A user without an entry gets one on their
+first authenticated request, placed by a stable hash of the user id.
+`manage.py move_user_shard` moves a user and rewrites the entry to
+rebalance.
+
+Which shard a query goes to is held in a context variable:
+
+* the `Sharded*Authentication` classes activate the user's shard as soon
+  as DRF has authenticated the request, and `ShardMiddleware` clears it
+  again when the request ends;
+* code running outside a request (jobs, commands) wraps its work in
+  `for_user(user_id)` or `for_shard(alias)`;
+* transactions must be opened on that database, so code touching
+  sharded models uses `atomic()` from here instead of
+  `transaction.atomic()`.
+
+Each shard also migrates `auth` and `contenttypes`, and holds an inactive
+stub row per resident user so owner foreign keys resolve there. Primary
+keys on shard N start at N * `ID_SPACING`, so a moved user keeps their ids.
+
+The admin only sees rows on `default`.
+"""
+
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, transaction
+from rest_framework import authentication, status
+from rest_framework.exceptions import APIException
+
+from .authentication import TrackedTokenAuthentication
+
+SHARDED_MODELS = (
+    "workouts.exercise",
+    "workouts.workout",
+    "workouts.workoutset",
+    "workouts.cardioset",
+    "workouts.setnumbercounter",
+    "workouts.archivedyear",
+)
+# Tables every shard needs too, so owner foreign keys have a target.
+SHARED_APPS = {"auth", "contenttypes"}
+ID_SPACING = 10**12
+
+_current: ContextVar[str | None] = ContextVar("shard", default=None)
+
+
+class UserMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Your data is being moved. Try again in a minute."
+    default_code = "user_moving"
+
+
+def shard_aliases() -> list[str]:
+    return ["default"] + [alias for alias in settings.DATABASES if alias.startswith("shard")]
+
+
+def enabled() -> bool:
+    return len(shard_aliases()) > 1
+
+
+def hash_placement(user_id: int) -> str:
+    aliases = shard_aliases()
+    digest = hashlib.sha256(str(user_id).encode("utf-8")).hexdigest()
+    return aliases[int(digest[:16], 16) % len(aliases)]
+
+
+def _cache_key(user_id: int) -> str:
+    return f"user-shard:{user_id}"
+
+
+def forget(user_id: int):
+    """Drop the cached directory entry after changing it."""
+    cache.delete(_cache_key(user_id))
+
+
+def ensure_stub(alias: str, user_id: int):
+    """Create the placeholder user row owner foreign keys on `alias` point at."""
+    if alias == "default":
+        return
+    get_user_model().objects.using(alias).get_or_create(
+        pk=user_id, defaults={"username": f"user-{user_id}", "password": "!", "is_active": False}
+    )
+
+
+def drop_stub(alias: str, user_id: int):
+    if alias == "default":
+        return
+    qs = get_user_model().objects.using(alias).filter(pk=user_id)
+    # No Collector: the related tables it would visit don't exist on shards.
+    qs._raw_delete(alias)
+
+
+def lookup(user_id: int) -> tuple[str, bool]:
+    """(alias, moving) for a user, creating the directory entry if needed."""
+    if not enabled():
+        return "default", False
+    key = _cache_key(user_id)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    # Always the primary: a replica may not have seen a move yet.
+    directory = apps.get_model("workouts", "UserShard").objects.using("default")
+    entry = directory.filter(pk=user_id).first()
+    if entry is None:
+        alias = hash_placement(user_id)
+        ensure_stub(alias, user_id)
+        entry, _ = directory.get_or_create(user_id=user_id, defaults={"alias": alias})
+    result = (entry.alias, entry.moving)
+    cache.set(key, result, timeout=getattr(settings, "SHARD_DIRECTORY_CACHE_SECONDS", 30))
+    return result
+
+
+def current() -> str:
+    """Alias of the active shard, `default` when none is active."""
+    return _current.get() or "default"
+
+
+def activate_user(user_id: int) -> str:
+    """Point this request's workouts queries at the user's shard."""
+    alias, moving = lookup(user_id)
+    if moving:
+        raise UserMoving()
+    _current.set(alias)
+    return alias
+
+
+@contextmanager
+def for_shard(alias: str):
+    token = _current.set(alias)
+    try:
+        yield alias
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def for_user(user_id: int):
+    with for_shard(lookup(user_id)[0]) as alias:
+        yield alias
+
+
+def atomic(**kwargs):
+    """`transaction.atomic()` on the active shard's database."""
+    return transaction.atomic(using=current(), **kwargs)
+
+
+def bind(iterable, alias: str | None = None):
+    """Iterate `iterable` with `alias` (default: the active one) active.
+
+    For streaming responses, whose body is produced after the request's
+    shard has been cleared.
+    """
+    alias = alias or current()
+    iterator = iter(iterable)
+    while True:
+        with for_shard(alias):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def offset_sequences(using: str, **kwargs):
+    """Start shard N's primary keys at N * ID_SPACING (post_migrate handler).
+
+    Only ever moves a sequence forward, so it is safe to run after every
+    migrate and after copying rows in.
+    """
+    aliases = shard_aliases()
+    if using == "default" or using not in aliases:
+        return
+    start = aliases.index(using) * ID_SPACING
+    conn = connections[using]
+    with conn.cursor() as cursor:
+        for label in SHARDED_MODELS:
+            table = apps.get_model(label)._meta.db_table
+            if conn.vendor == "postgresql":
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f"GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {conn.ops.quote_name(table)})))",
+                    [table, start],
+                )
+            elif conn.vendor == "sqlite":
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, start])
+                elif row[0] < start:
+                    cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [start, table])
+
+
+def insert_raw(model, objs, *, using: str, batch_size: int = 2000) -> int:
+    """Insert `objs` exactly as they are, primary keys and timestamps included.
+
+    `bulk_create` would restamp `auto_now`/`auto_now_add` fields; this is
+    the raw insert `loaddata` uses. Returns the number of rows inserted.
+    """
+    fields = model._meta.concrete_fields
+    for start in range(0, len(objs), batch_size):
+        model._base_manager._insert(objs[start:start + batch_size], fields=fields, raw=True, using=using)
+    return len(objs)
+
+
+# Copy order for moves: parents before the rows pointing at them.
+_MOVE_ORDER = (
+    ("workouts.exercise", "owner_id"),
+    ("workouts.workout", "owner_id"),
+    ("workouts.workoutset", "owner_id"),
+    ("workouts.cardioset", "owner_id"),
+    ("workouts.setnumbercounter", "workout__owner_id"),
+    ("workouts.archivedyear", "owner_id"),
+)
+
+
+def move_user(user_id: int, target: str, *, wait: bool = True, batch_size: int = 2000, keep_source: bool = False) -> dict:
+    """Move a user's rows to `target` and repoint the directory.
+
+    The user is marked as moving first, so their requests get a 503 while
+    the copy runs; with `wait`, the copy only starts once every cached
+    directory entry has expired. Rows keep their primary keys, are copied
+    in one transaction on the target and are counted before the directory
+    is switched. The source rows are then deleted in batches.
+    Returns `{model label: rows copied}`.
+    """
+    # deletion imports this module for `atomic()`.
+    from . import deletion
+
+    if target not in shard_aliases():
+        raise ValueError(f"Unknown shard {target!r}; expected one of {', '.join(shard_aliases())}.")
+    UserShard = apps.get_model("workouts", "UserShard")
+    source = lookup(user_id)[0]
+    if source == target:
+        return {}
+
+    UserShard.objects.filter(pk=user_id).update(moving=True)
+    forget(user_id)
+    if wait:
+        time.sleep(getattr(settings, "SHARD_DIRECTORY_CACHE_SECONDS", 30) + 1)
+
+    copied = {}
+    try:
+        ensure_stub(target, user_id)
+        with transaction.atomic(using=target):
+            for label, owner_lookup in _MOVE_ORDER:
+                model = apps.get_model(label)
+                rows = model.objects.using(source).filter(**{owner_lookup: user_id}).order_by("pk")
+                batch, copied[label] = [], 0
+                for obj in rows.iterator(chunk_size=batch_size):
+                    batch.append(obj)
+                    if len(batch) >= batch_size:
+                        copied[label] += insert_raw(model, batch, using=target)
+                        batch = []
+                copied[label] += insert_raw(model, batch, using=target)
+                on_target = model.objects.using(target).filter(**{owner_lookup: user_id}).count()
+                if on_target != copied[label]:
+                    raise RuntimeError(f"{label}: copied {copied[label]} rows but found {on_target} on {target}")
+        offset_sequences(using=target)
+        UserShard.objects.filter(pk=user_id).update(alias=target, moving=False)
+    except BaseException:
+        UserShard.objects.filter(pk=user_id).update(moving=False)
+        raise
+    finally:
+        forget(user_id)
+
+    if not keep_source:
+        with for_shard(source):
+            deletion.delete_workouts(apps.get_model("workouts.workout").objects.filter(owner_id=user_id))
+            deletion.delete_exercises(apps.get_model("workouts.exercise").objects.filter(owner_id=user_id))
+            deletion.delete_archives(user_id)
+        drop_stub(source, user_id)
+    return copied
+
+
+class ShardMiddleware:
+    """Clear the active shard when a request finishes."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
+
+
+class _ActivateOnAuthenticate:
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            activate_user(result[0].pk)
+        return result
+
+
+class ShardedTokenAuthentication(_ActivateOnAuthenticate, TrackedTokenAuthentication):
+    pass
+
+
+class ShardedSessionAuthentication(_ActivateOnAuthenticate, authentication.SessionAuthentication):
+    pass
+
+
+def _owner_id(instance):
+    owner_id = getattr(instance, "owner_id", None)
+    if owner_id is None:
+        # Only an already-loaded workout: fetching it would route back here.
+        workout = instance._state.fields_cache.get("workout")
+        owner_id = getattr(workout, "owner_id", None)
+    return owner_id
+
+
+class ShardRouter:
+    def db_for_read(self, model, **hints):
+        label = model._meta.label_lower
+        if label not in SHARDED_MODELS:
+            # Users are read from `default`, never from a shard's stub row.
+            return "default" if model._meta.app_label in SHARED_APPS and enabled() else None
+        alias = _current.get()
+        if alias is not None:
+            return alias
+        instance = hints.get("instance")
+        if instance is not None:
+            if instance._state.db:
+                return instance._state.db
+            owner_id = _owner_id(instance)
+            if owner_id is not None:
+                return lookup(owner_id)[0]
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        labels = {obj1._meta.label_lower, obj2._meta.label_lower}
+        if labels <= set(SHARDED_MODELS):
+            return obj1._state.db == obj2._state.db
+        if labels & set(SHARDED_MODELS) and {obj1._meta.app_label, obj2._meta.app_label} & SHARED_APPS:
+            # A shard row pointing at its owner, who lives on `default`.
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not db.startswith("shard"):
+            return None
+        if app_label in SHARED_APPS:
+            return True
+        return model_name is not None and f"{app_label}.{model_name}" in SHARDED_MODELS
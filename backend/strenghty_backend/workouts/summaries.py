@@ -0,0 +1,126 @@
+"""Maintain the denormalized summary columns on `Workout`.
+
+`refresh()` recomputes a workout's totals from its sets with a few grouped
+aggregates and writes them back. It is called inside the same transaction
+as every set/cardio-set create, update and delete, and when a workout is
+finished, so the list endpoint can serve totals straight off the workout
+row. Recomputing (rather than applying deltas) keeps the distinct exercise
+count exact and makes the backfill the same code path.
+
+Concurrent writers to one workout are serialized by locking its row
+(`FOR NO KEY UPDATE`, which doesn't conflict with the key-share locks set
+inserts take) before aggregating, so the last writer to commit always
+sees every committed set.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+
+from . import sharding
+from .models import LBS_PER_KG, CardioSet, Workout, WorkoutSet
+
+BATCH_SIZE = 500
+_CENT = Decimal("0.01")
+
+SUMMARY_FIELDS = (
+    "set_count",
+    "exercise_count",
+    "total_volume_kg",
+    "pr_count",
+    "cardio_duration_seconds",
+    "cardio_distance_meters",
+    "duration_seconds",
+)
+
+_VOLUME_KG = Case(
+    When(unit="kg", then=F("weight") * F("reps")),
+    # str() keeps the decimal exact; Decimal(2.20462) would carry float noise.
+    default=F("weight") * F("reps") / Value(Decimal(str(LBS_PER_KG))),
+    output_field=DecimalField(max_digits=14, decimal_places=4),
+)
+
+
+def duration_seconds(workout) -> int | None:
+    if workout.ended_at is None or workout.created_at is None:
+        return None
+    return max(0, int((workout.ended_at - workout.created_at).total_seconds()))
+
+
+def _totals(workout_ids: list) -> dict:
+    """Return {workout_id: {field: value}} for every id, zeros included."""
+    totals = {
+        pk: {"set_count": 0, "exercise_count": 0, "total_volume_kg": Decimal(0), "pr_count": 0,
+             "cardio_duration_seconds": 0, "cardio_distance_meters": Decimal(0)}
+        for pk in workout_ids
+    }
+    strength = (
+        WorkoutSet.objects.filter(workout_id__in=workout_ids)
+        .order_by()
+        .values("workout_id")
+        .annotate(n=Count("id"), prs=Count("id", filter=Q(is_pr=True)), volume=Sum(_VOLUME_KG))
+    )
+    for row in strength:
+        t = totals[row["workout_id"]]
+        t["set_count"] += row["n"]
+        t["pr_count"] += row["prs"]
+        t["total_volume_kg"] = Decimal(row["volume"] or 0).quantize(_CENT)
+    cardio = (
+        CardioSet.objects.filter(workout_id__in=workout_ids)
+        .order_by()
+        .values("workout_id")
+        .annotate(
+            n=Count("id"),
+            prs=Count("id", filter=Q(is_pr=True)),
+            duration=Sum("duration_seconds"),
+            distance=Sum("distance_meters"),
+        )
+    )
+    for row in cardio:
+        t = totals[row["workout_id"]]
+        t["set_count"] += row["n"]
+        t["pr_count"] += row["prs"]
+        t["cardio_duration_seconds"] = row["duration"] or 0
+        t["cardio_distance_meters"] = Decimal(row["distance"] or 0).quantize(_CENT)
+    pairs = (
+        WorkoutSet.objects.filter(workout_id__in=workout_ids).order_by().values_list("workout_id", "exercise_id")
+    ).union(CardioSet.objects.filter(workout_id__in=workout_ids).order_by().values_list("workout_id", "exercise_id"))
+    for workout_id, _ in pairs:
+        totals[workout_id]["exercise_count"] += 1
+    return totals
+
+
+def refresh(workout_id: int):
+    """Recompute one workout's summary; call inside the writing transaction."""
+    with sharding.atomic():
+        workout = (
+            Workout.objects.select_for_update(no_key=True)
+            .only("id", "created_at", "ended_at")
+            .filter(pk=workout_id)
+            .first()
+        )
+        if workout is None:
+            return
+        values = _totals([workout_id])[workout_id]
+        values["duration_seconds"] = duration_seconds(workout)
+        Workout.objects.filter(pk=workout_id).update(**values)
+
+
+def refresh_many(workout_ids, *, batch_size: int = BATCH_SIZE) -> int:
+    """Recompute summaries for many workouts in batches; returns how many were written."""
+    ids = sorted(set(workout_ids))
+    done = 0
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        with sharding.atomic():
+            workouts = list(
+                Workout.objects.select_for_update(no_key=True).only("id", "created_at", "ended_at").filter(pk__in=chunk)
+            )
+            totals = _totals([w.pk for w in workouts])
+            for w in workouts:
+                for field, value in totals[w.pk].items():
+                    setattr(w, field, value)
+                w.duration_seconds = duration_seconds(w)
+            Workout.objects.bulk_update(workouts, SUMMARY_FIELDS)
+        done += len(workouts)
+    return done
@@ -0,0 +1,44 @@
+"""Background job handlers.
+
+Each function is registered with `workouts.jobs.task` and runs inside the
+`run_worker` command (or inline after commit when `JOBS_EAGER` is on).
+Handlers must be safe to retry: a job may run again if a previous attempt
+raised or its worker died.
+"""
+
+from django.conf import settings
+from django.core.mail import send_mail
+
+from . import deletion
+from .jobs import task
+from .models import PasswordResetCode
+
+
+@task("send_password_reset_email")
+def send_password_reset_email(code_id: int):
+    code_obj = PasswordResetCode.objects.select_related("user").filter(pk=code_id).first()
+    # The code may already have been used or superseded by a newer request.
+    if code_obj is None or code_obj.is_used or not code_obj.user.email:
+        return
+
+    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", None) or getattr(settings, "EMAIL_HOST_USER", None)
+    if not from_email:
+        return
+
+    subject = "Your Strengthy password reset code"
+    message = (
+        "Hi,\n\n"
+        "You requested to reset your Strengthy password.\n\n"
+        f"Your one-time code is: {code_obj.code}\n\n"
+        "This code will expire in about 30 minutes. If you didn't request this, you can ignore this email.\n\n"
+        "- The Strengthy Team"
+    )
+    # Let SMTP errors propagate so the queue retries with backoff.
+    send_mail(subject, message, from_email, [code_obj.user.email], fail_silently=False)
+
+
+@task("delete_user")
+def delete_user(user_id: int):
+    """Permanently delete a user and everything that cascades from it."""
+    # Batched and idempotent: a retry just continues with whatever is left.
+    deletion.delete_user_data(user_id)
@@ -1,3 +1,1197 @@
-from django.test import TestCase
+"""Tests for the workouts app.
 
-# Create your tests here.
+Run from backend/strenghty_backend with `python manage.py test workouts`.
+`ShardingTests` need shard databases; on SQLite the test run keeps them
+in memory, so any URLs will do:
+
+    DATABASE_SHARD_URLS=sqlite:///shard1.sqlite3,sqlite:///shard2.sqlite3 python manage.py test workouts
+"""
+
+import asyncio
+import csv
+import gzip
+import importlib
+import json
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.migrations.loader import MigrationLoader
+from django.test.utils import CaptureQueriesContext
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresWrapper
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from . import (
+    authentication, deletion, export, idempotency, importer, jobs, numbering, push, reaper, routing, sharding,
+    summaries, throttling, trends,
+)
+from .models import ArchivedYear, CardioSet, Exercise, Job, PushEvent, TokenUsage, UserShard, Workout, WorkoutSet
+
+User = get_user_model()
+
+
+def client_for(user) -> APIClient:
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token " + Token.objects.get_or_create(user=user)[0].key)
+    return client
+
+
+def read_from_default(testcase):
+    """Turn replica reads off for `testcase`.
+
+    A replica alias mirrors `default` over its own connection in tests,
+    which can't see (or, on SQLite, even read past) a TestCase's open
+    transaction. ReplicaRoutingTests covers the replicas.
+    """
+    patcher = mock.patch.object(routing, "replica_aliases", return_value=[])
+    patcher.start()
+    testcase.addCleanup(patcher.stop)
+
+
+class UserDataTestCase(TestCase):
+    """For tests that touch users' workouts data, wherever sharding puts it."""
+
+    # Every shard, but not the replica mirrors (see read_from_default()).
+    databases = {alias for alias in settings.DATABASES if alias not in routing.replica_aliases()}
+
+    def setUp(self):
+        # Earlier tests' users were rolled back, but their cached shard
+        # assignments weren't, and the ids get reused. The same goes for
+        # idempotency keys remembered in-process.
+        cache.clear()
+        idempotency.store.clear()
+        read_from_default(self)
+
+
+class AdminQueryCountTests(TestCase):
+    """The workout admins' query counts don't grow with the rows on a page."""
+
+    CHANGELISTS = ("exercise", "workout", "workoutset", "cardioset")
+
+    def setUp(self):
+        read_from_default(self)
+        self.admin = User.objects.create_superuser(username="admin", email="admin@example.com", password="x")
+        self.client.force_login(self.admin)
+        self.users = []
+
+    def add_history(self, users: int):
+        for _ in range(users):
+            user = User.objects.create(username=f"lifter-{len(self.users)}")
+            self.users.append(user)
+            exercise = Exercise.objects.create(owner=user, name=f"Bench {user.pk}", muscle_group="CHEST")
+            workout = Workout.objects.create(owner=user, name="Push", date="2024-05-01")
+            for number in (1, 2):
+                WorkoutSet.objects.create(
+                    owner=user, workout=workout, exercise=exercise, set_number=number, reps=5, weight=100, unit="kg"
+                )
+                CardioSet.objects.create(
+                    owner=user, workout=workout, exercise=exercise, set_number=number, mode="ROW", duration_seconds=600
+                )
+
+    def queries(self, url: str) -> int:
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        counts = [q["sql"] for q in captured if "COUNT(" in q["sql"]]
+        self.assertTrue(all("LIMIT" in sql for sql in counts), f"unbounded COUNT on {url}: {counts}")
+        return len(captured)
+
+    def test_changelists_run_a_fixed_number_of_queries(self):
+        self.add_history(2)
+        small = {name: self.queries(f"/admin/workouts/{name}/") for name in self.CHANGELISTS}
+        self.add_history(20)
+        for name in self.CHANGELISTS:
+            with self.subTest(name):
+                self.assertEqual(self.queries(f"/admin/workouts/{name}/"), small[name])
+                self.assertLessEqual(small[name], 6)
+
+    def test_autocomplete_filter_loads_only_the_selected_object(self):
+        self.add_history(2)
+        exercise = Exercise.objects.filter(owner=self.users[0]).get()
+        url = f"/admin/workouts/workoutset/?exercise__id__exact={exercise.pk}&owner__id__exact={self.users[0].pk}"
+        small = self.queries(url)
+        self.add_history(20)
+        self.assertEqual(self.queries(url), small)
+        page = self.client.get(url).content.decode()
+        self.assertIn(f"Bench {exercise.owner_id}", page)
+        self.assertNotIn(f"Bench {self.users[-1].pk}", page)
+
+
+@override_settings(AUTH_THROTTLE_IP_RATE="3/min")
+class AuthThrottleTests(TestCase):
+    def setUp(self):
+        throttling.local_buckets.clear()
+        cache.clear()
+
+    def login(self, attempt: int, forwarded_for: str):
+        return APIClient().post(
+            "/api/auth/login/",
+            {"username": f"nobody-{attempt}", "password": "wrong"},
+            format="json",
+            HTTP_X_FORWARDED_FOR=forwarded_for,
+        )
+
+    def test_rotating_x_forwarded_for_shares_the_proxys_bucket(self):
+        # The proxy appends the real client address; the rest is spoofed.
+        statuses = [self.login(i, f"203.0.113.{i}, 198.51.100.7").status_code for i in range(5)]
+        self.assertNotIn(429, statuses[:3])
+        self.assertEqual(statuses[3:], [429, 429])
+
+    def test_distinct_clients_get_distinct_buckets(self):
+        statuses = [self.login(i, f"203.0.113.1, 198.51.100.{i}").status_code for i in range(5)]
+        self.assertNotIn(429, statuses)
+
+
+class DatabaseBrokerTests(TestCase):
+    def setUp(self):
+        self.broker = push.DatabaseBroker()
+        self.user = User.objects.create(username="listener")
+
+    def event(self, pk: int):
+        return PushEvent.objects.create(pk=pk, user=self.user, payload={"entity": "sets", "ids": [pk]})
+
+    def test_late_commits_below_the_high_water_mark_are_still_read(self):
+        for pk in (1, 3, 4):
+            self.event(pk)
+        gaps = {}
+        last, rows = self.broker._fetch(0, [])
+        self.broker._track_gaps(gaps, 0, rows, now=0)
+        self.assertEqual((last, [row[0] for row in rows], list(gaps)), (4, [1, 3, 4], [2]))
+
+        # Event 2 was inserted first but its transaction commits now.
+        self.event(2)
+        self.event(5)
+        mark, rows = self.broker._fetch(last, list(gaps))
+        self.broker._track_gaps(gaps, last, rows, now=1)
+        self.assertEqual((mark, sorted(row[0] for row in rows), gaps), (5, [2, 5], {}))
+
+    def test_gaps_are_dropped_once_the_insert_must_have_rolled_back(self):
+        for pk in (1, 3):
+            self.event(pk)
+        gaps = {}
+        last, rows = self.broker._fetch(0, [])
+        self.broker._track_gaps(gaps, 0, rows, now=0)
+        self.assertEqual(list(gaps), [2])
+        mark, rows = self.broker._fetch(last, list(gaps))
+        self.broker._track_gaps(gaps, last, rows, now=push.GAP_SECONDS + 1)
+        self.assertEqual((mark, rows, gaps), (3, [], {}))
+
+
+class PushTests(UserDataTestCase):
+    def test_idempotent_replays_are_not_announced_again(self):
+        user = User.objects.create_user(username="pusher", password="x")
+        client = client_for(user)
+        workout = client.post("/api/workouts/", {"name": "Push", "date": "2024-05-01"}, format="json").json()
+        exercise = client.post("/api/exercises/", {"name": "Bench", "muscle_group": "CHEST"}, format="json").json()
+        body = {"workout": workout["id"], "exercise": exercise["id"], "reps": 5, "weight": "100", "unit": "kg"}
+        PushEvent.objects.all().delete()
+
+        statuses = []
+        for _ in range(3):
+            with self.captureOnCommitCallbacks(using=sharding.lookup(user.pk)[0], execute=True):
+                response = client.post("/api/sets/", body, format="json", HTTP_IDEMPOTENCY_KEY="set-1")
+            statuses.append((response.status_code, response.has_header("Idempotent-Replayed")))
+
+        self.assertEqual(statuses, [(201, False), (201, True), (201, True)])
+        self.assertEqual(
+            list(PushEvent.objects.values_list("payload", flat=True)),
+            [{"entity": "sets", "action": "created", "ids": [response.json()["id"]]}],
+        )
+
+
+class BrokerAcrossProcessesTests(TransactionTestCase):
+    @override_settings(PUSH_POLL_SECONDS=0.05)
+    def test_database_broker_delivers_to_listeners_of_another_instance(self):
+        # One broker per worker process: the writer's and the stream's.
+        writer, reader = push.DatabaseBroker(), push.DatabaseBroker()
+        user = User.objects.create_user(username="two-workers", password="x")
+
+        async def deliver():
+            events = reader.listen(user.pk, heartbeat=5)
+            received = asyncio.ensure_future(anext(events))
+            # Let the reader's poller take its starting high-water mark.
+            await asyncio.sleep(0.3)
+            await sync_to_async(writer.publish)(user.pk, {"entity": "sets", "action": "created", "ids": [7]})
+            try:
+                return await asyncio.wait_for(received, 5)
+            finally:
+                await events.aclose()
+                reader._poller.cancel()
+
+        event = async_to_sync(deliver)()
+        self.assertEqual({k: event[k] for k in ("entity", "action", "ids")}, {"entity": "sets", "action": "created", "ids": [7]})
+        self.assertEqual(event["version"], PushEvent.objects.get().pk)
+
+
+class _FakeRequest:
+    method = "POST"
+    path = "/api/sets/"
+    data = {"reps": 5}
+
+    def __init__(self, user, key):
+        self.user = user
+        self.headers = {idempotency.HEADER: key}
+
+
+class IdempotencyTests(UserDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="retrier", password="x")
+        self.client = client_for(self.user)
+        self.workout = self.client.post("/api/workouts/", {"name": "Legs", "date": "2024-05-01"}, format="json").json()
+        self.exercise = self.client.post("/api/exercises/", {"name": "Squat", "muscle_group": "LEGS"}, format="json").json()
+
+    def post_set(self, key, weight="100"):
+        body = {"workout": self.workout["id"], "exercise": self.exercise["id"], "reps": 5, "weight": weight, "unit": "kg"}
+        return self.client.post("/api/sets/", body, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def sets(self):
+        with sharding.for_user(self.user.pk):
+            return WorkoutSet.objects.filter(workout_id=self.workout["id"]).count()
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post_set("a")
+        retry = self.post_set("a")
+        # Another worker has only the shared cache to go by.
+        idempotency.store.clear()
+        elsewhere = self.post_set("a")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertFalse(first.has_header(idempotency.REPLAYED_HEADER))
+        for response in (retry, elsewhere):
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response[idempotency.REPLAYED_HEADER], "true")
+            self.assertEqual(response.json(), first.json())
+        self.assertEqual(self.sets(), 1)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.post_set("a")
+        self.assertEqual(self.post_set("a", weight="110").status_code, 422)
+        idempotency.store.clear()
+        self.assertEqual(self.post_set("a", weight="110").status_code, 422)
+        self.assertEqual(self.sets(), 1)
+
+    def test_retry_in_flight_on_another_worker_gets_409(self):
+        responses = []
+
+        def handler():
+            # A retry reaching a worker that hasn't seen the key yet, while
+            # this request still holds the lock.
+            idempotency.store.clear()
+            responses.append(idempotency.run(request, lambda: self.fail("ran twice")))
+            return Response({"id": 1}, status=201)
+
+        request = _FakeRequest(self.user, "k")
+        self.assertEqual(idempotency.run(request, handler).status_code, 201)
+        self.assertEqual(responses[0].status_code, 409)
+        self.assertEqual(responses[0]["Retry-After"], "1")
+
+    def test_concurrent_duplicates_in_one_process_run_once(self):
+        started, release = threading.Event(), threading.Event()
+        calls, responses = [], []
+
+        def handler():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return Response({"id": 1}, status=201)
+
+        request = _FakeRequest(self.user, "k")
+        original = threading.Thread(target=lambda: responses.append(idempotency.run(request, handler)))
+        original.start()
+        started.wait(5)
+        duplicate = threading.Thread(target=lambda: responses.append(idempotency.run(request, handler)))
+        duplicate.start()
+        release.set()
+        original.join(5)
+        duplicate.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r.status_code for r in responses], [201, 201])
+        self.assertEqual(sum(r.has_header(idempotency.REPLAYED_HEADER) for r in responses), 1)
+
+    def test_lock_taken_over_after_expiry_is_not_released(self):
+        request = _FakeRequest(self.user, "k")
+        lock_key = f"idempotency:{idempotency._scope(request, 'k')}:lock"
+
+        def handler():
+            # The lock expired under this handler and another request took it.
+            cache.set(lock_key, "someone-else")
+            return Response({"id": 1}, status=201)
+
+        idempotency.run(request, handler)
+        self.assertEqual(cache.get(lock_key), "someone-else")
+
+
+@override_settings(JOBS_EAGER=False, JOBS_BACKOFF_BASE_SECONDS=10, JOBS_BACKOFF_MAX_SECONDS=3600)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        jobs.task("test_flaky")(self.flaky)
+        self.addCleanup(jobs._registry.pop, "test_flaky")
+
+    def flaky(self, **payload):
+        self.calls.append(payload)
+        raise RuntimeError("smtp down")
+
+    def test_failures_back_off_then_dead_letter(self):
+        job = jobs.enqueue("test_flaky", {"to": "a@example.com"}, max_attempts=3)
+        for attempt, delay in ((1, 10), (2, 20)):
+            started = timezone.now()
+            (claimed,) = jobs.claim_jobs("worker-1")
+            self.assertFalse(jobs.run_job(claimed))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.locked_by), (Job.STATUS_QUEUED, attempt, ""))
+            self.assertIn("smtp down", job.last_error)
+            # Exponential backoff plus up to 10% jitter.
+            self.assertGreaterEqual(job.run_at, started + timedelta(seconds=delay))
+            self.assertLessEqual(job.run_at, timezone.now() + timedelta(seconds=delay * 1.1))
+            self.assertEqual(jobs.claim_jobs("worker-1"), [])
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+        (claimed,) = jobs.claim_jobs("worker-1")
+        self.assertFalse(jobs.run_job(claimed))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 3))
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(jobs.claim_jobs("worker-1"), [])
+
+    def test_a_claimed_job_is_not_claimed_again(self):
+        job = jobs.enqueue("test_flaky")
+        self.assertEqual([j.pk for j in jobs.claim_jobs("worker-1")], [job.pk])
+        self.assertEqual(jobs.claim_jobs("worker-2"), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts), (Job.STATUS_RUNNING, "worker-1", 1))
+
+        # Until its worker is presumed dead.
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(timeout_seconds=600), 1)
+        self.assertEqual([(j.pk, j.locked_by, j.attempts) for j in jobs.claim_jobs("worker-2")], [(job.pk, "worker-2", 2)])
+
+
+class AccountDeletionTests(UserDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="lifter@example.com", email="lifter@example.com", password="x")
+
+    def test_delete_frees_username_and_email_and_queues_the_purge(self):
+        response = client_for(self.user).delete("/api/auth/account/")
+        self.assertEqual(response.status_code, 204)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertNotEqual(self.user.username, "lifter@example.com")
+        self.assertEqual(self.user.email, "")
+        self.assertFalse(self.user.has_usable_password())
+        self.assertTrue(Job.objects.filter(name="delete_user", payload={"user_id": self.user.pk}).exists())
+
+        response = APIClient().post(
+            "/api/auth/register/", {"username": "lifter@example.com", "password": "secret-pass"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_email_lookups_skip_deactivated_accounts(self):
+        self.user.is_active = False
+        self.user.save(update_fields=["is_active"])
+        User.objects.create_user(username="again", email="lifter@example.com", password="x")
+        response = APIClient().post(
+            "/api/auth/password-reset/request/", {"email": "lifter@example.com"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+
+class TokenReaperTests(UserDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="regular", password="x")
+        self.client = client_for(self.user)
+        self.token = Token.objects.get(user=self.user)
+        # Issued long ago; the user never logs in again, the app keeps the token.
+        Token.objects.filter(pk=self.token.pk).update(created=timezone.now() - timedelta(days=400))
+
+    def test_token_requests_record_use_at_most_once_per_interval(self):
+        self.assertEqual(self.client.get("/api/workouts/").status_code, 200)
+        first = TokenUsage.objects.get(pk=self.token.pk).last_used
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get("/api/workouts/")
+        # The usage row comes along with the token lookup and isn't rewritten.
+        self.assertEqual([q["sql"] for q in captured if "workouts_tokenusage" in q["sql"]][1:], [])
+        self.assertEqual(TokenUsage.objects.get(pk=self.token.pk).last_used, first)
+
+        TokenUsage.objects.filter(pk=self.token.pk).update(last_used=first - authentication.TOUCH_INTERVAL)
+        self.client.get("/api/workouts/")
+        self.assertGreaterEqual(TokenUsage.objects.get(pk=self.token.pk).last_used, first)
+
+    def test_idle_tokens_are_reaped_and_used_ones_kept(self):
+        self.client.get("/api/workouts/")
+        idle = Token.objects.create(user=User.objects.create_user(username="idle", password="x"))
+        Token.objects.filter(pk=idle.pk).update(created=timezone.now() - timedelta(days=400))
+
+        self.assertEqual(reaper.reap_tokens(max_age_days=180), 1)
+        self.assertEqual(list(Token.objects.values_list("pk", flat=True)), [self.token.pk])
+
+        TokenUsage.objects.filter(pk=self.token.pk).update(last_used=timezone.now() - timedelta(days=200))
+        self.assertEqual(reaper.reap_tokens(max_age_days=180), 1)
+        self.assertFalse(Token.objects.exists())
+
+
+class BatchValidationTests(UserDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="offline", password="x")
+        self.client = client_for(self.user)
+
+    def test_malformed_ids_and_references_are_rejected_per_operation(self):
+        create_workout = {
+            "op": "create", "type": "workout", "temp_id": "w1", "data": {"name": "Push", "date": "2024-05-01"}
+        }
+        not_an_id = 'Expected an id or "$temp_id".'
+        cases = [
+            ({"op": "update", "type": "workout", "id": [1], "data": {"name": "x"}}, {"id": not_an_id}),
+            ({"op": "delete", "type": "set", "id": {"pk": 1}}, {"id": not_an_id}),
+            ({"op": "delete", "type": "set", "id": True}, {"id": not_an_id}),
+            (
+                {"op": "create", "type": "set", "data": {"workout": ["$w1"], "exercise": 1, "reps": 5}},
+                {"data": {"workout": not_an_id}},
+            ),
+            (
+                {"op": "create", "type": "cardio_set", "data": {"workout": "$w1", "exercise": {"id": 1}}},
+                {"data": {"exercise": not_an_id}},
+            ),
+            (
+                {"op": "create", "type": "exercise", "temp_id": ["e1"], "data": {"name": "Row"}},
+                {"temp_id": "Expected a string."},
+            ),
+        ]
+        for operation, errors in cases:
+            with self.subTest(operation):
+                response = self.client.post("/api/batch/", {"operations": [create_workout, operation]}, format="json")
+                self.assertEqual(response.status_code, 400, response.content)
+                body = response.json()
+                self.assertEqual((body["failed_index"], body["errors"]), (1, errors))
+                self.assertEqual([r["status"] for r in body["results"]], [424, 400])
+        self.assertFalse(Workout.objects.exists())
+
+
+class ImporterTests(UserDataTestCase):
+    def test_values_the_columns_cant_hold_skip_only_their_row(self):
+        user = User.objects.create_user(username="importer", password="x")
+        csv = "\n".join([
+            "date,exercise,reps,weight,unit,rpe,mode,duration_seconds,distance_meters",
+            "2024-05-01,Bench,5,100,kg,8,,,",
+            "2024-05-01,Bench,5,10000,kg,,,,",  # weight is max_digits=6, decimal_places=2
+            "2024-05-01,Bench,5,100,kg,100,,,",  # rpe is max_digits=3, decimal_places=1
+            "2024-05-01,Bench,99999999999999999999,100,kg,,,,",  # past the backend's integer range
+            "2024-05-01,Bench,5,1e400,kg,,,,",
+            "2024-05-01,Bench,5,NaN,kg,,,,",
+            "2024-05-01,Bench,inf,100,kg,,,,",
+            "2024-05-01,Row,,,,,ROW,600,1000000",  # distance_meters is max_digits=8
+            "2024-05-01,Row,,,,,ROW,600,2000.006",
+        ])
+        result = importer.import_history(user, BytesIO(csv.encode()), "csv")
+
+        self.assertEqual((result.sets, result.cardio_sets, result.skipped), (1, 1, 7), result.errors)
+        self.assertEqual([e["line"] for e in result.errors], [3, 4, 5, 6, 7, 8, 9])
+        self.assertIn("weight", result.errors[0]["error"])
+        self.assertEqual(str(CardioSet.objects.get().distance_meters), "2000.01")
+
+
+class BootstrapTests(UserDataTestCase):
+    def test_etag_revalidates_until_the_data_changes(self):
+        user = User.objects.create_user(username="launcher", password="x")
+        client = client_for(user)
+        workout = client.post("/api/workouts/", {"name": "Push", "date": "2024-05-01"}, format="json").json()
+        exercise = client.post("/api/exercises/", {"name": "Bench", "muscle_group": "CHEST"}, format="json").json()
+
+        first = client.get("/api/bootstrap/")
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+        self.assertEqual(first["Cache-Control"], "private, no-cache")
+
+        cached = client.get("/api/bootstrap/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b"")
+        self.assertEqual(cached["ETag"], etag)
+
+        body = {"workout": workout["id"], "exercise": exercise["id"], "reps": 5, "weight": "100", "unit": "kg"}
+        self.assertEqual(client.post("/api/sets/", body, format="json").status_code, 201)
+
+        changed = client.get("/api/bootstrap/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertEqual(changed.json()["workouts"][0]["set_count"], 1)
+
+
+class WorkoutSummaryTests(UserDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="summarized", password="x")
+        self.client = client_for(self.user)
+        self.bench = self.client.post("/api/exercises/", {"name": "Bench", "muscle_group": "CHEST"}, format="json").json()["id"]
+        self.row = self.client.post("/api/exercises/", {"name": "Row", "muscle_group": "OTHER"}, format="json").json()["id"]
+
+    def log_workout(self, day: str) -> int:
+        return self.client.post("/api/workouts/", {"name": "Session", "date": day}, format="json").json()["id"]
+
+    def add_set(self, workout: int, weight: str, unit: str = "kg", reps: int = 5) -> int:
+        body = {"workout": workout, "exercise": self.bench, "reps": reps, "weight": weight, "unit": unit}
+        response = self.client.post("/api/sets/", body, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["id"]
+
+    def add_cardio(self, workout: int, seconds: int, meters: str) -> int:
+        body = {"workout": workout, "exercise": self.row, "mode": "ROW", "duration_seconds": seconds, "distance_meters": meters}
+        response = self.client.post("/api/cardio-sets/", body, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["id"]
+
+    def stored(self, *workout_ids) -> dict:
+        with sharding.for_user(self.user.pk):
+            return {w["id"]: w for w in Workout.objects.filter(pk__in=workout_ids).values("id", *summaries.SUMMARY_FIELDS)}
+
+    def assertInSync(self, workout: int, **expected):
+        stored = self.stored(workout)[workout]
+        with sharding.for_user(self.user.pk):
+            summaries.refresh_many([workout])
+        self.assertEqual(self.stored(workout)[workout], stored, "recomputing changed the stored summary")
+        self.assertEqual({k: stored[k] for k in expected}, expected)
+
+    def test_set_writes_keep_the_summary_in_sync(self):
+        workout = self.log_workout("2024-05-01")
+        self.assertInSync(workout, set_count=0, exercise_count=0, total_volume_kg=Decimal("0.00"))
+
+        first = self.add_set(workout, "100")
+        # 5 x 225 lbs is 510.29 kg.
+        second = self.add_set(workout, "225", unit="lbs")
+        self.assertInSync(workout, set_count=2, exercise_count=1, total_volume_kg=Decimal("1010.29"))
+
+        cardio = self.add_cardio(workout, 600, "2000")
+        self.assertInSync(workout, set_count=3, exercise_count=2, cardio_duration_seconds=600)
+
+        self.client.patch(f"/api/sets/{second}/", {"weight": "60", "unit": "kg"}, format="json")
+        self.assertInSync(workout, total_volume_kg=Decimal("800.00"))
+
+        # Moving a set takes it out of one summary and into the other's.
+        other = self.log_workout("2024-05-02")
+        self.client.patch(f"/api/sets/{first}/", {"workout": other}, format="json")
+        self.assertInSync(workout, set_count=2, total_volume_kg=Decimal("300.00"))
+        self.assertInSync(other, set_count=1, total_volume_kg=Decimal("500.00"))
+
+        self.client.delete(f"/api/cardio-sets/{cardio}/")
+        self.client.delete(f"/api/sets/{second}/")
+        self.assertInSync(workout, set_count=0, exercise_count=0, total_volume_kg=Decimal("0.00"),
+                          cardio_duration_seconds=0, cardio_distance_meters=Decimal("0.00"))
+
+    def test_backfill_migration_matches_refresh_many(self):
+        workouts = [self.log_workout(f"2024-05-{day:02d}") for day in range(1, 5)]
+        for i, workout in enumerate(workouts[:3]):
+            self.add_set(workout, str(60 + 10 * i))
+            self.add_set(workout, "135", unit="lbs", reps=3 + i)
+            if i:
+                self.add_cardio(workout, 300 * i, f"{1000 * i}.5")
+        self.client.patch(f"/api/workouts/{workouts[1]}/", {"ended_at": "2024-05-02T19:00:00Z"}, format="json")
+
+        with sharding.for_user(self.user.pk) as alias:
+            summaries.refresh_many(workouts)
+            expected = self.stored(*workouts)
+            Workout.objects.filter(pk__in=workouts).update(
+                set_count=0, exercise_count=0, total_volume_kg=0, pr_count=0,
+                cardio_duration_seconds=0, cardio_distance_meters=0, duration_seconds=None,
+            )
+            migration = importlib.import_module("workouts.migrations.0026_backfill_workout_summaries")
+            state = MigrationLoader(connections[alias]).project_state(("workouts", "0026_backfill_workout_summaries"))
+            migration.backfill(state.apps, SimpleNamespace(connection=connections[alias]))
+
+        self.assertEqual(self.stored(*workouts), expected)
+        self.assertEqual(expected[workouts[3]]["set_count"], 0)
+        self.assertIsNotNone(expected[workouts[1]]["duration_seconds"])
+
+
+class StrengthHistoryTestCase(UserDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="lifter", password="x")
+        self.client = client_for(self.user)
+        self.bench = self.exercise("Bench")
+
+    def exercise(self, name: str) -> int:
+        return self.client.post("/api/exercises/", {"name": name, "muscle_group": "OTHER"}, format="json").json()["id"]
+
+    def log(self, day: str, *sets, exercise: int | None = None) -> list[int]:
+        """Log a workout on `day` with (weight, unit, reps[, set_type]) sets; returns the set ids."""
+        workout = self.client.post("/api/workouts/", {"name": "Push", "date": day}, format="json").json()["id"]
+        ids = []
+        for weight, unit, reps, *set_type in sets:
+            body = {"workout": workout, "exercise": exercise or self.bench, "weight": weight, "unit": unit,
+                    "reps": reps, "set_type": set_type[0] if set_type else "S"}
+            response = self.client.post("/api/sets/", body, format="json")
+            self.assertEqual(response.status_code, 201, response.content)
+            ids.append(response.json()["id"])
+        return ids
+
+
+class KgMetricsTests(StrengthHistoryTestCase):
+    SETS = (("100", "kg", 5), ("225", "lbs", 10), ("100", "kg", 36), ("100", "kg", 37), ("135", "lbs", 40), ("60", "kg", 0))
+
+    def test_set_kg_metrics(self):
+        lbs = 225 / 2.20462
+        cases = [
+            (("100", "kg", 5), (100.0, 500.0, 112.5)),
+            (("225", "lbs", 10), (lbs, lbs * 10, lbs * 36 / 27)),
+            (("100", "kg", 36), (100.0, 3600.0, 3600.0)),
+            # The Brzycki formula breaks down at 37 reps and above.
+            (("100", "kg", 37), (100.0, 3700.0, None)),
+            (("225", "lbs", 40), (lbs, lbs * 40, None)),
+            (("100", "kg", 0), (100.0, 0.0, None)),
+        ]
+        for (weight, unit, reps), expected in cases:
+            with self.subTest(weight=weight, unit=unit, reps=reps):
+                workout_set = WorkoutSet(weight=Decimal(weight), unit=unit, reps=reps)
+                workout_set.set_kg_metrics()
+                actual = (workout_set.weight_kg, workout_set.volume_kg, workout_set.e1rm_kg)
+                for value, want in zip(actual, expected):
+                    if want is None:
+                        self.assertIsNone(value)
+                    else:
+                        self.assertAlmostEqual(value, want, places=6)
+
+        bodyweight = WorkoutSet(weight=None, unit="kg", reps=10)
+        bodyweight.set_kg_metrics()
+        self.assertEqual((bodyweight.weight_kg, bodyweight.volume_kg, bodyweight.e1rm_kg), (None, None, None))
+
+    def test_backfill_migration_matches_set_kg_metrics(self):
+        ids = self.log("2024-05-01", *self.SETS)
+        columns = ("weight_kg", "volume_kg", "e1rm_kg")
+        with sharding.for_user(self.user.pk) as alias:
+            sets = WorkoutSet.objects.filter(pk__in=ids).order_by("pk")
+            expected = list(sets.values_list(*columns))
+            sets.update(weight_kg=None, volume_kg=None, e1rm_kg=None)
+            migration = importlib.import_module("workouts.migrations.0022_backfill_set_kg_metrics")
+            state = MigrationLoader(connections[alias]).project_state(("workouts", "0022_backfill_set_kg_metrics"))
+            migration.backfill(state.apps, SimpleNamespace(connection=connections[alias]))
+            backfilled = list(sets.values_list(*columns))
+
+        for row, want in zip(backfilled, expected):
+            for value, expected_value in zip(row, want):
+                if expected_value is None:
+                    self.assertIsNone(value)
+                else:
+                    self.assertAlmostEqual(value, expected_value, places=6)
+
+
+class RecordsTests(StrengthHistoryTestCase):
+    def bench_records(self) -> dict:
+        response = self.client.get("/api/records/")
+        self.assertEqual(response.status_code, 200)
+        (entry,) = response.json()
+        return entry
+
+    def test_records_compare_in_kg_and_ties_go_to_the_earliest_set(self):
+        # e1RM 112.5 / 120 / 150 (a warm-up, ignored); volume 500 / 900.
+        top, best, _ = self.log("2024-05-01", ("100", "kg", 5), ("90", "kg", 10), ("150", "kg", 1, "W"))
+        # A tie on every record, and 200 lbs (90.7 kg), which is no record.
+        self.log("2024-05-08", ("100", "kg", 5), ("200", "lbs", 8))
+
+        records = self.bench_records()
+        self.assertEqual((records["weight"]["set"], records["weight"]["value"]), (top, 100.0))
+        self.assertEqual((records["e1rm"]["set"], records["e1rm"]["value"]), (best, 120.0))
+        self.assertEqual((records["volume"]["set"], records["volume"]["value"]), (best, 900.0))
+        self.assertEqual(records["weight"]["date"], "2024-05-01")
+
+        # 250 lbs is 113.4 kg: heavier than any kg set, though not a better e1RM.
+        (heavy,) = self.log("2024-05-15", ("250", "lbs", 2))
+        records = self.bench_records()
+        self.assertEqual(records["weight"]["set"], heavy)
+        self.assertEqual((records["weight"]["weight"], records["weight"]["unit"]), ("250.00", "lbs"))
+        self.assertAlmostEqual(records["weight"]["value"], 250 / 2.20462, places=4)
+        self.assertEqual(records["e1rm"]["set"], best)
+        self.assertEqual(records["last_pr_date"], "2024-05-15")
+
+
+class PreviousSessionsTests(StrengthHistoryTestCase):
+    def previous(self, *exercise_ids, sessions: int) -> dict:
+        ids = ",".join(map(str, exercise_ids))
+        response = self.client.get("/api/exercises/previous/", {"ids": ids, "sessions": sessions})
+        self.assertEqual(response.status_code, 200, response.content)
+        return {
+            entry["exercise"]: [[(s["id"], s["weight"], s["unit"]) for s in session["sets"]] for session in entry["sessions"]]
+            for entry in response.json()
+        }
+
+    def test_last_sessions_newest_first_with_every_set_as_logged(self):
+        squat, curl = self.exercise("Squat"), self.exercise("Curl")
+        oldest = self.log("2024-05-01", ("100", "kg", 5), ("90", "kg", 8))
+        squats = self.log("2024-05-03", ("140", "kg", 5), exercise=squat)
+        middle = self.log("2024-05-08", ("225", "lbs", 5), ("100", "kg", 5), ("45", "lbs", 10, "W"))
+        # Two workouts on one day: the later-created one counts as newer.
+        same_day = self.log("2024-05-15", ("105", "kg", 3))
+        latest = self.log("2024-05-15", ("235", "lbs", 2), ("235", "lbs", 2))
+
+        found = self.previous(self.bench, squat, curl, sessions=3)
+        self.assertEqual(list(found), [self.bench, squat, curl])
+        self.assertEqual(found[self.bench], [
+            [(latest[0], "235.00", "lbs"), (latest[1], "235.00", "lbs")],
+            [(same_day[0], "105.00", "kg")],
+            [(middle[0], "225.00", "lbs"), (middle[1], "100.00", "kg"), (middle[2], "45.00", "lbs")],
+        ])
+        self.assertEqual(found[squat], [[(squats[0], "140.00", "kg")]])
+        self.assertEqual(found[curl], [])
+        self.assertEqual(self.previous(self.bench, sessions=10)[self.bench][-1], [
+            (oldest[0], "100.00", "kg"), (oldest[1], "90.00", "kg"),
+        ])
+
+
+class ExportTests(UserDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="exporter", password="x")
+        self.other = User.objects.create_user(username="bystander", password="x")
+        self.sets = {user.pk: self.log(user, sessions) for user, sessions in ((self.user, 4), (self.other, 2))}
+
+    def log(self, user, sessions: int) -> list[int]:
+        client = client_for(user)
+        bench = client.post("/api/exercises/", {"name": "Bench", "muscle_group": "CHEST"}, format="json").json()["id"]
+        row = client.post("/api/exercises/", {"name": "Row", "muscle_group": "OTHER"}, format="json").json()["id"]
+        ids = []
+        for day in range(1, sessions + 1):
+            workout = client.post("/api/workouts/", {"name": "Push", "date": f"2024-05-{day:02d}"}, format="json").json()["id"]
+            for reps in (5, 5, 3):
+                body = {"workout": workout, "exercise": bench, "reps": reps, "weight": "100", "unit": "kg"}
+                ids.append(client.post("/api/sets/", body, format="json").json()["id"])
+            client.post("/api/cardio-sets/", {"workout": workout, "exercise": row, "mode": "ROW", "duration_seconds": 600}, format="json")
+        return ids
+
+    def stream(self, **params):
+        response = client_for(self.user).get("/api/export/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Cache-Control"], "no-store")
+        return response, b"".join(response.streaming_content)
+
+    @mock.patch.object(export, "BUFFER_SIZE", 512)
+    def test_ndjson_has_every_row_of_the_user_only(self):
+        response, body = self.stream()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="strengthy-exporter.ndjson"', response["Content-Disposition"])
+
+        rows = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+        counts = {entity: sum(r["type"] == entity for r in rows) for entity in export.ENTITIES}
+        self.assertEqual(counts, {"profile": 0, "exercises": 2, "workouts": 4, "sets": 12, "cardio_sets": 4})
+        self.assertEqual([r["id"] for r in rows if r["type"] == "sets"], self.sets[self.user.pk])
+        self.assertTrue(all("owner_id" not in r for r in rows))
+
+    @mock.patch.object(export, "BUFFER_SIZE", 512)
+    def test_csv_has_a_header_and_one_line_per_row(self):
+        response, body = self.stream(fmt="csv", entity="sets")
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+        header, *lines = list(csv.reader(body.decode("utf-8").splitlines()))
+        self.assertEqual(header, export.entity_columns("sets"))
+        self.assertEqual([int(line[header.index("id")]) for line in lines], self.sets[self.user.pk])
+        self.assertEqual({line[header.index("exercise__name")] for line in lines}, {"Bench"})
+
+    def test_gzip_wraps_the_same_stream(self):
+        plain = self.stream(fmt="csv", entity="workouts")[1]
+        response, body = self.stream(fmt="csv", entity="workouts", gzip="1")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertEqual(gzip.decompress(body), plain)
+
+
+class CalendarTests(UserDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="calendar", password="x")
+        self.client = client_for(self.user)
+        for day in ("2022-01-01", "2022-06-15", "2023-01-01"):
+            self.add_workout(day)
+
+    def add_workout(self, day):
+        with sharding.for_user(self.user.pk):
+            Workout.objects.create(owner=self.user, name="Push", date=day)
+
+    def test_range_defaults_to_the_year_ending_at_to(self):
+        response = self.client.get("/api/calendar/", {"to": "2023-01-01"})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["days"], {"2022-06-15": 1, "2023-01-01": 1})
+
+    def test_default_range_is_the_year_up_to_today(self):
+        today = timezone.localdate()
+        self.add_workout(today)
+        response = self.client.get("/api/calendar/")
+        self.assertEqual(response.json()["days"], {today.isoformat(): 1})
+
+
+class CardioTrendTests(UserDataTestCase):
+    def test_split_falls_back_to_the_average_when_none_was_logged(self):
+        user = User.objects.create_user(username="rower", password="x")
+        with sharding.for_user(user.pk):
+            rower = Exercise.objects.create(owner=user, name="Row", muscle_group="OTHER")
+            for day, split in ((1, "105.5"), (2, "0"), (3, None)):
+                workout = Workout.objects.create(owner=user, name="Row", date=date(2024, 5, day))
+                CardioSet.objects.create(
+                    workout=workout, owner=user, exercise=rower, mode="ROW",
+                    duration_seconds=480, distance_meters=2000, split_seconds=split,
+                )
+
+        response = client_for(user).get(f"/api/exercises/{rower.pk}/cardio-trends/", {"metric": "split"})
+
+        self.assertEqual(response.status_code, 200)
+        # 480s over 2000m is 120s per 500m.
+        self.assertEqual([p["value"] for p in response.json()["points"]], [105.5, 120.0, 120.0])
+
+
+class LttbTests(TestCase):
+    def test_small_inputs_are_returned_whole(self):
+        for n in range(0, 6):
+            self.assertEqual(trends.lttb(list(range(n)), [0.0] * n, 5), list(range(n)))
+        self.assertEqual(trends.lttb(list(range(10)), [0.0] * 10, 2), list(range(10)))
+
+    def test_keeps_the_ends_and_stays_within_the_threshold(self):
+        n = 1000
+        xs = list(range(n))
+        ys = [float((i * 7919) % 113) for i in xs]
+        for threshold in (3, 4, 10, 99, 500, 999):
+            kept = trends.lttb(xs, ys, threshold)
+            self.assertLessEqual(len(kept), threshold)
+            self.assertEqual((kept[0], kept[-1]), (0, n - 1))
+            self.assertEqual(kept, sorted(set(kept)))
+
+    def test_keeps_a_spike(self):
+        ys = [1.0] * 100
+        ys[42] = 50.0
+        self.assertIn(42, trends.lttb(list(range(100)), ys, 10))
+
+
+class SetNumberingConcurrencyTests(TransactionTestCase):
+    databases = "__all__"
+    THREADS = 8
+    PER_THREAD = 5
+
+    def setUp(self):
+        # As in UserDataTestCase.
+        cache.clear()
+        self.user = User.objects.create_user(username="racer", password="x")
+        alias = sharding.lookup(self.user.pk)[0]
+        if connections[alias].vendor == "sqlite":
+            self.skipTest("SQLite serializes writers with table locks instead of row locks.")
+        with sharding.for_user(self.user.pk):
+            self.workout = Workout.objects.create(owner=self.user, name="Race", date=date(2024, 5, 1))
+            self.exercise = Exercise.objects.create(owner=self.user, name="Bench", muscle_group="CHEST")
+
+    def allocate_concurrently(self, model) -> list[int]:
+        numbers, errors = [], []
+        barrier = threading.Barrier(self.THREADS)
+
+        def work(index):
+            try:
+                with sharding.for_user(self.user.pk):
+                    barrier.wait(5)
+                    for _ in range(self.PER_THREAD):
+                        numbers.append(numbering.next_set_number(model, self.workout.pk, self.exercise.pk))
+                        if index % 2:
+                            # A set moved in with a lower number must not rewind the counter.
+                            numbering.reserve_through(model, self.workout.pk, self.exercise.pk, 1)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        self.assertEqual(errors, [])
+        return numbers
+
+    def test_concurrent_allocations_are_unique_and_contiguous(self):
+        for model in (WorkoutSet, CardioSet):
+            with self.subTest(model=model.__name__):
+                numbers = self.allocate_concurrently(model)
+                self.assertEqual(sorted(numbers), list(range(1, self.THREADS * self.PER_THREAD + 1)))
+
+
+class ArchiveTests(UserDataTestCase):
+    """Cold storage (workouts.archive) seen through the API."""
+
+    OLD_YEARS = (2019, 2020)
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="archivist", password="x")
+        self.client = client_for(self.user)
+        self.ids = self.log_history()
+        self.before = self.snapshot()
+        self.prs_before = self.probe_prs()
+        call_command("archive_history", "--user", str(self.user.pk), "--older-than-days", "365", stdout=StringIO())
+
+    def log_history(self) -> dict:
+        post = lambda path, data: self.client.post(path, data, format="json").json()  # noqa: E731
+        ids = {
+            "bench": post("/api/exercises/", {"name": "Bench", "muscle_group": "CHEST"})["id"],
+            "row": post("/api/exercises/", {"name": "Row", "muscle_group": "OTHER"})["id"],
+        }
+        # Two years old enough to archive, and sessions from the last month.
+        today = timezone.localdate()
+        days = [date(year, month, 15) for year in self.OLD_YEARS for month in (2, 6, 10)]
+        days += [today - timedelta(days=n) for n in (30, 20, 10)]
+        weight = 60
+        for day in days:
+            workout = post("/api/workouts/", {"name": f"Session {day}", "date": str(day)})["id"]
+            ids.setdefault(day.year, workout)
+            ids["recent"] = workout
+            for reps in (5, 5, 3):
+                weight += 2.5
+                post("/api/sets/", {"workout": workout, "exercise": ids["bench"], "reps": reps, "weight": str(weight), "unit": "kg"})
+            post("/api/sets/", {"workout": workout, "exercise": ids["bench"], "reps": 10, "weight": "40", "unit": "kg", "set_type": "W"})
+            post("/api/cardio-sets/", {
+                "workout": workout, "exercise": ids["row"], "mode": "ROW",
+                "duration_seconds": 600 + day.month, "distance_meters": str(2000 + day.month), "split_seconds": "120.5",
+            })
+            self.client.patch(f"/api/workouts/{workout}/", {"ended_at": f"{day}T19:00:00Z"}, format="json")
+        return ids
+
+    def snapshot(self) -> dict:
+        get = lambda path: self.client.get(path).json()  # noqa: E731
+        ids, first = self.ids, self.ids[self.OLD_YEARS[0]]
+        return {
+            "workouts": get("/api/workouts/"),
+            "sets": get("/api/sets/"),
+            "cardio": get("/api/cardio-sets/"),
+            "old_sets": get(f"/api/sets/?workout={first}"),
+            "old_cardio": get(f"/api/cardio-sets/?workout={first}&exercise={ids['row']}"),
+            "old_workout": get(f"/api/workouts/{first}/"),
+            "calendar": get(f"/api/calendar/?from={self.OLD_YEARS[0]}-01-01&to={self.OLD_YEARS[-1]}-12-31"),
+            "records": get("/api/records/"),
+            "previous": get(f"/api/exercises/previous/?ids={ids['bench']},{ids['row']}&sessions=10"),
+            "export": b"".join(export.ndjson_chunks(self.user)),
+        }
+
+    def probe_prs(self) -> tuple:
+        """PR flags of a new strength and cardio set in the recent workout, deleted again."""
+        strength = self.client.post("/api/sets/", {
+            "workout": self.ids["recent"], "exercise": self.ids["bench"], "reps": 4, "weight": "90", "unit": "kg",
+        }, format="json").json()
+        cardio = self.client.post("/api/cardio-sets/", {
+            "workout": self.ids["recent"], "exercise": self.ids["row"], "mode": "ROW",
+            "duration_seconds": 590, "distance_meters": "2005", "split_seconds": "119",
+        }, format="json").json()
+        self.client.delete(f"/api/sets/{strength['id']}/")
+        self.client.delete(f"/api/cardio-sets/{cardio['id']}/")
+        return tuple({k: v for k, v in row.items() if k.startswith("is_")} for row in (strength, cardio))
+
+    def archived_years(self) -> list[int]:
+        with sharding.for_user(self.user.pk):
+            return sorted(ArchivedYear.objects.filter(owner=self.user).values_list("year", flat=True))
+
+    def test_old_years_leave_the_live_tables(self):
+        self.assertEqual(self.archived_years(), list(self.OLD_YEARS))
+        with sharding.for_user(self.user.pk):
+            live = Workout.objects.filter(owner=self.user)
+            self.assertFalse({d.year for d in live.dates("date", "year")} & set(self.OLD_YEARS))
+            self.assertEqual(live.count(), 3)
+            self.assertEqual(WorkoutSet.objects.filter(owner=self.user).count(), 12)
+            self.assertEqual(CardioSet.objects.filter(owner=self.user).count(), 3)
+
+    def test_reads_and_pr_flags_are_unchanged(self):
+        after = self.snapshot()
+        for key, value in self.before.items():
+            with self.subTest(key):
+                self.assertEqual(after[key], value)
+        self.assertEqual(self.probe_prs(), self.prs_before)
+
+    def test_editing_an_archived_set_rehydrates_its_year(self):
+        archived_set = self.before["old_sets"][0]
+        response = self.client.patch(f"/api/sets/{archived_set['id']}/", {"rpe": "8"}, format="json")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.archived_years(), list(self.OLD_YEARS[1:]))
+        with sharding.for_user(self.user.pk):
+            live = WorkoutSet.objects.get(pk=archived_set["id"])
+        self.assertEqual(live.created_at.isoformat().replace("+00:00", "Z"), archived_set["created_at"])
+        workouts = self.client.get("/api/workouts/").json()
+        self.assertEqual(sorted(w["id"] for w in workouts), sorted(w["id"] for w in self.before["workouts"]))
+        # Editing a set re-judges its PR flags against the whole history, so pr_count may move.
+        old_workout = self.client.get(f"/api/workouts/{self.ids[self.OLD_YEARS[0]]}/").json()
+        self.assertEqual(
+            {k: v for k, v in old_workout.items() if k != "pr_count"},
+            {k: v for k, v in self.before["old_workout"].items() if k != "pr_count"},
+        )
+
+    def test_new_set_in_an_archived_workout_rehydrates_its_year(self):
+        response = self.client.post("/api/sets/", {
+            "workout": self.ids[self.OLD_YEARS[-1]], "exercise": self.ids["bench"], "reps": 1, "weight": "20", "unit": "kg",
+        }, format="json")
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()["set_number"], 5)
+        self.assertEqual(self.archived_years(), list(self.OLD_YEARS[:1]))
+
+    def test_batch_update_of_an_archived_set(self):
+        archived_set = self.before["old_sets"][0]
+        operation = {"op": "update", "type": "set", "id": archived_set["id"], "data": {"reps": 6}}
+        response = self.client.post("/api/batch/", {"operations": [operation]}, format="json")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.client.get(f"/api/sets/{archived_set['id']}/").json()["reps"], 6)
+        self.assertEqual(self.archived_years(), list(self.OLD_YEARS[1:]))
+
+    def test_deleting_the_user_removes_the_archive(self):
+        alias = sharding.lookup(self.user.pk)[0]
+        deletion.delete_user_data(self.user.pk)
+        # Not through for_user(), which would assign the deleted user a shard again.
+        self.assertFalse(ArchivedYear.objects.using(alias).filter(owner_id=self.user.pk).exists())
+
+
+@skipUnless(routing.replica_aliases() and not sharding.enabled(), "set DATABASE_REPLICA_URLS (without shards)")
+class ReplicaRoutingTests(TransactionTestCase):
+    """Needs a replica alias. In tests it mirrors `default` over its own
+    connection, which can't see a TestCase's open transaction."""
+
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        routing.monitor.clear()
+        self.replica = routing.replica_aliases()[0]
+        self.user = User.objects.create_user(username="reader", password="x")
+        self.client = client_for(self.user)
+
+    def read_from_replica(self) -> bool:
+        with CaptureQueriesContext(connections[self.replica]) as replica:
+            response = self.client.get("/api/workouts/")
+        self.assertEqual(response.status_code, 200)
+        return len(replica) > 0
+
+    def write(self):
+        response = self.client.post("/api/workouts/", {"name": "Push", "date": "2024-05-01"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def test_reads_go_to_the_replica_until_the_client_writes(self):
+        self.assertTrue(self.read_from_replica())
+        response = self.write()
+        self.assertEqual(response.cookies[routing.PIN_COOKIE]["max-age"], 5)
+        self.assertFalse(self.read_from_replica())
+        # Token clients don't keep cookies; the pin is in the cache as well.
+        self.client.cookies.clear()
+        self.assertFalse(self.read_from_replica())
+
+    @override_settings(REPLICA_STICKY_SECONDS=1)
+    def test_the_pin_expires(self):
+        self.write()
+        self.client.cookies.clear()
+        self.assertFalse(self.read_from_replica())
+        time.sleep(1.1)
+        self.assertTrue(self.read_from_replica())
+
+
+class ShardIdRangeTests(TestCase):
+    def test_sharded_models_take_ids_past_int4(self):
+        # Postgres drops lookups outside a pk column's range, so shard ids
+        # would 404 everywhere if these were 32-bit AutoFields.
+        postgres = PostgresWrapper({**connection.settings_dict, "ENGINE": "django.db.backends.postgresql"}, "pg")
+        for label in sharding.SHARDED_MODELS:
+            model = apps.get_model(label)
+            query = model.objects.filter(pk=8 * sharding.ID_SPACING + 2).query
+            sql, params = query.get_compiler(connection=postgres).as_sql()
+            self.assertIn(8 * sharding.ID_SPACING + 2, params, label)
+
+
+@skipUnless(sharding.enabled(), "set DATABASE_SHARD_URLS to run the sharding tests")
+class ShardingTests(TransactionTestCase):
+    databases = "__all__"
+    MODELS = (Exercise, Workout, WorkoutSet, CardioSet)
+
+    def rows_by_alias(self, user_id: int) -> dict:
+        return {
+            alias: sum(model.objects.using(alias).filter(owner_id=user_id).count() for model in self.MODELS)
+            for alias in sharding.shard_aliases()
+        }
+
+    def log_session(self, client) -> dict:
+        exercise = client.post("/api/exercises/", {"name": "Bench", "muscle_group": "CHEST"}, format="json")
+        workout = client.post("/api/workouts/", {"name": "Push", "date": "2024-05-01"}, format="json")
+        self.assertEqual((exercise.status_code, workout.status_code), (201, 201))
+        ids = {"exercise": exercise.json()["id"], "workout": workout.json()["id"]}
+        for _ in range(3):
+            response = client.post("/api/sets/", {**ids, "reps": 5, "weight": "100", "unit": "kg"}, format="json")
+            self.assertEqual(response.status_code, 201, response.content)
+        response = client.post(
+            "/api/cardio-sets/",
+            {**ids, "mode": "ROW", "duration_seconds": 600, "distance_meters": "2000"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return ids
+
+    def setUp(self):
+        # As in UserDataTestCase.
+        cache.clear()
+        self.users = [User.objects.create_user(username=f"shard-user-{i}", password="x") for i in range(6)]
+        self.sessions = {user.pk: self.log_session(client_for(user)) for user in self.users}
+
+    def test_rows_live_on_the_assigned_shard_in_its_id_range(self):
+        for user in self.users:
+            alias = UserShard.objects.get(pk=user.pk).alias
+            counts = self.rows_by_alias(user.pk)
+            self.assertEqual(counts[alias], 6, counts)
+            self.assertEqual(sum(counts.values()), 6, counts)
+            floor = sharding.shard_aliases().index(alias) * sharding.ID_SPACING
+            self.assertGreater(self.sessions[user.pk]["workout"], floor)
+        self.assertGreater(len({UserShard.objects.get(pk=u.pk).alias for u in self.users}), 1)
+
+    def test_users_only_see_their_own_data(self):
+        for user in self.users:
+            workouts = client_for(user).get("/api/workouts/").json()
+            self.assertEqual([w["id"] for w in workouts], [self.sessions[user.pk]["workout"]])
+
+    def test_detail_routes_resolve_shard_ids(self):
+        for user in self.users:
+            ids = self.sessions[user.pk]
+            response = client_for(user).get(f"/api/workouts/{ids['workout']}/")
+            self.assertEqual(response.status_code, 200, ids)
+
+    def test_move_keeps_ids_and_timestamps(self):
+        mover = self.users[0]
+        source = UserShard.objects.get(pk=mover.pk).alias
+        target = next(a for a in sharding.shard_aliases() if a != source)
+        before = client_for(mover).get("/api/workouts/").json()
+
+        call_command("move_user_shard", str(mover.pk), target, "--no-wait", stdout=StringIO())
+
+        counts = self.rows_by_alias(mover.pk)
+        self.assertEqual((counts[target], counts[source]), (6, 0), counts)
+        client = client_for(mover)
+        workouts = client.get("/api/workouts/").json()
+        self.assertEqual(workouts, before)
+        self.assertEqual(workouts[0]["set_count"], 4)
+        created = client.post(
+            "/api/sets/", {**self.sessions[mover.pk], "reps": 3, "weight": "110", "unit": "kg"}, format="json"
+        )
+        self.assertEqual(created.status_code, 201, created.content)
+        self.assertEqual(created.json()["set_number"], 4)
+        self.assertEqual(self.rows_by_alias(mover.pk)[target], 7)
+
+    def test_deleting_a_user_clears_every_shard(self):
+        victim = self.users[1]
+        alias = UserShard.objects.get(pk=victim.pk).alias
+        deletion.delete_user_data(victim.pk)
+        self.assertEqual(sum(self.rows_by_alias(victim.pk).values()), 0)
+        self.assertFalse(User.objects.using(alias).filter(pk=victim.pk).exists())
+        self.assertFalse(User.objects.filter(pk=victim.pk).exists())
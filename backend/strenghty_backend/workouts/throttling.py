@@ -0,0 +1,151 @@
+"""Token-bucket throttles for endpoints that hash passwords.
+
+Login, registration, password change and password reset all run PBKDF2,
+which costs tens of milliseconds of CPU per call. A credential-stuffing
+burst against them can starve every worker, so these throttles reject
+excess requests in DRF's `check_throttles()` step, before the view body
+(and therefore any hashing) runs.
+
+Each request is checked against two tiers:
+
+* an in-process bucket, a dict guarded by a lock, which rejects a flood
+  hitting this worker without any network round trip;
+* a shared bucket in the Django cache, which enforces the same limit across
+  workers when `CACHES` points at a shared backend (Redis, Memcached,
+  database). The read-modify-write on the cache isn't atomic, so under heavy
+  contention the shared tier can admit a few extra requests; the local tier
+  still bounds each process.
+
+Client addresses come from DRF's `get_ident()`, which trusts only the last
+`NUM_PROXIES` entries of X-Forwarded-For, so rotating the header doesn't
+buy a fresh bucket.
+
+Rates use DRF's "<count>/<period>" format, e.g. "10/min". The count is the
+bucket capacity (burst size) and tokens refill evenly over the period.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """Return (capacity, tokens refilled per second) for a "10/min" style rate."""
+    num, period = rate.split("/")
+    capacity = int(num)
+    return capacity, capacity / _PERIODS[period.strip()[0]]
+
+
+def _take(tokens: float, updated: float, now: float, capacity: int, refill: float) -> tuple[float, float]:
+    """Refill a bucket up to `now` and try to take one token.
+
+    Returns (tokens left, seconds to wait). Waiting 0 means the request is
+    allowed.
+    """
+    tokens = min(capacity, tokens + (now - updated) * refill)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / refill
+
+
+class LocalBuckets:
+    """Per-process token buckets with LRU eviction so memory stays bounded."""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, capacity: int, refill: float, now: float | None = None) -> float:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens, wait = _take(tokens, updated, now, capacity, refill)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+def consume_shared(key: str, capacity: int, refill: float, now: float | None = None) -> float:
+    now = time.time() if now is None else now
+    cache_key = f"throttle:bucket:{key}"
+    tokens, updated = cache.get(cache_key) or (capacity, now)
+    tokens, wait = _take(tokens, updated, now, capacity, refill)
+    # Keep the entry only as long as it takes to refill completely.
+    cache.set(cache_key, (tokens, now), timeout=int(capacity / refill) + 1)
+    return wait
+
+
+local_buckets = LocalBuckets()
+
+
+class AuthRateThrottle(BaseThrottle):
+    """Base class: throttle writes to password-hashing endpoints by `get_key()`."""
+
+    scope = None
+    rate_setting = None
+    default_rate = None
+    methods = {"POST", "PUT", "PATCH"}
+
+    def get_key(self, request, view) -> str | None:
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self._wait = 0.0
+        if not getattr(settings, "AUTH_THROTTLE_ENABLED", True) or request.method not in self.methods:
+            return True
+        ident = self.get_key(request, view)
+        if not ident:
+            return True
+
+        capacity, refill = parse_rate(getattr(settings, self.rate_setting, self.default_rate))
+        key = f"{self.scope}:{ident}"
+        self._wait = local_buckets.consume(key, capacity, refill)
+        if not self._wait:
+            self._wait = consume_shared(key, capacity, refill)
+        return not self._wait
+
+    def wait(self):
+        return self._wait or None
+
+
+class AuthIPThrottle(AuthRateThrottle):
+    scope = "auth-ip"
+    rate_setting = "AUTH_THROTTLE_IP_RATE"
+    default_rate = "30/min"
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class AuthUsernameThrottle(AuthRateThrottle):
+    """Limit attempts against one account, however many IPs they come from."""
+
+    scope = "auth-user"
+    rate_setting = "AUTH_THROTTLE_USERNAME_RATE"
+    default_rate = "10/min"
+
+    def get_key(self, request, view):
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            return f"id:{user.pk}"
+        try:
+            data = request.data
+            name = data.get("username") or data.get("email") or ""
+        except Exception:
+            return None
+        return str(name).strip().lower() or None
+
+
+AUTH_THROTTLES = [AuthIPThrottle, AuthUsernameThrottle]
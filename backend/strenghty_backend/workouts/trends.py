@@ -0,0 +1,119 @@
+"""Downsampled cardio metric series for the progress charts.
+
+The client used to fetch every `CardioSet` for an exercise and derive pace,
+split and floors/min itself, so chart payloads grew with the user's
+history. `cardio_trend()` derives the metric in the database (one
+expression over the column values, rows without the inputs filtered out)
+and reduces the series with Largest-Triangle-Three-Buckets, which keeps
+the points that carry the visual shape of the line (peaks, dips, the ends)
+at a fixed output size.
+"""
+
+from django.db.models import Case, ExpressionWrapper, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+
+from .models import CardioSet
+
+DEFAULT_POINTS = 200
+MIN_POINTS = 3
+MAX_POINTS = 1000
+
+
+def _float(name: str):
+    return Cast(name, FloatField())
+
+
+def _per(numerator, denominator, scale: float = 1.0):
+    return ExpressionWrapper(numerator * Value(scale) / denominator, output_field=FloatField())
+
+
+# metric -> (unit, value expression, rows it is defined for)
+METRICS = {
+    "distance": ("m", _float("distance_meters"), Q(distance_meters__gt=0)),
+    "duration": ("s", _float("duration_seconds"), Q(duration_seconds__gt=0)),
+    # Seconds per kilometre, lower is faster.
+    "pace": (
+        "s/km",
+        _per(_float("duration_seconds"), _float("distance_meters"), 1000.0),
+        Q(distance_meters__gt=0, duration_seconds__gt=0),
+    ),
+    # Seconds per 500m; falls back to the average split when none was logged
+    # (the form sends 0 as well as leaving it empty).
+    "split": (
+        "s/500m",
+        Case(
+            When(split_seconds__gt=0, then=_float("split_seconds")),
+            default=_per(_float("duration_seconds"), _float("distance_meters"), 500.0),
+            output_field=FloatField(),
+        ),
+        Q(split_seconds__gt=0) | Q(distance_meters__gt=0, duration_seconds__gt=0),
+    ),
+    "floors_per_min": (
+        "floors/min",
+        _per(_float("floors"), _float("duration_seconds"), 60.0),
+        Q(floors__gt=0, duration_seconds__gt=0),
+    ),
+    "spm": ("strokes/min", _float("spm"), Q(spm__gt=0)),
+}
+
+
+def lttb(xs: list, ys: list, threshold: int) -> list[int]:
+    """Indexes of the points Largest-Triangle-Three-Buckets keeps.
+
+    Always keeps the first and last point; every bucket in between
+    contributes the point forming the largest triangle with the previously
+    kept point and the average of the next bucket.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < MIN_POINTS:
+        return list(range(n))
+
+    kept = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket (the last point for the final bucket).
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return kept
+
+
+def cardio_trend(user, exercise_id: int, metric: str, *, mode: str | None = None, points: int = DEFAULT_POINTS) -> dict:
+    """Chronological `metric` series for one exercise, reduced to `points`."""
+    unit, expression, defined = METRICS[metric]
+    qs = CardioSet.objects.filter(defined, exercise_id=exercise_id, owner=user)
+    if mode:
+        qs = qs.filter(mode=mode)
+    rows = list(
+        qs.annotate(value=expression)
+        .order_by("workout__date", "workout__created_at", "set_number", "pk")
+        .values_list("workout__date", "workout_id", "pk", "value")
+    )
+
+    xs = [row[0].toordinal() for row in rows]
+    ys = [row[3] for row in rows]
+    return {
+        "exercise": exercise_id,
+        "mode": mode,
+        "metric": metric,
+        "unit": unit,
+        "total": len(rows),
+        "points": [
+            {"date": rows[i][0], "workout": rows[i][1], "set": rows[i][2], "value": round(ys[i], 2)}
+            for i in lttb(xs, ys, points)
+        ],
+    }
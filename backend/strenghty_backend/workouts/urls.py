@@ -5,6 +5,7 @@ from .views import (
     WorkoutViewSet,
     WorkoutSetViewSet,
     CardioSetViewSet,
+    LoginView,
     RegisterView,
     AccountSettingsView,
     PasswordResetRequestView,
@@ -12,9 +13,15 @@ from .views import (
     GoogleLoginView,
     GoogleRedirectReceiver,
     ProfileView,
+    ExportDataView,
+    ImportHistoryView,
+    BatchView,
+    BootstrapView,
+    CalendarView,
+    RecordsView,
+    push_events,
     public_config,  # ✅ ADDED THIS IMPORT
 )
-from rest_framework.authtoken.views import obtain_auth_token
 
 router = DefaultRouter()
 router.register(r"exercises", ExerciseViewSet, basename="exercise")
@@ -24,7 +31,7 @@ router.register(r"cardio-sets", CardioSetViewSet, basename="cardioset")
 
 urlpatterns = [
     path("", include(router.urls)),
-    path("auth/login/", obtain_auth_token, name="api_token_auth"),
+    path("auth/login/", LoginView.as_view(), name="api_token_auth"),
     path("auth/register/", RegisterView.as_view(), name="auth_register"),
     path("auth/account/", AccountSettingsView.as_view(), name="auth_account"),
     path("auth/password-reset/request/", PasswordResetRequestView.as_view(), name="auth_password_reset_request"),
@@ -32,6 +39,13 @@ urlpatterns = [
     path("auth/google/", GoogleLoginView.as_view(), name="auth_google"),
     path("auth/google/redirect/", GoogleRedirectReceiver, name="auth_google_redirect"),
     path("profile/", ProfileView.as_view(), name="user_profile"),
+    path("export/", ExportDataView.as_view(), name="export_data"),
+    path("import/", ImportHistoryView.as_view(), name="import_history"),
+    path("batch/", BatchView.as_view(), name="batch"),
+    path("bootstrap/", BootstrapView.as_view(), name="bootstrap"),
+    path("calendar/", CalendarView.as_view(), name="calendar"),
+    path("records/", RecordsView.as_view(), name="records"),
+    path("events/", push_events, name="push_events"),
     
     # ✅ MOVED THE CONFIG ROUTE HERE
     path("public-config/", public_config, name="public-config"),
@@ -1,24 +1,52 @@
 from rest_framework import viewsets, permissions, generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.core.mail import send_mail
 import random
+import secrets
 from rest_framework.authtoken.models import Token
+from rest_framework.authtoken.views import ObtainAuthToken
 import requests
 from django.views.decorators.csrf import csrf_exempt
 from django.http import HttpResponse
 from django.shortcuts import redirect
 from urllib.parse import quote
 import json
-from django.http import JsonResponse
-
-
-from .models import Exercise, Workout, WorkoutSet, CardioSet, PasswordResetCode, Profile
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_date
+from django.utils.http import quote_etag
+import hashlib
+import hmac
+import csv
+
+
+from .models import Exercise, Workout, WorkoutSet, CardioSet, PasswordResetCode, Profile, Job
+from . import jobs
+from . import activity
+from . import archive
+from . import authentication
+from . import batch
+from . import deletion
+from . import export
+from . import importer
+from . import previous
+from . import push
+from . import records
+from . import idempotency
+from . import sharding
+from . import summaries
+from . import trends
+from .idempotency import IdempotentWritesMixin
+from .push import PushChangesMixin
+from .throttling import AUTH_THROTTLES
 from django.db import IntegrityError
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ValidationError, PermissionDenied, NotAuthenticated
 from .serializers import (
     ExerciseSerializer,
     WorkoutSerializer,
@@ -31,19 +59,20 @@ from .serializers import (
 
 # Simple function-based view alias for public config, if needed by older
 # URL patterns. It returns the same payload as PublicConfigView.
-from rest_framework.decorators import api_view, permission_classes as drf_permission_classes
+from rest_framework.decorators import action, api_view, permission_classes as drf_permission_classes
 import logging
 
 @api_view(["GET"])
 @drf_permission_classes([permissions.AllowAny])
 def public_config(request):
-    web_id = getattr(settings, "GOOGLE_CLIENT_ID_WEB", "")
-    android_id = getattr(settings, "GOOGLE_CLIENT_ID_ANDROID", "")
+    return Response(_public_config_payload())
+
 
-    return Response({
-        "google_client_id_web": web_id,
-        "google_client_id_android": android_id,
-    })
+def _public_config_payload() -> dict:
+    return {
+        "google_client_id_web": getattr(settings, "GOOGLE_CLIENT_ID_WEB", ""),
+        "google_client_id_android": getattr(settings, "GOOGLE_CLIENT_ID_ANDROID", ""),
+    }
 
 
 def health_check(request):
@@ -74,10 +103,65 @@ def debug_echo_auth(request):
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return getattr(obj, "owner", None) == request.user
+
+
+class ArchivedHistoryMixin:
+    """Serve the user's archived years (see workouts.archive) alongside live rows.
+
+    Lists append archived rows after the live ones (honouring the
+    `archive_filters` query params), a GET of an archived id returns the
+    archived row, and a write touching an archived workout or set moves
+    its year back into the live tables first.
+    """
+
+    archive_entity = None
+    archive_filters = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in permissions.SAFE_METHODS or self.archive_entity == "workouts":
+            return
+        # A set being added to, or moved into, an archived workout.
+        ref = request.data.get("workout") if hasattr(request.data, "get") else None
+        if isinstance(ref, int) or (isinstance(ref, str) and ref.isdigit()):
+            archive.rehydrate_ids(request.user.pk, "workouts", [ref])
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            pk = str(self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, ""))
+            if not pk.isdigit():
+                raise
+            user = self.request.user
+            if self.request.method not in permissions.SAFE_METHODS:
+                if archive.rehydrate_ids(user.pk, self.archive_entity, [pk]):
+                    return super().get_object()
+                raise
+            found = archive.archived(user.pk, self.archive_entity, ids=[int(pk)])
+            if not found:
+                raise
+            found[0].owner = user
+            return found[0]
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        filters = {}
+        for name in self.archive_filters:
+            try:
+                filters[f"{name}_id"] = int(request.query_params.get(name, ""))
+            except ValueError:
+                pass
+        archived = archive.archived(request.user.pk, self.archive_entity, **filters)
+        if archived:
+            response.data = [*response.data, *self.get_serializer(archived, many=True).data]
+        return response
+
     
-class ExerciseViewSet(viewsets.ModelViewSet):
+class ExerciseViewSet(PushChangesMixin, IdempotentWritesMixin, viewsets.ModelViewSet):
     serializer_class = ExerciseSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwner]
+    push_entity = "exercises"
     
     def get_queryset(self):
         return Exercise.objects.filter(owner=self.request.user)
@@ -88,23 +172,93 @@ class ExerciseViewSet(viewsets.ModelViewSet):
         except IntegrityError:
             # Convert DB uniqueness violations into a 400 with a friendly message.
             raise ValidationError({"name": "You already have an exercise with that name."})
-        
-class WorkoutViewSet(viewsets.ModelViewSet):
+
+    def perform_destroy(self, instance):
+        # Set-based, batched delete instead of the Collector loading every set.
+        deletion.delete_exercise(instance)
+
+    @action(detail=False, methods=["get"], url_path="previous")
+    def previous(self, request):
+        """Sets from the last `?sessions=` (default 1) workouts of each exercise in `?ids=1,2,3`.
+
+        Returns one entry per requested exercise, in request order, with its
+        sessions newest first; see `workouts.previous`.
+        """
+        params = request.query_params
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in params.get("ids", "").split(",") if pk.strip()))
+        except ValueError:
+            raise ValidationError({"ids": "Must be a comma-separated list of exercise ids."})
+        if not ids:
+            raise ValidationError({"ids": "This parameter is required."})
+        if len(ids) > previous.MAX_EXERCISES:
+            raise ValidationError({"ids": f"At most {previous.MAX_EXERCISES} exercises per request."})
+        try:
+            sessions = int(params.get("sessions", previous.DEFAULT_SESSIONS))
+        except ValueError:
+            raise ValidationError({"sessions": "Must be an integer."})
+        sessions = max(1, min(sessions, previous.MAX_SESSIONS))
+
+        found = previous.previous_sessions(request.user, ids, sessions)
+        context = self.get_serializer_context()
+        return Response([
+            {
+                "exercise": pk,
+                "sessions": [
+                    {
+                        "workout": session["workout"],
+                        "date": session["date"],
+                        "sets": WorkoutSetSerializer(session["sets"], many=True, context=context).data,
+                        "cardio_sets": CardioSetSerializer(session["cardio_sets"], many=True, context=context).data,
+                    }
+                    for session in found[pk]
+                ],
+            }
+            for pk in ids
+        ])
+
+    @action(detail=True, methods=["get"], url_path="cardio-trends")
+    def cardio_trends(self, request, pk=None):
+        """Derived cardio metric series, downsampled to `?points=` (LTTB)."""
+        exercise = self.get_object()
+        params = request.query_params
+        metric = params.get("metric", "distance")
+        if metric not in trends.METRICS:
+            raise ValidationError({"metric": f"Must be one of: {', '.join(trends.METRICS)}."})
+        mode = params.get("mode") or None
+        if mode is not None and mode not in dict(CardioSet.CARDIO_MODE_CHOICES):
+            raise ValidationError({"mode": f"Must be one of: {', '.join(dict(CardioSet.CARDIO_MODE_CHOICES))}."})
+        try:
+            points = int(params.get("points", trends.DEFAULT_POINTS))
+        except ValueError:
+            raise ValidationError({"points": "Must be an integer."})
+        points = max(trends.MIN_POINTS, min(points, trends.MAX_POINTS))
+        return Response(trends.cardio_trend(request.user, exercise.pk, metric, mode=mode, points=points))
+
+class WorkoutViewSet(PushChangesMixin, ArchivedHistoryMixin, IdempotentWritesMixin, viewsets.ModelViewSet):
     serializer_class = WorkoutSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwner]
+    archive_entity = "workouts"
+    push_entity = "workouts"
     
     def get_queryset(self):
         return Workout.objects.filter(owner=self.request.user)
     
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
-        
-class WorkoutSetViewSet(viewsets.ModelViewSet):
+
+    def perform_destroy(self, instance):
+        deletion.delete_workouts(Workout.objects.filter(pk=instance.pk))
+
+class WorkoutSetViewSet(PushChangesMixin, ArchivedHistoryMixin, IdempotentWritesMixin, viewsets.ModelViewSet):
     serializer_class = WorkoutSetSerializer
     permission_classes = [permissions.IsAuthenticated]
+    archive_entity = "sets"
+    archive_filters = ("workout",)
+    push_entity = "sets"
     
     def get_queryset(self):
-        qs = WorkoutSet.objects.filter(workout__owner=self.request.user)
+        qs = WorkoutSet.objects.filter(owner=self.request.user)
         workout_id = self.request.query_params.get("workout")
         if workout_id:
             try:
@@ -129,14 +283,22 @@ class WorkoutSetViewSet(viewsets.ModelViewSet):
             logger.exception("Unhandled error creating WorkoutSet")
             return Response({"detail": "Server error while creating set."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def perform_destroy(self, instance):
+        with sharding.atomic():
+            instance.delete()
+            summaries.refresh(instance.workout_id)
 
 
-class CardioSetViewSet(viewsets.ModelViewSet):
+
+class CardioSetViewSet(PushChangesMixin, ArchivedHistoryMixin, IdempotentWritesMixin, viewsets.ModelViewSet):
     serializer_class = CardioSetSerializer
     permission_classes = [permissions.IsAuthenticated]
+    archive_entity = "cardio_sets"
+    archive_filters = ("workout", "exercise")
+    push_entity = "cardio_sets"
 
     def get_queryset(self):
-        qs = CardioSet.objects.filter(workout__owner=self.request.user)
+        qs = CardioSet.objects.filter(owner=self.request.user)
         workout_id = self.request.query_params.get("workout")
         if workout_id:
             try:
@@ -153,9 +315,21 @@ class CardioSetViewSet(viewsets.ModelViewSet):
                 pass
         return qs
 
+    def perform_destroy(self, instance):
+        with sharding.atomic():
+            instance.delete()
+            summaries.refresh(instance.workout_id)
+
+class LoginView(ObtainAuthToken):
+    """DRF's token login, throttled before the password is hashed."""
+
+    throttle_classes = AUTH_THROTTLES
+
+
 class RegisterView(generics.CreateAPIView):
     serializer_class= RegisterSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = AUTH_THROTTLES
 
 
 class AccountSettingsView(generics.UpdateAPIView):
@@ -167,6 +341,8 @@ class AccountSettingsView(generics.UpdateAPIView):
 
     serializer_class = AccountUpdateSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # PATCH verifies the current password; DELETE isn't throttled.
+    throttle_classes = AUTH_THROTTLES
 
     def get_object(self):
         return self.request.user
@@ -178,7 +354,15 @@ class AccountSettingsView(generics.UpdateAPIView):
             Token.objects.filter(user=user).delete()
         except Exception:
             pass
-        user.delete()
+        # Cascading over a user's whole history can take a while, so lock the
+        # account out now and let the background worker do the actual delete.
+        # Free the username and email right away so they can sign up again.
+        user.is_active = False
+        user.username = f"deleted-{user.pk}-{secrets.token_hex(6)}"
+        user.email = ""
+        user.set_unusable_password()
+        user.save(update_fields=["is_active", "username", "email", "password"])
+        jobs.enqueue("delete_user", {"user_id": user.pk}, priority=Job.PRIORITY_LOW)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -200,7 +384,7 @@ class PasswordResetRequestView(APIView):
             return Response({"detail": "Email is required"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            user = User.objects.get(email__iexact=email)
+            user = User.objects.get(email__iexact=email, is_active=True)
         except User.DoesNotExist:
             # Don't leak whether the email exists; respond generically.
             return Response({"detail": "If an account exists, an OTP has been sent."})
@@ -209,25 +393,11 @@ class PasswordResetRequestView(APIView):
         PasswordResetCode.objects.filter(user=user, is_used=False).update(is_used=True)
 
         code = f"{random.randint(100000, 999999)}"
-        PasswordResetCode.objects.create(user=user, code=code)
-
-        # Try sending the OTP via email. If email settings are misconfigured,
-        # we don't want the whole flow to break, so we catch errors.
-        subject = "Your Strengthy password reset code"
-        message = (
-            "Hi,\n\n"
-            "You requested to reset your Strengthy password.\n\n"
-            f"Your one-time code is: {code}\n\n"
-            "This code will expire in about 30 minutes. If you didn't request this, you can ignore this email.\n\n"
-            "- The Strengthy Team"
-        )
-        from_email = getattr(settings, "DEFAULT_FROM_EMAIL", None) or getattr(settings, "EMAIL_HOST_USER", None)
-        try:
-            if from_email:
-                send_mail(subject, message, from_email, [user.email], fail_silently=True)
-        except Exception:
-            # Silent fail; the API response will still be generic either way.
-            pass
+        code_obj = PasswordResetCode.objects.create(user=user, code=code)
+
+        # Email delivery happens in the background worker so a slow or
+        # misconfigured SMTP server doesn't hold up the response.
+        jobs.enqueue("send_password_reset_email", {"code_id": code_obj.pk}, priority=Job.PRIORITY_HIGH)
 
         payload = {"detail": "If an account exists, an OTP has been sent."}
         # In DEBUG, include the code in the response to make testing easy
@@ -241,6 +411,7 @@ class PasswordResetConfirmView(APIView):
     """Confirm an OTP and set a new password for the user."""
 
     permission_classes = [permissions.AllowAny]
+    throttle_classes = AUTH_THROTTLES
 
     def post(self, request, *args, **kwargs):
         email = request.data.get("email", "").strip().lower()
@@ -254,12 +425,13 @@ class PasswordResetConfirmView(APIView):
             )
 
         try:
-            user = User.objects.get(email__iexact=email)
+            user = User.objects.get(email__iexact=email, is_active=True)
         except User.DoesNotExist:
             return Response({"detail": "Invalid OTP or email."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Accept codes from the last 30 minutes
-        cutoff = timezone.now() - timezone.timedelta(minutes=30)
+        # Accept codes from the last PASSWORD_RESET_CODE_TTL_MINUTES (30 by default)
+        ttl = getattr(settings, "PASSWORD_RESET_CODE_TTL_MINUTES", 30)
+        cutoff = timezone.now() - timezone.timedelta(minutes=ttl)
         try:
             code_obj = (
                 PasswordResetCode.objects.filter(
@@ -297,11 +469,256 @@ class ProfileView(generics.RetrieveUpdateAPIView):
 
     def get_object(self):
         user = self.request.user
-        # Ensure a Profile exists
+        if self.request.method in permissions.SAFE_METHODS:
+            # Reads shouldn't write: serve an unsaved blank profile until
+            # the first PATCH creates the row.
+            return Profile.objects.filter(user=user).first() or Profile(user=user)
         profile, _ = Profile.objects.get_or_create(user=user)
         return profile
 
 
+class BootstrapView(APIView):
+    """Everything the app needs on launch in one response.
+
+    Returns public config, the profile, the exercise catalog and the most
+    recent workouts (with their summary columns, `?workouts=` of them,
+    default 20, max 100). Built with one query per section regardless of
+    account size, and never writes. The body is hashed into a strong ETag
+    so a relaunch with `If-None-Match` gets a bodiless 304.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    DEFAULT_WORKOUTS = 20
+    MAX_WORKOUTS = 100
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        try:
+            limit = int(request.query_params.get("workouts", self.DEFAULT_WORKOUTS))
+        except ValueError:
+            raise ValidationError({"workouts": "Must be an integer."})
+        limit = max(0, min(limit, self.MAX_WORKOUTS))
+
+        profile = Profile.objects.filter(user=user).first() or Profile(user=user)
+        payload = {
+            "config": _public_config_payload(),
+            "user": {"id": user.pk, "username": user.username, "email": user.email},
+            "profile": ProfileSerializer(profile).data,
+            "exercises": ExerciseSerializer(Exercise.objects.filter(owner=user).order_by("name"), many=True).data,
+            "workouts": WorkoutSerializer(Workout.objects.filter(owner=user)[:limit], many=True).data,
+        }
+        body = JSONRenderer().render(payload)
+        etag = quote_etag(hashlib.sha256(body).hexdigest()[:32])
+
+        response = get_conditional_response(request, etag=etag) or HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        # Per-user data: browsers may keep it but must revalidate, shared caches mustn't.
+        response["Cache-Control"] = "private, no-cache"
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
+
+class CalendarView(APIView):
+    """Workouts per day for the activity calendar, plus monthly-goal progress.
+
+    Query params `from` and `to` (YYYY-MM-DD, inclusive) may span at most
+    `activity.MAX_DAYS` days. `to` defaults to today and `from` to the
+    start of the year (`activity.DEFAULT_DAYS`) ending at `to`. Only
+    days with workouts appear in `days`; `month` counts this month's
+    workouts so far against `Profile.monthly_workouts`.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def _date(self, name: str):
+        raw = self.request.query_params.get(name)
+        if not raw:
+            return None
+        try:
+            value = parse_date(raw)
+        except ValueError:
+            value = None
+        if value is None:
+            raise ValidationError({name: "Must be a date (YYYY-MM-DD)."})
+        return value
+
+    def get(self, request, *args, **kwargs):
+        end = self._date("to") or timezone.localdate()
+        start = self._date("from") or activity.default_range(end)[0]
+        if start > end:
+            raise ValidationError({"from": "Must not be after `to`."})
+        if (end - start).days >= activity.MAX_DAYS:
+            raise ValidationError({"from": f"The range may span at most {activity.MAX_DAYS} days."})
+        return Response(activity.calendar(request.user, start, end))
+
+
+class RecordsView(APIView):
+    """Every exercise's all-time records and latest PR date; see `workouts.records`."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return Response(records.board(request.user))
+
+
+class ExportDataView(APIView):
+    """Stream a user's data as NDJSON (default) or CSV.
+
+    Authenticated users export their own data. Admin one-offs can instead
+    send an `X-Export-Secret` header matching `settings.EXPORT_SECRET` and
+    pick the account with `?user=<id or username>`.
+
+    Query params:
+      fmt     `ndjson` (every entity, one JSON object per line tagged with
+              `type`) or `csv` (a single entity).
+      entity  one of profile, exercises, workouts, sets, cardio_sets.
+              Required shape for CSV (default `sets`); narrows NDJSON.
+      gzip    `1` to gzip the stream on the fly.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def _export_user(self, request):
+        secret = getattr(settings, "EXPORT_SECRET", None)
+        provided = request.headers.get("X-Export-Secret", "")
+        if secret and provided and hmac.compare_digest(provided, secret):
+            ident = (request.query_params.get("user") or "").strip()
+            if not ident:
+                raise ValidationError({"user": "user is required when exporting with the export secret."})
+            lookup = {"pk": ident} if ident.isdigit() else {"username": ident}
+            try:
+                return User.objects.get(**lookup)
+            except User.DoesNotExist:
+                raise ValidationError({"user": "No such user."})
+        if provided:
+            raise PermissionDenied("Invalid export secret.")
+        if not request.user or not request.user.is_authenticated:
+            raise NotAuthenticated()
+        return request.user
+
+    def get(self, request, *args, **kwargs):
+        user = self._export_user(request)
+        fmt = (request.query_params.get("fmt") or "ndjson").lower()
+        entity = request.query_params.get("entity")
+        if entity and entity not in export.ENTITIES:
+            raise ValidationError({"entity": f"Must be one of: {', '.join(export.ENTITIES)}."})
+
+        if fmt == "csv":
+            entity = entity or "sets"
+            chunks = export.csv_chunks(user, entity)
+            content_type, filename = "text/csv", f"strengthy-{user.username}-{entity}.csv"
+        elif fmt == "ndjson":
+            chunks = export.ndjson_chunks(user, [entity] if entity else export.ENTITIES)
+            content_type, filename = "application/x-ndjson", f"strengthy-{user.username}.ndjson"
+        else:
+            raise ValidationError({"fmt": "Must be ndjson or csv."})
+
+        if request.query_params.get("gzip") in {"1", "true"}:
+            chunks = export.gzip_chunks(chunks)
+            content_type, filename = "application/gzip", filename + ".gz"
+
+        # The body is generated after this view returns; keep reading from
+        # the exported user's shard (not necessarily the caller's).
+        chunks = sharding.bind(chunks, sharding.lookup(user.pk)[0])
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        response["Cache-Control"] = "no-store"
+        return response
+
+
+class ImportHistoryView(APIView):
+    """Import workout history from an uploaded CSV or NDJSON file.
+
+    POST multipart with `file` (optionally gzipped) and optional `fmt`
+    (`csv` or `ndjson`; inferred from the file name otherwise). The import
+    is all-or-nothing and returns counts plus any skipped-row errors. See
+    `workouts/importer.py` for the accepted columns.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "A file upload is required."})
+        fmt = (request.data.get("fmt") or "").lower()
+        if not fmt:
+            name = upload.name.lower().removesuffix(".gz")
+            fmt = "csv" if name.endswith(".csv") else "ndjson"
+        try:
+            result = importer.import_history(request.user, upload.file, fmt)
+        except importer.ImportFormatError as exc:
+            raise ValidationError({"fmt": str(exc)})
+        except (UnicodeDecodeError, OSError, csv.Error) as exc:
+            raise ValidationError({"file": f"Could not read file: {exc}"})
+        return Response(result.as_dict(), status=status.HTTP_201_CREATED)
+
+
+class BatchView(APIView):
+    """Apply an ordered list of create/update/delete operations atomically.
+
+    POST {"operations": [...]}; see `workouts/batch.py` for the operation
+    format and temp-id references. Returns 200 with one result per
+    operation, or the failing operation's status (400/404) with its errors
+    and every other operation marked 424 after the batch is rolled back.
+    Honours `Idempotency-Key` like the viewsets.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        return idempotency.run(request, lambda: self._execute(request))
+
+    def _execute(self, request):
+        operations = request.data.get("operations") if isinstance(request.data, dict) else None
+        try:
+            result = batch.Batch(request, operations).execute()
+        except batch.OperationFailed as exc:
+            count = len(operations) if isinstance(operations, list) else 0
+            return Response(exc.response_data(count), status=exc.status_code)
+        push.batch_changed(request.user.pk, operations, result["results"])
+        return Response(result)
+
+
+def _push_user(request):
+    """The active user behind an `Authorization: Token` header or `?token=`.
+
+    EventSource can't set headers, so browsers pass the token in the URL.
+    """
+    header = request.headers.get("Authorization", "")
+    key = header[len("Token "):].strip() if header.startswith("Token ") else request.GET.get("token", "")
+    if not key:
+        return None
+    token = Token.objects.select_related("user", "usage").filter(key=key).first()
+    if token is None or not token.user.is_active:
+        return None
+    authentication.record_use(token)
+    return token.user
+
+
+async def push_events(request):
+    """Server-Sent Events stream of the user's data changes; see `workouts.push`.
+
+    Resumes after the `Last-Event-ID` header (or `?last_event_id=`) when
+    the broker still holds those events.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the stream would tie up a worker for as long as it's open.
+        return JsonResponse({"detail": "Push notifications need the ASGI server."}, status=503)
+    user = await push.db_sync_to_async(_push_user)(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    after = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id") or ""
+    response = StreamingHttpResponse(
+        push.stream(user.pk, int(after) if after.isdigit() else None), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-store"
+    # Stop nginx-style proxies from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 class GoogleLoginView(APIView):
     """Exchange a Google ID token for a Strengthy auth token.
 
@@ -347,15 +764,13 @@ class GoogleLoginView(APIView):
             return Response({"detail": "No email found in token."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Find or create the user
-        try:
-            user = User.objects.get(email__iexact=email)
-            # If the admin has disabled/deactivated this account (is_active=False)
-            # treat it as deleted for the purposes of Google sign-in and create
-            # a fresh user instead of re-using the inactive record.
-            if not getattr(user, "is_active", True):
-                raise User.DoesNotExist()
+        # If the admin has disabled/deactivated this account (is_active=False)
+        # treat it as deleted for the purposes of Google sign-in and create
+        # a fresh user instead of re-using the inactive record.
+        user = User.objects.filter(email__iexact=email, is_active=True).order_by("pk").first()
+        if user is not None:
             created = False
-        except User.DoesNotExist:
+        else:
             # Create a simple user with an unusable password
             base = (email.split("@")[0] or "g_user")[:30]
             username = base
@@ -7,6 +7,7 @@
 
 CREATE TABLE IF NOT EXISTS profiles (
   id bigserial PRIMARY KEY,
+  legacy_id bigint UNIQUE,
   user_id uuid REFERENCES auth.users(id) ON DELETE CASCADE,
   goals jsonb DEFAULT '[]'::jsonb,
   age integer,
@@ -22,6 +23,7 @@ CREATE TABLE IF NOT EXISTS profiles (
 
 CREATE TABLE IF NOT EXISTS exercises (
   id bigserial PRIMARY KEY,
+  legacy_id bigint UNIQUE,
   owner_id uuid REFERENCES auth.users(id) ON DELETE CASCADE,
   name text NOT NULL,
   muscle_group text,
@@ -34,6 +36,7 @@ CREATE TABLE IF NOT EXISTS exercises (
 
 CREATE TABLE IF NOT EXISTS workouts (
   id bigserial PRIMARY KEY,
+  legacy_id bigint UNIQUE,
   owner_id uuid REFERENCES auth.users(id) ON DELETE CASCADE,
   name text,
   date date,
@@ -45,6 +48,7 @@ CREATE TABLE IF NOT EXISTS workouts (
 
 CREATE TABLE IF NOT EXISTS workout_sets (
   id bigserial PRIMARY KEY,
+  legacy_id bigint UNIQUE,
   workout_id bigint REFERENCES workouts(id) ON DELETE CASCADE,
   exercise_id bigint REFERENCES exercises(id) ON DELETE CASCADE,
   set_number integer NOT NULL,
@@ -65,6 +69,7 @@ CREATE TABLE IF NOT EXISTS workout_sets (
 
 CREATE TABLE IF NOT EXISTS cardio_sets (
   id bigserial PRIMARY KEY,
+  legacy_id bigint UNIQUE,
   workout_id bigint REFERENCES workouts(id) ON DELETE CASCADE,
   exercise_id bigint REFERENCES exercises(id) ON DELETE CASCADE,
   set_number integer NOT NULL,
@@ -87,11 +92,22 @@ CREATE TABLE IF NOT EXISTS cardio_sets (
 
 CREATE TABLE IF NOT EXISTS password_reset_codes (
   id bigserial PRIMARY KEY,
+  legacy_id bigint UNIQUE,
   user_id uuid REFERENCES auth.users(id) ON DELETE CASCADE,
   code text NOT NULL,
   is_used boolean DEFAULT false,
   created_at timestamptz DEFAULT now()
 );
 
+-- `legacy_id` is the Django primary key. migrate_to_supabase.py inserts with
+-- `on_conflict=legacy_id`, so a retried batch can't duplicate rows. For tables
+-- created before the column existed:
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS legacy_id bigint UNIQUE;
+ALTER TABLE exercises ADD COLUMN IF NOT EXISTS legacy_id bigint UNIQUE;
+ALTER TABLE workouts ADD COLUMN IF NOT EXISTS legacy_id bigint UNIQUE;
+ALTER TABLE workout_sets ADD COLUMN IF NOT EXISTS legacy_id bigint UNIQUE;
+ALTER TABLE cardio_sets ADD COLUMN IF NOT EXISTS legacy_id bigint UNIQUE;
+ALTER TABLE password_reset_codes ADD COLUMN IF NOT EXISTS legacy_id bigint UNIQUE;
+
 -- Indexes
 CREATE INDEX idx_password_reset_user_code ON password_reset_codes(user_id, code, created_at);
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Minimal PostgREST/Supabase stand-in for dry-running `migrate_to_supabase.py` locally.
+
+It implements just what the migration script talks to:
+
+  POST /rest/v1/<table>         insert one object or an array; honours `Prefer: return=representation`
+                                and `?on_conflict=<column>` with `Prefer: resolution=ignore-duplicates`
+  GET  /rest/v1/<table>         `select=a,b` and `<column>=in.(1,2,...)` filters
+  POST /auth/v1/admin/users     create an auth user, returns {"id": <uuid>, "email": ...}
+  GET  /auth/v1/admin/users     list auth users (`page`, `per_page`)
+  GET  /stats                   row counts per table and request counters
+
+Rows are kept in memory and get sequential `id`s per table, in request order, like a bigserial column.
+`--fail-rate 0.1` answers that fraction of POSTs with a random 429/503 to exercise the retry path.
+`--lost-rate 0.1` stores that fraction of REST inserts but still answers 503, like a response lost
+after the insert committed.
+
+Usage:
+    python supabase_migration/fake_postgrest.py --port 54321
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_SERVICE_ROLE=dummy \\
+        python supabase_migration/migrate_to_supabase.py --create-users
+"""
+
+import argparse
+import json
+import random
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+LOCK = threading.Lock()
+TABLES = {}
+NEXT_ID = {}
+REQUESTS = {'rest': 0, 'auth': 0, 'failed': 0, 'lost': 0}
+FAIL_RATE = 0.0
+LOST_RATE = 0.0
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status, body=None):
+        data = json.dumps(body).encode('utf8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'null')
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/auth/v1/admin/users':
+            query = parse_qs(url.query)
+            page = int(query.get('page', ['1'])[0])
+            per_page = int(query.get('per_page', ['50'])[0])
+            with LOCK:
+                users = TABLES.get('auth.users', [])[(page - 1) * per_page:page * per_page]
+            self._send(200, {'users': users})
+            return
+        if url.path.startswith('/rest/v1/'):
+            table = url.path[len('/rest/v1/'):]
+            query = parse_qs(url.query)
+            columns = query.pop('select', ['*'])[0].split(',')
+            filters = {}
+            for column, (value,) in query.items():
+                if not value.startswith('in.('):
+                    self._send(400, {'message': f'unsupported filter {column}={value}'})
+                    return
+                filters[column] = set(value[len('in.('):-1].split(','))
+            with LOCK:
+                rows = [
+                    row if columns == ['*'] else {c: row.get(c) for c in columns}
+                    for row in TABLES.get(table, [])
+                    if all(str(row.get(c)) in values for c, values in filters.items())
+                ]
+            self._send(200, rows)
+            return
+        if self.path == '/stats':
+            with LOCK:
+                self._send(200, {'tables': {t: len(rows) for t, rows in TABLES.items()}, 'requests': dict(REQUESTS)})
+            return
+        self._send(404, {'message': 'not found'})
+
+    def do_POST(self):
+        if not self.headers.get('apikey'):
+            self._send(401, {'message': 'missing apikey'})
+            return
+
+        if FAIL_RATE and random.random() < FAIL_RATE:
+            self._read_json()
+            with LOCK:
+                REQUESTS['failed'] += 1
+            self._send(random.choice([429, 503]), {'message': 'injected failure'})
+            return
+
+        if self.path.startswith('/auth/v1/admin/users'):
+            body = self._read_json() or {}
+            with LOCK:
+                REQUESTS['auth'] += 1
+                users = TABLES.setdefault('auth.users', [])
+                if any(u['email'] == body.get('email') for u in users):
+                    self._send(422, {'msg': 'A user with this email address has already been registered'})
+                    return
+                user = {'id': str(uuid.uuid4()), 'email': body.get('email')}
+                users.append(user)
+            self._send(200, user)
+            return
+
+        if self.path.startswith('/rest/v1/'):
+            url = urlparse(self.path)
+            table = url.path[len('/rest/v1/'):]
+            on_conflict = parse_qs(url.query).get('on_conflict', [None])[0]
+            prefer = self.headers.get('Prefer') or ''
+            body = self._read_json()
+            rows = body if isinstance(body, list) else [body]
+            with LOCK:
+                REQUESTS['rest'] += 1
+                stored = TABLES.setdefault(table, [])
+                taken = {row.get(on_conflict) for row in stored} if on_conflict else set()
+                if on_conflict and 'resolution=ignore-duplicates' not in prefer and any(
+                    r.get(on_conflict) in taken for r in rows
+                ):
+                    self._send(409, {'message': f'duplicate key value violates unique constraint on {on_conflict}'})
+                    return
+                out = []
+                for row in rows:
+                    if on_conflict and row.get(on_conflict) in taken:
+                        continue
+                    NEXT_ID[table] = NEXT_ID.get(table, 0) + 1
+                    row = dict(row, id=NEXT_ID[table])
+                    stored.append(row)
+                    out.append(row)
+                    if on_conflict:
+                        taken.add(row.get(on_conflict))
+                if LOST_RATE and random.random() < LOST_RATE:
+                    REQUESTS['lost'] += 1
+                    out = None
+            if out is None:
+                self._send(503, {'message': 'injected lost response'})
+            elif 'return=representation' in prefer:
+                self._send(201, out)
+            else:
+                self._send(201)
+            return
+
+        self._send(404, {'message': 'not found'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='In-memory PostgREST stand-in for migration dry runs.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of POSTs to fail with 429/503.')
+    parser.add_argument('--lost-rate', type=float, default=0.0,
+                        help='Fraction of REST inserts to store but answer with 503.')
+    args = parser.parse_args()
+    global FAIL_RATE, LOST_RATE
+    FAIL_RATE = args.fail_rate
+    LOST_RATE = args.lost_rate
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f'Fake PostgREST listening on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -11,10 +11,23 @@ Usage:
 Options:
   --create-users   Create Supabase auth users from Django users (generates random password).
   --skip-users     Assume Supabase users already exist and provide a JSON mapping file `user_id_map.json`.
+  --batch-size N   Rows per REST insert request (default 500, or $MIGRATION_BATCH_SIZE).
+  --chunk-size N   Rows fetched per database round trip while streaming (default 2000).
+  --user-concurrency N  Auth users created in parallel with --create-users (default 8).
+  --checkpoint PATH     Id-map log for resuming (default supabase_migration_checkpoint.jsonl).
 
 Notes:
   - This script uses the Supabase service role key. Keep it secret and run locally or on a secure server.
   - It inserts parent rows first and records ID mappings so child rows reference the correct new ids.
+  - Rows are streamed from the database and sent in batches over one pooled HTTP session.
+  - 429/5xx responses are retried with backoff. Every inserted batch is appended to the checkpoint
+    file, so after a failure rerunning the same command skips finished rows and carries on. Delete
+    the checkpoint to start over against a fresh project.
+  - Each row carries its Django id as `legacy_id` (see ddl.sql) and batches are inserted with
+    `on_conflict=legacy_id`, so a batch that landed but whose response was lost (timeout, 5xx
+    from a proxy) isn't duplicated when it's retried or rerun.
+  - To try it without Supabase, run `python supabase_migration/fake_postgrest.py` and point
+    SUPABASE_URL at it (any SUPABASE_SERVICE_ROLE value works).
   - Test on a staging Supabase project first.
 """
 
@@ -24,9 +37,13 @@ import json
 import random
 import string
 import time
-from typing import Dict, Any
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List
 
 import requests
+from requests.adapters import HTTPAdapter
 
 # Setup Django environment
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'strenghty_backend.settings')
@@ -58,20 +75,211 @@ def randpass(n=20):
     return ''.join(random.choice(alphabet) for _ in range(n))
 
 
-def post_rest(table: str, payload: Any, prefer_return=False):
+def _make_session():
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    # One keep-alive connection pool for every request instead of a new
+    # TCP/TLS handshake per row.
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+SESSION = _make_session()
+
+
+class MigrationError(Exception):
+    """A request failed for good; the checkpoint lets a rerun resume from here."""
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def request_with_retry(method: str, url: str, max_attempts: int = 6, **kwargs):
+    """Send a request, retrying 429/5xx responses and connection errors with backoff.
+
+    Honours `Retry-After` when the server sends one, otherwise waits
+    0.5s, 1s, 2s, ... (capped at 30s) plus jitter.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            r = SESSION.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            if attempt == max_attempts:
+                raise MigrationError(f'{method} {url} failed: {exc}') from exc
+            r = None
+        if r is not None and r.status_code not in RETRY_STATUSES:
+            return r
+        if attempt == max_attempts:
+            return r
+        retry_after = r.headers.get('Retry-After') if r is not None else None
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = min(0.5 * 2 ** (attempt - 1), 30) + random.uniform(0, 0.25)
+        time.sleep(delay)
+
+
+def post_rest(table: str, payload: Any, prefer_return=False, on_conflict: str = None):
+    """Insert `payload` into `table`.
+
+    With `on_conflict`, rows whose value in that unique column already
+    exists are skipped rather than inserted again or failing the batch,
+    so a retry after a lost response is harmless. Only the rows actually
+    inserted come back with `prefer_return`.
+    """
     url = SUPABASE_URL.rstrip('/') + f'/rest/v1/{table}'
-    headers = dict(HEADERS)
+    prefer = []
+    params = {}
     if prefer_return:
-        headers['Prefer'] = 'return=representation'
-    r = requests.post(url, headers=headers, data=json.dumps(payload))
+        prefer.append('return=representation')
+    if on_conflict:
+        prefer.append('resolution=ignore-duplicates')
+        params['on_conflict'] = on_conflict
+    headers = {'Prefer': ','.join(prefer)} if prefer else {}
+    r = request_with_retry('POST', url, params=params, headers=headers, data=json.dumps(payload), timeout=120)
     if not r.ok:
-        print(f'ERROR inserting into {table}:', r.status_code, r.text)
-        raise SystemExit(1)
-    return r.json()
+        raise MigrationError(f'inserting into {table} failed: {r.status_code} {r.text}')
+    return r.json() if prefer_return else None
+
+
+def fetch_legacy_ids(table: str, legacy_ids: List[int]) -> Dict[int, Any]:
+    """{legacy_id: id} for the given rows of `table` that already exist."""
+    url = SUPABASE_URL.rstrip('/') + f'/rest/v1/{table}'
+    params = {'select': 'id,legacy_id', 'legacy_id': f'in.({",".join(map(str, legacy_ids))})'}
+    r = request_with_retry('GET', url, params=params, timeout=60)
+    if not r.ok:
+        raise MigrationError(f'reading back {table} failed: {r.status_code} {r.text}')
+    return {row['legacy_id']: row['id'] for row in r.json()}
+
+
+class Checkpoint:
+    """Append-only log of {django_id: supabase_id} mappings per table.
+
+    Each inserted batch (or created user) is appended as one JSON line and
+    flushed to disk before the script moves on, so a crash loses at most the
+    batch in flight. On startup the log is replayed into `maps`, and
+    `migrate_table` skips every row that already has a mapping, which makes
+    reruns resume where the last run stopped instead of duplicating data.
+    """
+
+    TABLES = ('users', 'profiles', 'exercises', 'workouts', 'workout_sets', 'cardio_sets', 'password_reset_codes')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.maps: Dict[str, Dict[int, Any]] = {t: {} for t in self.TABLES}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-write; that batch is redone.
+                        continue
+                    self.maps.setdefault(entry['t'], {}).update({int(k): v for k, v in entry['m']})
+        self._file = open(path, 'a', encoding='utf8')
+
+    def record(self, table: str, pairs):
+        pairs = list(pairs)
+        if not pairs:
+            return
+        with self._lock:
+            self.maps[table].update(pairs)
+            self._file.write(json.dumps({'t': table, 'm': pairs}) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def migrate_table(table: str, queryset, to_payload, checkpoint: Checkpoint, batch_size: int, chunk_size: int,
+                  stats: list) -> Dict[int, Any]:
+    """Stream `queryset` into `table` in batches of `batch_size` rows.
+
+    Rows are read with a server-side cursor (`iterator(chunk_size=...)`) so
+    memory stays flat however large the table is. Each row is sent with its
+    Django primary key as `legacy_id`, which maps the returned ids back and
+    makes the insert idempotent: rows an earlier attempt already inserted
+    are skipped by the server and their ids read back instead. The batch's
+    mappings are then checkpointed. Rows already in the checkpoint are
+    skipped. Returns {django_id: new_id}.
+    """
+    print(f'Migrating {table}...')
+    id_map = checkpoint.maps[table]
+    already = len(id_map)
+    pks: List[int] = []
+    batch: List[dict] = []
+    count = 0
+    started = time.monotonic()
+
+    def flush():
+        nonlocal count
+        if not batch:
+            return
+        resp = post_rest(table, batch, prefer_return=True, on_conflict='legacy_id')
+        new_ids = {row['legacy_id']: row.get('id') for row in resp}
+        landed = [pk for pk in pks if pk not in new_ids]
+        if landed:
+            # Inserted by an attempt whose response never arrived.
+            new_ids.update(fetch_legacy_ids(table, landed))
+        missing = [pk for pk in pks if pk not in new_ids]
+        if missing:
+            raise MigrationError(f'{table} has no rows for Django ids {missing[:10]} after inserting them')
+        checkpoint.record(table, [(pk, new_ids[pk]) for pk in pks])
+        count += len(batch)
+        pks.clear()
+        batch.clear()
+
+    for obj in queryset.order_by('pk').iterator(chunk_size=chunk_size):
+        if obj.pk in id_map:
+            continue
+        pks.append(obj.pk)
+        batch.append({**to_payload(obj), 'legacy_id': obj.pk})
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    elapsed = time.monotonic() - started
+    stats.append((table, count, elapsed))
+    skipped = f', {already} already done' if already else ''
+    print(f'  {table}: {count} rows in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} rows/s{skipped})')
+    return id_map
+
+
+_existing_users: Dict[str, str] = {}
+_existing_users_lock = threading.Lock()
+
+
+def find_supabase_user(email: str):
+    """Look up an existing auth user's id by email via the paginated admin list."""
+    with _existing_users_lock:
+        if not _existing_users:
+            url = SUPABASE_URL.rstrip('/') + '/auth/v1/admin/users'
+            page = 1
+            while True:
+                r = request_with_retry('GET', url, params={'page': page, 'per_page': 1000}, timeout=60)
+                if not r.ok:
+                    raise MigrationError(f'listing supabase users failed: {r.status_code} {r.text}')
+                body = r.json()
+                users = body.get('users', []) if isinstance(body, dict) else body
+                for u in users:
+                    if u.get('email'):
+                        _existing_users[u['email'].lower()] = u['id']
+                if len(users) < 1000:
+                    break
+                page += 1
+        return _existing_users.get(email.lower())
 
 
 def create_supabase_user(email: str, password: str = None):
-    """Create a Supabase Auth user via the Admin API. Returns the user object (including `id`)."""
+    """Create a Supabase Auth user via the Admin API. Returns the user object (including `id`).
+
+    If the email is already registered (e.g. the previous run created the
+    user but died before checkpointing it), the existing user is returned.
+    """
     url = SUPABASE_URL.rstrip('/') + '/auth/v1/admin/users'
     pwd = password or randpass()
     body = {
@@ -79,66 +287,71 @@ def create_supabase_user(email: str, password: str = None):
         'password': pwd,
         'email_confirm': True,
     }
-    r = requests.post(url, headers={'apikey': SERVICE_ROLE, 'Authorization': f'Bearer {SERVICE_ROLE}', 'Content-Type': 'application/json'}, data=json.dumps(body))
+    r = request_with_retry('POST', url, data=json.dumps(body), timeout=30)
+    if r.status_code == 422 and 'already' in r.text:
+        existing = find_supabase_user(email)
+        if existing:
+            return {'id': existing, 'email': email}
     if not r.ok:
-        print('Failed creating supabase user', email, r.status_code, r.text)
-        raise SystemExit(1)
+        raise MigrationError(f'creating supabase user {email} failed: {r.status_code} {r.text}')
     return r.json()
 
 
-def main():
-    args = sys.argv[1:]
-    create_users = '--create-users' in args
-    skip_users = '--skip-users' in args
+def provision_users(checkpoint: Checkpoint, concurrency: int):
+    """Create auth users for every Django user missing from the checkpoint, `concurrency` at a time."""
+    user_map = checkpoint.maps['users']
+    pending = [(u.id, u.email) for u in User.objects.order_by('pk').only('id', 'email') if u.id not in user_map]
+    print(f'Creating Supabase Auth users: {len(pending)} to go, {len(user_map)} already done...')
+    started = time.monotonic()
+    failures = []
 
-    user_map: Dict[int, str] = {}
+    def create(uid, email):
+        email = email or f'user{uid}@example.invalid'
+        su = create_supabase_user(email)
+        # supabase returns id in `id`
+        checkpoint.record('users', [(uid, su.get('id'))])
 
-    # 1) Users
-    if create_users:
-        print('Creating Supabase Auth users for Django users...')
-        for u in User.objects.all():
-            email = getattr(u, 'email', None) or f'user{u.id}@example.invalid'
-            print('Creating user', u.id, email)
-            su = create_supabase_user(email)
-            # supabase returns id in `id`
-            user_map[u.id] = su.get('id')
-            time.sleep(0.05)
-        # dump mapping so you can reuse
-        with open('supabase_user_id_map.json', 'w') as f:
-            json.dump(user_map, f)
-        print('Wrote supabase_user_id_map.json')
-    elif skip_users:
-        # expect a mapping file; tolerate empty or invalid JSON by creating an empty mapping
-        try:
-            with open('supabase_user_id_map.json', 'r', encoding='utf8') as f:
-                try:
-                    user_map = json.load(f)
-                except (json.JSONDecodeError, ValueError):
-                    print('Warning: supabase_user_id_map.json is empty or invalid; using empty mapping')
-                    user_map = {}
-        except FileNotFoundError:
-            print('supabase_user_id_map.json not found; creating empty mapping')
-            user_map = {}
-            with open('supabase_user_id_map.json', 'w', encoding='utf8') as f:
-                json.dump(user_map, f)
-        print('Loaded mapping for', len(user_map), 'users')
-    else:
-        print('No user creation requested. You must ensure Supabase users exist and provide `supabase_user_id_map.json` mapping.')
-        if not os.path.exists('supabase_user_id_map.json'):
-            print('File supabase_user_id_map.json not found. Exiting.')
-            sys.exit(1)
-        with open('supabase_user_id_map.json', 'r') as f:
-            user_map = json.load(f)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(create, uid, email): uid for uid, email in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                future.result()
+            except MigrationError as exc:
+                failures.append((futures[future], exc))
+            if done % 100 == 0:
+                print(f'  {done}/{len(pending)} users')
+
+    elapsed = time.monotonic() - started
+    print(f'  users: {len(pending) - len(failures)} created in {elapsed:.1f}s')
+    if failures:
+        for uid, exc in failures[:10]:
+            print('  Failed user', uid, exc)
+        raise MigrationError(f'{len(failures)} user(s) could not be created')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Copy Strengthy data from Django into Supabase.')
+    parser.add_argument('--create-users', action='store_true', help='Create Supabase auth users from Django users.')
+    parser.add_argument('--skip-users', action='store_true', help='Reuse the ids in supabase_user_id_map.json.')
+    parser.add_argument('--batch-size', type=int, default=int(os.environ.get('MIGRATION_BATCH_SIZE', '500')),
+                        help='Rows per REST insert request (default 500).')
+    parser.add_argument('--chunk-size', type=int, default=2000,
+                        help='Rows fetched per database round trip while streaming (default 2000).')
+    parser.add_argument('--user-concurrency', type=int, default=8,
+                        help='Auth users created in parallel with --create-users (default 8).')
+    parser.add_argument('--checkpoint', default='supabase_migration_checkpoint.jsonl',
+                        help='Id-map log used to resume an interrupted run.')
+    return parser.parse_args(argv)
+
+
+def migrate_data(checkpoint: Checkpoint, user_map: Dict[int, str], batch_size: int, chunk_size: int):
+    """Copy every table after users, parents first so child rows can map their foreign keys."""
+    stats = []
 
     # 2) Profiles -> insert with user_id = mapped uuid
-    print('Migrating profiles...')
-    profile_map = {}
-    for p in Profile.objects.all():
-        uid = user_map.get(p.user_id) if hasattr(p, 'user_id') else None
-        if uid is None:
-            uid = user_map.get(p.user.id) if hasattr(p, 'user') else None
-        payload = {
-            'user_id': uid,
+    def profile_payload(p):
+        return {
+            'user_id': user_map.get(p.user_id),
             'goals': json.dumps(p.goals) if isinstance(p.goals, str) else (p.goals or []),
             'age': p.age,
             'height': str(p.height) if p.height is not None else None,
@@ -147,19 +360,14 @@ def main():
             'goal_weight': str(p.goal_weight) if p.goal_weight is not None else None,
             'experience': p.experience,
             'monthly_workouts': p.monthly_workouts,
-            'created_at': p.created_at.isoformat() if p.created_at else None,
-            'updated_at': p.updated_at.isoformat() if p.updated_at else None,
         }
-        resp = post_rest('profiles', [payload], prefer_return=True)
-        # resp is an array
-        profile_map[p.id] = resp[0].get('id')
-
-    print('Migrating exercises...')
-    exercise_map = {}
-    for e in Exercise.objects.all():
-        owner_uuid = user_map.get(e.owner_id) if hasattr(e, 'owner_id') else user_map.get(e.owner.id)
-        payload = {
-            'owner_id': owner_uuid,
+
+    migrate_table('profiles', Profile.objects.all(), profile_payload, checkpoint,
+                  batch_size, chunk_size, stats)
+
+    def exercise_payload(e):
+        return {
+            'owner_id': user_map.get(e.owner_id),
             'name': e.name,
             'muscle_group': e.muscle_group,
             'description': e.description,
@@ -167,15 +375,13 @@ def main():
             'created_at': e.created_at.isoformat() if e.created_at else None,
             'updated_at': e.created_at.isoformat() if e.created_at else None,
         }
-        resp = post_rest('exercises', [payload], prefer_return=True)
-        exercise_map[e.id] = resp[0].get('id')
-
-    print('Migrating workouts...')
-    workout_map = {}
-    for w in Workout.objects.all():
-        owner_uuid = user_map.get(w.owner_id) if hasattr(w, 'owner_id') else user_map.get(w.owner.id)
-        payload = {
-            'owner_id': owner_uuid,
+
+    exercise_map = migrate_table('exercises', Exercise.objects.all(), exercise_payload, checkpoint,
+                                 batch_size, chunk_size, stats)
+
+    def workout_payload(w):
+        return {
+            'owner_id': user_map.get(w.owner_id),
             'name': w.name,
             'date': w.date.isoformat() if w.date else None,
             'notes': w.notes,
@@ -183,17 +389,14 @@ def main():
             'updated_at': w.updated_at.isoformat() if w.updated_at else None,
             'ended_at': w.ended_at.isoformat() if w.ended_at else None,
         }
-        resp = post_rest('workouts', [payload], prefer_return=True)
-        workout_map[w.id] = resp[0].get('id')
-
-    print('Migrating workout_sets...')
-    set_map = {}
-    for s in WorkoutSet.objects.all():
-        w_new = workout_map.get(s.workout_id)
-        e_new = exercise_map.get(s.exercise_id)
-        payload = {
-            'workout_id': w_new,
-            'exercise_id': e_new,
+
+    workout_map = migrate_table('workouts', Workout.objects.all(), workout_payload, checkpoint,
+                                batch_size, chunk_size, stats)
+
+    def set_payload(s):
+        return {
+            'workout_id': workout_map.get(s.workout_id),
+            'exercise_id': exercise_map.get(s.exercise_id),
             'set_number': s.set_number,
             'reps': s.reps,
             'half_reps': s.half_reps,
@@ -208,17 +411,14 @@ def main():
             'rpe': str(s.rpe) if s.rpe is not None else None,
             'created_at': s.created_at.isoformat() if s.created_at else None,
         }
-        resp = post_rest('workout_sets', [payload], prefer_return=True)
-        set_map[s.id] = resp[0].get('id')
-
-    print('Migrating cardio_sets...')
-    cardio_map = {}
-    for c in CardioSet.objects.all():
-        w_new = workout_map.get(c.workout_id)
-        e_new = exercise_map.get(c.exercise_id)
-        payload = {
-            'workout_id': w_new,
-            'exercise_id': e_new,
+
+    migrate_table('workout_sets', WorkoutSet.objects.all(), set_payload, checkpoint,
+                  batch_size, chunk_size, stats)
+
+    def cardio_payload(c):
+        return {
+            'workout_id': workout_map.get(c.workout_id),
+            'exercise_id': exercise_map.get(c.exercise_id),
             'set_number': c.set_number,
             'mode': c.mode,
             'duration_seconds': c.duration_seconds,
@@ -235,19 +435,79 @@ def main():
             'is_split_pr': c.is_split_pr,
             'created_at': c.created_at.isoformat() if c.created_at else None,
         }
-        resp = post_rest('cardio_sets', [payload], prefer_return=True)
-        cardio_map[c.id] = resp[0].get('id')
-
-    print('Migrating password_reset_codes...')
-    for p in PasswordResetCode.objects.all():
-        uid = user_map.get(p.user_id) if hasattr(p, 'user_id') else user_map.get(p.user.id)
-        payload = {
-            'user_id': uid,
+
+    migrate_table('cardio_sets', CardioSet.objects.all(), cardio_payload, checkpoint,
+                  batch_size, chunk_size, stats)
+
+    def reset_code_payload(p):
+        return {
+            'user_id': user_map.get(p.user_id),
             'code': p.code,
             'is_used': p.is_used,
             'created_at': p.created_at.isoformat() if p.created_at else None,
         }
-        post_rest('password_reset_codes', [payload], prefer_return=False)
+
+    migrate_table('password_reset_codes', PasswordResetCode.objects.all(), reset_code_payload, checkpoint,
+                  batch_size, chunk_size, stats)
+
+    total_rows = sum(n for _, n, _ in stats)
+    total_secs = sum(t for _, _, t in stats)
+    print(f'Total: {total_rows} rows in {total_secs:.1f}s ({total_rows / total_secs if total_secs else 0:.0f} rows/s)')
+
+
+def main():
+    opts = parse_args()
+    create_users = opts.create_users
+    skip_users = opts.skip_users
+
+    checkpoint = Checkpoint(opts.checkpoint)
+    user_map = checkpoint.maps['users']
+
+    # 1) Users
+    if create_users:
+        try:
+            provision_users(checkpoint, opts.user_concurrency)
+        except MigrationError as exc:
+            print('ERROR:', exc)
+            print(f'Progress is saved in {opts.checkpoint}; rerun the same command to resume.')
+            sys.exit(1)
+        # dump mapping so you can reuse
+        with open('supabase_user_id_map.json', 'w') as f:
+            json.dump(user_map, f)
+        print('Wrote supabase_user_id_map.json')
+    elif skip_users:
+        # expect a mapping file; tolerate empty or invalid JSON by creating an empty mapping
+        try:
+            with open('supabase_user_id_map.json', 'r', encoding='utf8') as f:
+                try:
+                    loaded = json.load(f)
+                except (json.JSONDecodeError, ValueError):
+                    print('Warning: supabase_user_id_map.json is empty or invalid; using empty mapping')
+                    loaded = {}
+        except FileNotFoundError:
+            print('supabase_user_id_map.json not found; creating empty mapping')
+            loaded = {}
+            with open('supabase_user_id_map.json', 'w', encoding='utf8') as f:
+                json.dump(loaded, f)
+        # JSON object keys are strings; the Django ids we look up are ints.
+        user_map.update({int(k): v for k, v in loaded.items()})
+        print('Loaded mapping for', len(user_map), 'users')
+    else:
+        print('No user creation requested. You must ensure Supabase users exist and provide `supabase_user_id_map.json` mapping.')
+        if not os.path.exists('supabase_user_id_map.json'):
+            print('File supabase_user_id_map.json not found. Exiting.')
+            sys.exit(1)
+        with open('supabase_user_id_map.json', 'r') as f:
+            user_map.update({int(k): v for k, v in json.load(f).items()})
+
+    try:
+        migrate_data(checkpoint, user_map, opts.batch_size, opts.chunk_size)
+    except MigrationError as exc:
+        print('ERROR:', exc)
+        print(f'Progress is saved in {opts.checkpoint}; rerun the same command to resume.')
+        sys.exit(1)
+    finally:
+        checkpoint.close()
 
     print('Migration complete.')
 